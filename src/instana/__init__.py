@@ -197,6 +197,8 @@ if 'INSTANA_DISABLE' not in os.environ:
 
             profiler = get_profiler()
             if profiler:
-                profiler.start()
+                options = profiler.agent.options
+                profiler.start(cpu_sampler_all_threads=options.autoprofile_all_threads,
+                               allocation_sampler_sampled=options.autoprofile_allocation_sampling)
 
         boot_agent()
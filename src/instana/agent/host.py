@@ -8,6 +8,7 @@ monitoring state and reporting that data.
 
 import os
 import json
+import time
 from datetime import datetime
 
 import urllib3
@@ -15,6 +16,8 @@ import requests
 
 from ..log import logger
 from .base import BaseAgent
+from .span_uploader import SpanUploader
+from .report_lanes import ReportLane
 from ..fsm import TheMachine
 from ..version import VERSION
 from ..options import StandardOptions
@@ -50,6 +53,14 @@ class HostAgent(BaseAgent):
         self.last_fork_check = None
         self._boot_pid = os.getpid()
         self.options = StandardOptions()
+        self.span_uploader = SpanUploader(self)
+
+        # Spans, profiles and metrics are each sent by their own thread so that a slow
+        # endpoint doesn't hold up the others
+        max_pending = self.options.report_lane_max_pending
+        self.span_lane = ReportLane("spans", self.__report_spans, max_pending)
+        self.profile_lane = ReportLane("profiles", self.__report_profiles, max_pending)
+        self.metric_lane = ReportLane("metrics", self.__report_metrics, max_pending)
 
         # Update log level from what Options detected
         self.update_log_level()
@@ -252,54 +263,76 @@ class HostAgent(BaseAgent):
     def report_data_payload(self, payload):
         """
         Used to report collection payload to the host agent.  This can be metrics, spans and snapshot data.
+
+        The payload is handed over to the report lanes without blocking; the data is sent in the
+        background by one thread per payload type.
         """
-        response = None
         try:
             # Report spans (if any)
             span_count = len(payload['spans'])
             if span_count > 0:
                 logger.debug("Reporting %d spans", span_count)
-                response = self.client.post(self.__traces_url(),
-                                            data=to_json(payload['spans']),
-                                            headers={"Content-Type": "application/json"},
-                                            timeout=0.8)
-
-            if response is not None and 200 <= response.status_code <= 204:
-                self.last_seen = datetime.now()
+                if not self.span_lane.submit((self.__traces_url(), payload['spans'])):
+                    self.span_uploader.stats.dropped_spans += span_count
 
             # Report profiles (if any)
             profile_count = len(payload['profiles'])
             if profile_count > 0:
                 logger.debug("Reporting %d profiles", profile_count)
-                response = self.client.post(self.__profiles_url(),
-                                            data=to_json(payload['profiles']),
-                                            headers={"Content-Type": "application/json"},
-                                            timeout=0.8)
+                self.profile_lane.submit((self.__profiles_url(), payload['profiles']))
 
-            if response is not None and 200 <= response.status_code <= 204:
-                self.last_seen = datetime.now()
+            # Report metrics (if any); span flushes between two reports come without metrics
+            plugins = payload["metrics"]["plugins"]
+            if plugins:
+                metric_bundle = plugins[0]["data"]
+                self.metric_lane.submit((self.__data_url(), metric_bundle))
+        except Exception as exc:
+            logger.debug("report_data_payload: non-fatal issue (%s)", type(exc), exc_info=True)
 
-            # Report metrics
-            metric_bundle = payload["metrics"]["plugins"][0]["data"]
-            response = self.client.post(self.__data_url(),
-                                        data=to_json(metric_bundle),
-                                        headers={"Content-Type": "application/json"},
-                                        timeout=0.8)
+    def flush_report_lanes(self, timeout=2):
+        """
+        Wait up to <timeout> seconds for the data handed to the report lanes to be sent.
+        @return: Boolean - True if everything was sent
+        """
+        deadline = time.time() + timeout
+        flushed = True
+        for lane in (self.span_lane, self.profile_lane, self.metric_lane):
+            flushed = lane.flush(max(0, deadline - time.time())) and flushed
+        return flushed
 
-            if response is not None and 200 <= response.status_code <= 204:
-                self.last_seen = datetime.now()
+    def __report_spans(self, session, data):
+        url, spans = data
+        response = self.span_uploader.upload(url, spans, session=session)
+        if response is not None:
+            self.last_seen = datetime.now()
+
+    def __report_profiles(self, session, data):
+        url, profiles = data
+        response = self.__post(session, url, to_json(profiles))
+        if response is not None and 200 <= response.status_code <= 204:
+            self.last_seen = datetime.now()
 
-                if response.status_code == 200 and len(response.content) > 2:
-                    # The host agent returned something indicating that is has a request for us that we
-                    # need to process.
-                    self.handle_agent_tasks(json.loads(response.content)[0])
+    def __report_metrics(self, session, data):
+        url, metric_bundle = data
+        response = self.__post(session, url, to_json(metric_bundle))
+        if response is not None and 200 <= response.status_code <= 204:
+            self.last_seen = datetime.now()
+
+            if response.status_code == 200 and len(response.content) > 2:
+                # The host agent returned something indicating that is has a request for us that we
+                # need to process.
+                self.handle_agent_tasks(json.loads(response.content)[0])
+
+    def __post(self, session, url, data):
+        try:
+            return session.post(url, data=data, headers={"Content-Type": "application/json"}, timeout=0.8)
         except requests.exceptions.ConnectionError:
             pass
         except urllib3.exceptions.MaxRetryError:
             pass
         except Exception as exc:
             logger.debug("report_data_payload: Instana host agent connection error (%s)", type(exc), exc_info=True)
-        return response
+        return None
 
     def handle_agent_tasks(self, task):
         """
@@ -357,6 +390,12 @@ class HostAgent(BaseAgent):
             logger.warning("report_interval: %s", self.collector.report_interval)
             logger.warning("should_send_snapshot_data: %s", self.collector.should_send_snapshot_data())
             logger.warning("spans in queue: %s", self.collector.span_queue.qsize())
+            logger.warning("spans dropped: %s", getattr(self.collector.span_queue, "dropped", 0))
+            for lane in (self.span_lane, self.profile_lane, self.metric_lane):
+                logger.warning("report lane %s: pending %s, dropped %s", lane.name,
+                               lane.queue.qsize() if lane.queue is not None else 0, lane.dropped)
+            logger.warning("span uploads: %s", dict((name, getattr(self.span_uploader.stats, name))
+                                                    for name in self.span_uploader.stats.__slots__))
             logger.warning("thread_shutdown is_set: %s", self.collector.thread_shutdown.is_set())
 
             logger.warning("----> Threads <----")
@@ -0,0 +1,117 @@
+# (c) Copyright IBM Corp. 2024
+
+"""
+Independent sender threads ("lanes") for the payload types reported to the host agent.
+
+Each lane owns a bounded queue, a thread and a keep-alive HTTP session, so that a slow
+response on one endpoint (e.g. traces) never delays the others (e.g. metrics) or the
+collector thread that hands the payloads over.
+"""
+import os
+import queue
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..log import logger
+
+
+def new_agent_session():
+    """
+    A requests Session tuned for talking to the local host agent from a single thread:
+    one persistent connection and no transparent retries (failed posts are handled by
+    the callers).
+    @return: requests.Session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class ReportLane(object):
+    """
+    A sender thread for one payload type.  Payloads are passed to <send> as
+    send(session, payload) in the order they were submitted.
+
+    When <max_pending> payloads are already waiting, new ones are rejected and counted in
+    `dropped` rather than letting a stalled endpoint build up an unbounded backlog.
+    """
+
+    def __init__(self, name, send, max_pending=2):
+        self.name = name
+        self.send = send
+        self.max_pending = max(1, max_pending)
+        # Number of payloads rejected because the lane was full
+        self.dropped = 0
+
+        self.queue = None
+        self.session = None
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, payload):
+        """
+        Queue <payload> for sending without blocking.
+        @return: Boolean - False if the payload was dropped
+        """
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(payload)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.debug("ReportLane %s: %d payloads pending; payload dropped", self.name, self.max_pending)
+            return False
+
+    def flush(self, timeout):
+        """
+        Wait up to <timeout> seconds for the pending payloads to be sent.
+        @return: Boolean - True if the lane is idle
+        """
+        lane_queue = self.queue
+        if lane_queue is None:
+            return True
+
+        deadline = time.time() + timeout
+        with lane_queue.all_tasks_done:
+            while lane_queue.unfinished_tasks:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                lane_queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _ensure_started(self):
+        thread = self._thread
+        if thread is not None and self._pid == os.getpid() and thread.is_alive():
+            return
+
+        with self._start_lock:
+            if self._pid != os.getpid():
+                # First use, or a forked child: whatever the parent had pending is not ours
+                # to send and its connections must not be shared
+                self._pid = os.getpid()
+                self.queue = queue.Queue(self.max_pending)
+                self.session = new_agent_session()
+                self._thread = None
+
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, args=(self.queue, self.session))
+                self._thread.daemon = True
+                self._thread.name = "Instana %s reporter" % self.name
+                self._thread.start()
+
+    def _run(self, lane_queue, session):
+        while True:
+            payload = lane_queue.get()
+            try:
+                self.send(session, payload)
+            except Exception:
+                logger.debug("ReportLane %s: non-fatal send issue: ", self.name, exc_info=True)
+            finally:
+                lane_queue.task_done()
@@ -0,0 +1,101 @@
+# (c) Copyright IBM Corp. 2024
+
+"""
+Upload of span batches to the host agent in size limited, optionally gzip compressed
+chunks, with a small retry budget per report.
+"""
+import gzip
+import time
+
+from ..log import logger
+from ..util.span_encoder import SpanBatchEncoder
+
+
+class SpanUploadStats(object):
+    """ Running totals of the span uploads, reported as tracer metrics """
+    __slots__ = ("chunks", "spans_sent", "bytes_encoded", "bytes_sent", "retries", "dropped_spans")
+
+    def __init__(self):
+        self.chunks = 0
+        self.spans_sent = 0
+        # Size of the JSON payloads before and after compression
+        self.bytes_encoded = 0
+        self.bytes_sent = 0
+        self.retries = 0
+        self.dropped_spans = 0
+
+
+class SpanUploader(object):
+    """
+    Posts spans for an agent.  A chunk that fails is retried once after BACKOFF seconds, as
+    long as the retry budget of the current upload (`options.span_upload_retries`) is not
+    exhausted.  A chunk that can't be delivered is dropped and counted, and the upload
+    continues with the next chunk.
+    """
+    GZIP_LEVEL = 1
+    BACKOFF = 0.1
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.encoder = SpanBatchEncoder()
+        self.stats = SpanUploadStats()
+
+    def upload(self, url, spans, timeout=0.8, session=None):
+        """
+        Post <spans> to <url>.
+        @param session: the requests Session to post with; defaults to the client of the agent
+        @return: the response of the last successful post, or None
+        """
+        if session is None:
+            session = self.agent.client
+        options = self.agent.options
+        retry_budget = options.span_upload_retries
+        last_response = None
+
+        for count, body in self.encoder.encode_chunks(spans, options.span_upload_max_spans,
+                                                      options.span_upload_max_bytes):
+            if body is None:
+                # Already logged by the encoder
+                self.stats.dropped_spans += count
+                continue
+
+            data, headers = self._prepare(body, options.span_upload_gzip)
+            retried = False
+            while True:
+                response = self._post(session, url, data, headers, timeout)
+                if response is not None and 200 <= response.status_code <= 204:
+                    last_response = response
+                    self.stats.chunks += 1
+                    self.stats.spans_sent += count
+                    self.stats.bytes_encoded += len(body)
+                    self.stats.bytes_sent += len(data)
+                    break
+
+                if retried or retry_budget <= 0:
+                    logger.debug("SpanUploader: dropping %d spans after failed upload", count)
+                    self.stats.dropped_spans += count
+                    break
+
+                retried = True
+                retry_budget -= 1
+                self.stats.retries += 1
+                time.sleep(self.BACKOFF)
+
+        return last_response
+
+    def _prepare(self, body, compress):
+        headers = {"Content-Type": "application/json"}
+        if compress:
+            headers["Content-Encoding"] = "gzip"
+            body = gzip.compress(body, compresslevel=self.GZIP_LEVEL)
+        return body, headers
+
+    def _post(self, session, url, data, headers, timeout):
+        try:
+            response = session.post(url, data=data, headers=headers, timeout=timeout)
+            if not 200 <= response.status_code <= 204:
+                logger.debug("SpanUploader: unexpected response status %s", response.status_code)
+            return response
+        except Exception as exc:
+            logger.debug("SpanUploader: Instana host agent connection error (%s)", type(exc))
+        return None
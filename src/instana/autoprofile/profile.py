@@ -13,7 +13,9 @@ class Profile(object):
     CATEGORY_TIME = 'time'
     TYPE_CPU_USAGE = 'cpu-usage'
     TYPE_MEMORY_ALLOCATION_RATE = 'memory-allocation-rate'
+    TYPE_MEMORY_HEAP_GROWTH = 'memory-heap-growth'
     TYPE_BLOCKING_CALLS = 'blocking-calls'
+    TYPE_EVENT_LOOP_STALLS = 'event-loop-stalls'
     UNIT_NONE = ''
     UNIT_MILLISECOND = 'millisecond'
     UNIT_MICROSECOND = 'microsecond'
@@ -54,38 +56,41 @@ class Profile(object):
 
 
 class CallSite:
+    """
+    A node of the call tree of a profile.  Children are keyed by tuples: (code object, line)
+    for frames recorded by the samplers (see find_or_add_frame), or (method, file, line).
+    The keys are never formatted; names are only read when the profile is reported.
+    """
     __slots__ = [
         'method_name',
         'file_name',
         'file_line',
+        'key',
         'measurement',
         'num_samples',
         'children'
     ]
 
-    def __init__(self, method_name, file_name, file_line):
+    def __init__(self, method_name, file_name, file_line, key=None):
         self.method_name = method_name
         self.file_name = file_name
         self.file_line = file_line
+        self.key = key if key is not None else self.create_key(method_name, file_name, file_line)
         self.measurement = 0
         self.num_samples = 0
         self.children = dict()
 
     def create_key(self, method_name, file_name, file_line):
-        return '{0} ({1}:{2})'.format(method_name, file_name, file_line)
+        return (method_name, file_name, file_line)
 
     def find_child(self, method_name, file_name, file_line):
-        key = self.create_key(method_name, file_name, file_line)
-        if key in self.children:
-            return self.children[key]
-
-        return None
+        return self.children.get(self.create_key(method_name, file_name, file_line))
 
     def add_child(self, child):
-        self.children[self.create_key(child.method_name, child.file_name, child.file_line)] = child
+        self.children[child.key] = child
 
     def remove_child(self, child):
-        del self.children[self.create_key(child.method_name, child.file_name, child.file_line)]
+        del self.children[child.key]
 
     def find_or_add_child(self, method_name, file_name, file_line):
         child = self.find_child(method_name, file_name, file_line)
@@ -95,6 +100,15 @@ class CallSite:
 
         return child
 
+    def find_or_add_frame(self, code, lineno):
+        key = (code, lineno)
+        child = self.children.get(key)
+        if child is None:
+            child = CallSite(code.co_name, code.co_filename, lineno, key)
+            self.children[key] = child
+
+        return child
+
     def increment(self, value, count):
         self.measurement += value
         self.num_samples += count
@@ -129,6 +143,67 @@ class CallSite:
         return call_site_dict
 
 
+class SampleBuffer(object):
+    """
+    Preallocated buffer of raw samples, filled by the signal handlers of the samplers and
+    folded into the call tree outside of them.  Appending is O(1) and allocation free; when
+    the buffer is full, samples are dropped and counted.  Samples can carry a label, e.g. the
+    name of the sampled thread.
+
+    The samplers drain their buffers periodically while a profiling span runs.  To do so
+    without racing the signal handler, they keep a spare buffer, switch the handler over to
+    it and drain the full one once the handler has returned.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.stacks = [None] * capacity
+        self.values = [0] * capacity
+        self.labels = [None] * capacity
+        self.count = 0
+        self.dropped = 0
+
+    def reserve(self, capacity):
+        """
+        Grows the buffer to hold at least <capacity> samples.  Not to be called while the
+        buffer is filled.
+        """
+        if capacity > self.capacity:
+            grow = capacity - self.capacity
+            self.stacks.extend([None] * grow)
+            self.values.extend([0] * grow)
+            self.labels.extend([None] * grow)
+            self.capacity = capacity
+
+    def append(self, stack, value, label=None):
+        count = self.count
+        if count >= self.capacity:
+            self.dropped += 1
+            return
+
+        self.stacks[count] = stack
+        self.values[count] = value
+        self.labels[count] = label
+        self.count = count + 1
+
+    def drain(self):
+        """
+        Removes the buffered samples.
+        @return: (stacks, values, labels, number of dropped samples)
+        """
+        count = self.count
+        stacks = self.stacks[:count]
+        values = self.values[:count]
+        labels = self.labels[:count]
+        self.stacks[:count] = [None] * count
+        self.labels[:count] = [None] * count
+        self.count = 0
+
+        dropped = self.dropped
+        self.dropped = 0
+
+        return stacks, values, labels, dropped
+
+
 def millis():
     return int(round(time.time() * 1000))
 
@@ -132,6 +132,14 @@ class Profiler(object):
         self.profiler_destroyed = True
         logger.debug('Profiler destroyed')
 
+    def dropped_samples(self):
+        """
+        @return: the number of samples the samplers dropped because their buffers were full
+        """
+        return sum(getattr(scheduler.sampler, 'dropped_samples', 0)
+                   for scheduler in (self.cpu_sampler_scheduler, self.allocation_sampler_scheduler,
+                                     self.block_sampler_scheduler))
+
     def run_in_thread(self, func):
         def func_wrapper():
             try:
@@ -149,15 +149,20 @@ class SamplerScheduler:
             self.reset()
             return
 
-        profile = self.sampler.build_profile(
-            to_millis(self.profile_duration), 
-            to_millis(time.time() - self.profile_start_ts))
+        duration = to_millis(self.profile_duration)
+        timespan = to_millis(time.time() - self.profile_start_ts)
+        # Samplers may report more than one profile type
+        if hasattr(self.sampler, 'build_profiles'):
+            profiles = self.sampler.build_profiles(duration, timespan)
+        else:
+            profiles = [self.sampler.build_profile(duration, timespan)]
 
         if self.profiler.agent.can_send():
-            if self.profiler.agent.announce_data.pid:
-                profile.process_id = str(self.profiler.agent.announce_data.pid)
+            for profile in profiles:
+                if self.profiler.agent.announce_data.pid:
+                    profile.process_id = str(self.profiler.agent.announce_data.pid)
 
-            self.profiler.agent.collector.profile_queue.put(profile.to_dict())
+                self.profiler.agent.collector.profile_queue.put(profile.to_dict())
 
             logger.debug(self.config.log_prefix + ': reporting profile:')
         else:
@@ -1,6 +1,9 @@
 # (c) Copyright IBM Corp. 2021
 # (c) Copyright Instana Inc. 2020
 
+import os
+import time
+import fnmatch
 import threading
 
 from ...log import logger
@@ -18,12 +21,34 @@ class AllocationSampler(object):
     MAX_MEMORY_OVERHEAD = 10 * 1e6 # 10MB
     MAX_PROFILED_ALLOCATIONS = 25
 
+    # Sampled mode
+    SAMPLED_TRACEBACK_SIZE = 10 # number of frames
+    SAMPLED_MAX_MEMORY_OVERHEAD = 2 * 1e6 # 2MB
+    SAMPLING_INTERVAL_BYTES = 64 * 1024
+    SNAPSHOT_INTERVAL = 1 # seconds
+
     def __init__(self, profiler):
         self.profiler = profiler
         self.ready = False
         self.top = None
+        self.growth_top = None
         self.top_lock = threading.Lock()
         self.overhead_monitor = None
+        self.sampled = False
+        # Sampled mode alternates between allocation rate and heap growth spans
+        self.growth_span = True
+        self.snapshot_timer = None
+        self.span_start_ts = None
+        # Seconds spent in each kind of span since the last reset
+        self.rate_time = 0
+        self.growth_time = 0
+        # Bytes not yet sampled, carried over between the tracebacks of each profile
+        self.unsampled_rate_bytes = 0
+        self.unsampled_growth_bytes = 0
+        # The previous snapshot of the current allocation rate span
+        self.rate_snapshot = None
+        # tracemalloc.Filter list of the allocations that are not reported in sampled mode
+        self.snapshot_filters = []
 
     def setup(self):
         if self.profiler.get_option('allocation_sampler_disabled'):
@@ -37,25 +62,44 @@ class AllocationSampler(object):
             logger.debug('Memory allocation profiling is available for Python 3.4 or higher')
             return
 
+        self.sampled = bool(self.profiler.get_option('allocation_sampler_sampled'))
+        self.snapshot_filters = self.create_snapshot_filters()
+
         self.ready = True
 
     def reset(self):
         self.top = CallSite('', '', 0)
+        self.growth_top = CallSite('', '', 0)
+        self.rate_time = 0
+        self.growth_time = 0
+        self.unsampled_rate_bytes = 0
+        self.unsampled_growth_bytes = 0
 
     def start_sampler(self):
         logger.debug('Activating memory allocation sampler.')
 
+        if self.sampled:
+            self.growth_span = not self.growth_span
+            self.span_start_ts = time.time()
+            traceback_size = self.SAMPLED_TRACEBACK_SIZE
+            max_memory_overhead = self.SAMPLED_MAX_MEMORY_OVERHEAD
+        else:
+            traceback_size = self.MAX_TRACEBACK_SIZE
+            max_memory_overhead = self.MAX_MEMORY_OVERHEAD
+
         def start():
-            tracemalloc.start(self.MAX_TRACEBACK_SIZE)
+            tracemalloc.start(traceback_size)
         self.profiler.run_in_main_thread(start)
 
         def monitor_overhead():
-            if tracemalloc.is_tracing() and tracemalloc.get_tracemalloc_memory() > self.MAX_MEMORY_OVERHEAD:
+            if tracemalloc.is_tracing() and tracemalloc.get_tracemalloc_memory() > max_memory_overhead:
                 logger.debug('Allocation sampler memory overhead limit exceeded: %s bytes', tracemalloc.get_tracemalloc_memory())
                 self.stop_sampler()
 
         if not self.profiler.get_option('disable_timers'):
             self.overhead_monitor = schedule(0.5, 0.5, monitor_overhead)
+            if self.sampled and not self.growth_span:
+                self.snapshot_timer = schedule(self.SNAPSHOT_INTERVAL, self.SNAPSHOT_INTERVAL, self.take_snapshot)
 
     def stop_sampler(self):
         logger.debug('Deactivating memory allocation sampler.')
@@ -65,14 +109,53 @@ class AllocationSampler(object):
                 self.overhead_monitor.cancel()
                 self.overhead_monitor = None
 
+            if self.snapshot_timer:
+                self.snapshot_timer.cancel()
+                self.snapshot_timer = None
+
+            if self.span_start_ts is not None:
+                if self.growth_span:
+                    self.growth_time += time.time() - self.span_start_ts
+                else:
+                    self.rate_time += time.time() - self.span_start_ts
+                self.span_start_ts = None
+
             if tracemalloc.is_tracing():
                 snapshot = tracemalloc.take_snapshot()
                 logger.debug('Allocation sampler memory overhead %s bytes', tracemalloc.get_tracemalloc_memory())
                 tracemalloc.stop()
-                self.process_snapshot(snapshot)
+                if self.sampled:
+                    self.process_sampled_snapshot(snapshot, self.growth_span)
+                else:
+                    self.process_snapshot(snapshot)
+
+            self.rate_snapshot = None
+
+    def take_snapshot(self):
+        # Allocation rate spans are snapshotted every SNAPSHOT_INTERVAL, so that the blocks
+        # allocated in an interval are counted even if they are freed later in the span.
+        with self.top_lock:
+            if not tracemalloc.is_tracing() or self.growth_span:
+                return
+
+            snapshot = tracemalloc.take_snapshot()
+            self.process_sampled_snapshot(snapshot, False)
+
+    def create_snapshot_filters(self):
+        # The allocations of the profiler itself (e.g. of processing the previous snapshot
+        # while tracing) and of the tracemalloc module are not reported
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__, all_frames=True)]
+        frame_cache = self.profiler.frame_cache
+        if not frame_cache.include_profiler_frames:
+            filters.append(tracemalloc.Filter(False, os.path.join(frame_cache.profiler_dir, '*'), all_frames=True))
+        return filters
 
     def build_profile(self, duration, timespan):
         with self.top_lock:
+            if self.sampled:
+                # Only the allocation rate spans
+                duration = self.share_of_duration(duration, self.rate_time)
+
             self.top.normalize(duration)
             self.top.floor()
 
@@ -87,6 +170,33 @@ class AllocationSampler(object):
 
             return profile
 
+    def build_profiles(self, duration, timespan):
+        profiles = [self.build_profile(duration, timespan)]
+
+        with self.top_lock:
+            if self.growth_top.children:
+                # Only the heap growth spans
+                duration = self.share_of_duration(duration, self.growth_time)
+
+                self.growth_top.normalize(duration)
+                self.growth_top.floor()
+
+                profiles.append(Profile(
+                    Profile.CATEGORY_MEMORY,
+                    Profile.TYPE_MEMORY_HEAP_GROWTH,
+                    Profile.UNIT_BYTE,
+                    self.growth_top.children.values(),
+                    duration,
+                    timespan
+                ))
+
+        return profiles
+
+    def share_of_duration(self, duration, span_time):
+        if span_time <= 0:
+            return duration
+        return duration * span_time / (self.rate_time + self.growth_time)
+
     def destroy(self):
         pass
 
@@ -110,3 +220,57 @@ class AllocationSampler(object):
 
                     current_node = current_node.find_or_add_child('', frame.filename, frame.lineno)
                 current_node.increment(stat.size, stat.count)
+
+    def process_sampled_snapshot(self, snapshot, growth):
+        # Rather than reporting the largest tracebacks, one sample is taken for every
+        # SAMPLING_INTERVAL_BYTES of the traced blocks.  Tracing starts with the profiling span,
+        # so for heap growth these are the blocks allocated since then that are still live.
+        # For the allocation rate, these are the bytes by which each traceback grew since the
+        # previous snapshot of the span.
+        if growth:
+            top, unsampled_bytes = self.growth_top, self.unsampled_growth_bytes
+            sizes = ((stat.traceback, stat.size) for stat in snapshot.statistics('traceback'))
+        else:
+            top, unsampled_bytes = self.top, self.unsampled_rate_bytes
+            previous, self.rate_snapshot = self.rate_snapshot, snapshot
+            if previous is None:
+                sizes = ((stat.traceback, stat.size) for stat in snapshot.statistics('traceback'))
+            else:
+                sizes = ((diff.traceback, diff.size_diff) for diff in snapshot.compare_to(previous, 'traceback'))
+
+        for traceback, size in sizes:
+            if not traceback or size <= 0 or self.is_filtered_traceback(traceback):
+                continue
+
+            unsampled_bytes, samples = self.sample_bytes(unsampled_bytes + size)
+            if samples:
+                self.add_traceback(top, traceback, samples)
+
+        if growth:
+            self.unsampled_growth_bytes = unsampled_bytes
+        else:
+            self.unsampled_rate_bytes = unsampled_bytes
+
+    def sample_bytes(self, size):
+        samples = int(size // self.SAMPLING_INTERVAL_BYTES)
+        return size - samples * self.SAMPLING_INTERVAL_BYTES, samples
+
+    def is_filtered_traceback(self, traceback):
+        # The filters are matched against the tracebacks of the statistics rather than with
+        # Snapshot.filter_traces, which matches every single trace in Python (many times
+        # longer than computing the statistics).  All of them are exclusive filters that
+        # match any frame of the traceback.
+        for frame in traceback:
+            for snapshot_filter in self.snapshot_filters:
+                if fnmatch.fnmatch(frame.filename, snapshot_filter.filename_pattern):
+                    return True
+        return False
+
+    def add_traceback(self, top, traceback, samples):
+        current_node = top
+        for frame in reversed(traceback):
+            if frame.filename == '<unknown>':
+                continue
+
+            current_node = current_node.find_or_add_child('', frame.filename, frame.lineno)
+        current_node.increment(samples * self.SAMPLING_INTERVAL_BYTES, samples)
@@ -2,13 +2,17 @@
 # (c) Copyright Instana Inc. 2020
 
 import sys
+import time
 import threading
 import signal
+import itertools
 
 from ...log import logger
 from ..runtime import runtime_info
 from ..profile import Profile
 from ..profile import CallSite
+from ..profile import SampleBuffer
+from ..schedule import schedule
 
 if runtime_info.GEVENT:
     import gevent
@@ -17,12 +21,26 @@ if runtime_info.GEVENT:
 class BlockSampler(object):
     SAMPLING_RATE = 0.05
     MAX_TRACEBACK_SIZE = 25 # number of frames
+    MAX_BUFFERED_SAMPLES = 4096 # thread and task stacks per AGGREGATE_INTERVAL, more with many threads
+    AGGREGATE_INTERVAL = 1 # seconds between the aggregations of the buffered samples
+    MAX_SAMPLED_TASKS = 500 # asyncio tasks per sample
+    STALL_THRESHOLD = 0.1 # seconds the event loop may take to run a scheduled callback
 
     def __init__(self, profiler):
         self.profiler = profiler
         self.ready = False
         self.top = None
+        self.stall_top = None
         self.top_lock = threading.Lock()
+        self.samples = SampleBuffer(self.MAX_BUFFERED_SAMPLES)
+        self.spare_samples = SampleBuffer(self.MAX_BUFFERED_SAMPLES)
+        self.stall_samples = SampleBuffer(self.MAX_BUFFERED_SAMPLES)
+        self.spare_stall_samples = SampleBuffer(self.MAX_BUFFERED_SAMPLES)
+        self.dropped_samples = 0
+        self.aggregate_timer = None
+        self.heartbeat_loop = None
+        self.heartbeat_ts = None
+        self.sample_time = self.SAMPLING_RATE * 1000
         self.prev_signal_handler = None
         self.sampler_active = False
 
@@ -34,8 +52,6 @@ class BlockSampler(object):
             logger.debug('CPU profiler is only supported on Linux and OS X.')
             return
 
-        sample_time = self.SAMPLING_RATE * 1000
-
         main_thread_id = None
         if runtime_info.GEVENT:
             main_thread_id = gevent._threading.get_ident()
@@ -47,12 +63,12 @@ class BlockSampler(object):
                 return
             self.sampler_active = True
 
-            with self.top_lock:
-                try:
-                    self.process_sample(signal_frame, sample_time, main_thread_id)
-                    signal_frame = None
-                except Exception:
-                    logger.error('Error processing sample', exc_info=True)
+            # Only records the stacks: the call tree is updated by aggregate_samples
+            try:
+                self.process_sample(signal_frame, main_thread_id)
+                signal_frame = None
+            except Exception:
+                logger.error('Error processing sample', exc_info=True)
 
             self.sampler_active = False
 
@@ -68,17 +84,59 @@ class BlockSampler(object):
 
     def reset(self):
         self.top = CallSite('', '', 0)
+        self.stall_top = CallSite('', '', 0)
 
     def start_sampler(self):
         logger.debug('Activating block sampler.')
 
+        self.heartbeat_loop = None
+        self.heartbeat_ts = None
+
+        # One sample per thread and signal, with room for late aggregations
+        capacity = int(2 * threading.active_count() * self.AGGREGATE_INTERVAL / self.SAMPLING_RATE)
+        self.samples.reserve(capacity)
+        self.spare_samples.reserve(capacity)
+
+        self.aggregate_timer = schedule(self.AGGREGATE_INTERVAL, self.AGGREGATE_INTERVAL, self.aggregate_samples)
+
         signal.setitimer(signal.ITIMER_REAL, self.SAMPLING_RATE, self.SAMPLING_RATE)
 
     def stop_sampler(self):
         signal.setitimer(signal.ITIMER_REAL, 0)
 
+        if self.aggregate_timer:
+            self.aggregate_timer.cancel()
+            self.aggregate_timer = None
+
+        self.aggregate_samples()
+
         logger.debug('Deactivating block sampler.')
 
+    def aggregate_samples(self):
+        with self.top_lock:
+            # Also runs on the timer thread during the span: the signal handler is switched to
+            # the spare buffers and the full ones are drained once the handler has returned
+            samples, stall_samples = self.samples, self.stall_samples
+            self.samples, self.spare_samples = self.spare_samples, samples
+            self.stall_samples, self.spare_stall_samples = self.spare_stall_samples, stall_samples
+            while self.sampler_active:
+                time.sleep(0.001)
+
+            dropped = 0
+            for samples, top in ((samples, self.top), (stall_samples, self.stall_top)):
+                stacks, counts, _, samples_dropped = samples.drain()
+                dropped += samples_dropped
+                if top:
+                    for stack, count in zip(stacks, counts):
+                        current_node = top
+                        for code, lineno in reversed(stack):
+                            current_node = current_node.find_or_add_frame(code, lineno)
+                        current_node.increment(count * self.sample_time, count)
+
+        if dropped:
+            self.dropped_samples += dropped
+            logger.debug('Block sampler buffer full, %s samples dropped', dropped)
+
     def build_profile(self, duration, timespan):
         with self.top_lock:
             self.top.normalize(duration)
@@ -95,25 +153,131 @@ class BlockSampler(object):
 
             return profile
 
-    def process_sample(self, signal_frame, sample_time, main_thread_id):
-        if self.top:
-            current_frames = sys._current_frames()
-            items = current_frames.items()
-            for thread_id, thread_frame in items:
-                if thread_id == main_thread_id:
-                    thread_frame = signal_frame
+    def build_profiles(self, duration, timespan):
+        profiles = [self.build_profile(duration, timespan)]
+
+        with self.top_lock:
+            if self.stall_top.children:
+                self.stall_top.normalize(duration)
+                self.stall_top.floor()
+
+                profiles.append(Profile(
+                    Profile.CATEGORY_TIME,
+                    Profile.TYPE_EVENT_LOOP_STALLS,
+                    Profile.UNIT_MILLISECOND,
+                    self.stall_top.children.values(),
+                    duration,
+                    timespan
+                ))
+
+        return profiles
+
+    def process_sample(self, signal_frame, main_thread_id):
+        current_frames = sys._current_frames()
+        items = current_frames.items()
+        for thread_id, thread_frame in items:
+            if thread_id == main_thread_id:
+                thread_frame = signal_frame
+
+            stack = self.recover_stack(thread_frame)
+            if stack:
+                self.samples.append(stack, 1)
+
+            thread_id, thread_frame, stack = None, None, None
+
+        items = None
+        current_frames = None
+
+        self.process_asyncio_sample(signal_frame)
+
+    def process_asyncio_sample(self, signal_frame):
+        # Only the event loop of the main thread (if any) can be inspected from the handler
+        asyncio = sys.modules.get('asyncio')
+        if asyncio is None:
+            return
+
+        loop = asyncio._get_running_loop()
+        if loop is None:
+            return
+
+        self.check_event_loop(loop, signal_frame)
+
+        # The thread stacks only show the event loop waiting for I/O: the time is attributed
+        # to the call sites where the suspended tasks are awaiting.  Tasks mostly await at a
+        # few call sites, so the stacks are counted per call site and buffered once each;
+        # otherwise a few hundred tasks would fill the buffer within a few samples.
+        task_stacks = dict()
+        current_task = asyncio.current_task(loop)
+        for task in itertools.islice(asyncio.all_tasks(loop), self.MAX_SAMPLED_TASKS):
+            if task is current_task:
+                continue
 
-                stack = self.recover_stack(thread_frame)
+            stack = self.recover_await_stack(task.get_coro())
+            if stack:
+                key = tuple(stack)
+                task_stacks[key] = task_stacks.get(key, 0) + 1
+
+            task, stack = None, None
+
+        for stack, count in task_stacks.items():
+            self.samples.append(stack, count)
+
+        task_stacks = None
+
+    def check_event_loop(self, loop, signal_frame):
+        # A heartbeat callback is scheduled on the loop; while it hasn't run for longer than
+        # STALL_THRESHOLD, the loop is stalled by the code it is running.
+        if self.heartbeat_loop is loop and self.heartbeat_ts is not None:
+            if time.time() - self.heartbeat_ts >= self.STALL_THRESHOLD:
+                stack = self.recover_stack(signal_frame)
                 if stack:
-                    current_node = self.top
-                    for func_name, filename, lineno in reversed(stack):
-                        current_node = current_node.find_or_add_child(func_name, filename, lineno)
-                    current_node.increment(sample_time, 1)
+                    self.stall_samples.append(stack, 1)
+            return
 
-                thread_id, thread_frame, stack = None, None, None
+        self.heartbeat_loop = loop
+        self.heartbeat_ts = time.time()
+        # Wakes up the loop if it is idle, unlike call_soon
+        loop.call_soon_threadsafe(self.heartbeat)
 
-            items = None
-            current_frames = None
+    def heartbeat(self):
+        self.heartbeat_ts = None
+
+    def recover_await_stack(self, coro):
+        # Follows the chain of awaited coroutines (or generators) from the coroutine of a task,
+        # innermost call site first
+        stack = []
+
+        depth = 0
+        while coro is not None and depth <= self.MAX_TRACEBACK_SIZE:
+            if getattr(coro, 'cr_running', False):
+                return None
+
+            frame = getattr(coro, 'cr_frame', None)
+            if frame is not None:
+                awaited = coro.cr_await
+            else:
+                frame = getattr(coro, 'gi_frame', None)
+                if frame is not None:
+                    awaited = coro.gi_yieldfrom
+                else:
+                    frame = getattr(coro, 'ag_frame', None)
+                    if frame is None:
+                        break
+                    awaited = coro.ag_await
+
+            code = frame.f_code
+            if self.profiler.frame_cache.is_profiler_frame(code.co_filename):
+                return None
+            stack.append((code, frame.f_lineno))
+
+            coro = awaited
+            depth += 1
+
+        if len(stack) == 0:
+            return None
+
+        stack.reverse()
+        return stack
 
 
     def recover_stack(self, thread_frame):
@@ -121,15 +285,12 @@ class BlockSampler(object):
 
         depth = 0
         while thread_frame is not None and depth <= self.MAX_TRACEBACK_SIZE:
-            if thread_frame.f_code and thread_frame.f_code.co_name and thread_frame.f_code.co_filename:
-                func_name = thread_frame.f_code.co_name
-                filename = thread_frame.f_code.co_filename
-                lineno = thread_frame.f_lineno
-
-                if filename and self.profiler.frame_cache.is_profiler_frame(filename):
+            code = thread_frame.f_code
+            if code and code.co_name and code.co_filename:
+                if self.profiler.frame_cache.is_profiler_frame(code.co_filename):
                     return None
 
-                stack.append((func_name, filename, lineno))
+                stack.append((code, thread_frame.f_lineno))
 
                 thread_frame = thread_frame.f_back
 
@@ -1,6 +1,8 @@
 # (c) Copyright IBM Corp. 2021
 # (c) Copyright Instana Inc. 2020
 
+import sys
+import time
 import threading
 import signal
 
@@ -8,19 +10,31 @@ from ...log import logger
 from ..runtime import runtime_info
 from ..profile import Profile
 from ..profile import CallSite
+from ..profile import SampleBuffer
+from ..schedule import schedule
 
 
 class CPUSampler(object):
     SAMPLING_RATE = 0.01
     MAX_TRACEBACK_SIZE = 25 # number of frames
+    MAX_BUFFERED_SAMPLES = 2048 # per AGGREGATE_INTERVAL, more when sampling many threads
+    AGGREGATE_INTERVAL = 1 # seconds between the aggregations of the buffered samples
 
     def __init__(self, profiler):
         self.profiler = profiler
         self.ready = False
         self.top = None
         self.top_lock = threading.Lock()
+        self.samples = SampleBuffer(self.MAX_BUFFERED_SAMPLES)
+        self.spare_samples = SampleBuffer(self.MAX_BUFFERED_SAMPLES)
+        self.dropped_samples = 0
+        self.aggregate_timer = None
         self.prev_signal_handler = None
         self.sampler_active = False
+        self.all_threads = False
+        self.main_thread_id = None
+        # thread id -> (CPU time, CPU time not yet attributed to a sample)
+        self.thread_cpu_times = dict()
 
     def setup(self):
         if self.profiler.get_option('cpu_sampler_disabled'):
@@ -30,18 +44,25 @@ class CPUSampler(object):
             logger.debug('CPU sampler is only supported on Linux and OS X.')
             return
 
+        if self.profiler.get_option('cpu_sampler_all_threads'):
+            if hasattr(time, 'pthread_getcpuclockid'):
+                self.all_threads = True
+                self.main_thread_id = threading.main_thread().ident
+            else:
+                logger.debug('CPU sampling of all threads is not supported on this platform.')
+
         def _sample(signum, signal_frame):
             if self.sampler_active:
                 return
             self.sampler_active = True
 
-            with self.top_lock:
-                try:
-                    self.process_sample(signal_frame)
-                    signal_frame = None
-                except Exception:
-                    logger.error('Error in signal handler', exc_info=True)
- 
+            # Only records the stack: the call tree is updated by aggregate_samples
+            try:
+                self.process_sample(signal_frame)
+                signal_frame = None
+            except Exception:
+                logger.error('Error in signal handler', exc_info=True)
+
             self.sampler_active = False
 
         self.prev_signal_handler = signal.signal(signal.SIGPROF, _sample)
@@ -54,11 +75,48 @@ class CPUSampler(object):
     def start_sampler(self):
         logger.debug('Activating CPU sampler.')
 
+        self.thread_cpu_times = dict()
+
+        if self.all_threads:
+            # Up to one sample per thread and signal, with room for late aggregations
+            capacity = int(2 * threading.active_count() * self.AGGREGATE_INTERVAL / self.SAMPLING_RATE)
+            self.samples.reserve(capacity)
+            self.spare_samples.reserve(capacity)
+
+        self.aggregate_timer = schedule(self.AGGREGATE_INTERVAL, self.AGGREGATE_INTERVAL, self.aggregate_samples)
+
         signal.setitimer(signal.ITIMER_PROF, self.SAMPLING_RATE, self.SAMPLING_RATE)
 
     def stop_sampler(self):
         signal.setitimer(signal.ITIMER_PROF, 0)
 
+        if self.aggregate_timer:
+            self.aggregate_timer.cancel()
+            self.aggregate_timer = None
+
+        self.aggregate_samples()
+
+    def aggregate_samples(self):
+        with self.top_lock:
+            # Also runs on the timer thread during the span: the signal handler is switched to
+            # the spare buffer and the full one is drained once the handler has returned
+            samples = self.samples
+            self.samples, self.spare_samples = self.spare_samples, samples
+            while self.sampler_active:
+                time.sleep(0.001)
+
+            stacks, values, labels, dropped = samples.drain()
+            if self.top:
+                for stack, count, thread_name in zip(stacks, values, labels):
+                    root = self.top
+                    if thread_name is not None:
+                        root = root.find_or_add_child('Thread ' + thread_name, '', 0)
+                    self.update_profile(root, stack, count)
+
+        if dropped:
+            self.dropped_samples += dropped
+            logger.debug('CPU sampler buffer full, %s samples dropped', dropped)
+
     def destroy(self):
         if not self.ready:
             return
@@ -79,29 +137,62 @@ class CPUSampler(object):
             return profile
 
     def process_sample(self, signal_frame):
-        if self.top:
-            if signal_frame:
-                stack = self.recover_stack(signal_frame)
+        if self.all_threads:
+            self.process_thread_samples(signal_frame)
+            return
+
+        if signal_frame:
+            stack = self.recover_stack(signal_frame)
+            if stack:
+                self.samples.append(stack, 1)
+
+            stack = None
+
+    def process_thread_samples(self, signal_frame):
+        # SIGPROF is delivered for the CPU time of the whole process, but only ever handled by
+        # the main thread.  Every thread is sampled instead, once per SAMPLING_RATE of its own
+        # CPU time since the previous signal.
+        previous_cpu_times = self.thread_cpu_times
+        cpu_times = dict()
+
+        for thread_id, thread_frame in sys._current_frames().items():
+            try:
+                cpu_time = time.clock_gettime(time.pthread_getcpuclockid(thread_id))
+            except (OSError, OverflowError):
+                continue
+
+            last_cpu_time, unattributed = previous_cpu_times.get(thread_id, (cpu_time, 0))
+            unattributed += cpu_time - last_cpu_time
+            count = int(unattributed / self.SAMPLING_RATE)
+            cpu_times[thread_id] = (cpu_time, unattributed - count * self.SAMPLING_RATE)
+
+            if count:
+                if thread_id == self.main_thread_id:
+                    thread_frame = signal_frame
+
+                stack = self.recover_stack(thread_frame)
                 if stack:
-                    self.update_profile(self.top, stack)
+                    # threading._active is read without threading.enumerate(), which takes a
+                    # lock the interrupted main thread may hold
+                    thread = threading._active.get(thread_id)
+                    thread_name = thread.name if thread is not None else str(thread_id)
+                    self.samples.append(stack, count, thread_name)
 
-                stack = None
+            thread_frame, stack = None, None
+
+        self.thread_cpu_times = cpu_times
 
     def recover_stack(self, signal_frame):
         stack = []
 
         depth = 0
         while signal_frame is not None and depth <= self.MAX_TRACEBACK_SIZE:
-            if signal_frame.f_code and signal_frame.f_code.co_name and signal_frame.f_code.co_filename:
-                func_name = signal_frame.f_code.co_name
-                filename = signal_frame.f_code.co_filename
-                lineno = signal_frame.f_lineno
-
-                if filename and self.profiler.frame_cache.is_profiler_frame(filename):
+            code = signal_frame.f_code
+            if code and code.co_name and code.co_filename:
+                if self.profiler.frame_cache.is_profiler_frame(code.co_filename):
                     return None
 
-                #frame = Frame(func_name, filename, lineno)
-                stack.append((func_name, filename, lineno))
+                stack.append((code, signal_frame.f_lineno))
 
                 signal_frame = signal_frame.f_back
             
@@ -112,10 +203,10 @@ class CPUSampler(object):
         else:
             return stack
 
-    def update_profile(self, profile, stack):
+    def update_profile(self, profile, stack, count=1):
         current_node = profile
 
-        for func_name, filename, lineno in reversed(stack):
-            current_node = current_node.find_or_add_child(func_name, filename, lineno)
+        for code, lineno in reversed(stack):
+            current_node = current_node.find_or_add_frame(code, lineno)
         
-        current_node.increment(1, 1)
+        current_node.increment(count, count)
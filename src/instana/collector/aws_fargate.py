@@ -130,13 +130,13 @@ class AWSFargateCollector(BaseCollector):
     def should_send_snapshot_data(self):
         return int(time()) - self.snapshot_data_last_sent > self.snapshot_data_interval
 
-    def prepare_payload(self):
+    def prepare_payload(self, with_spans=True):
         payload = DictionaryOfStan()
         payload["spans"] = []
         payload["metrics"]["plugins"] = []
 
         try:
-            if not self.span_queue.empty():
+            if with_spans and not self.span_queue.empty():
                 payload["spans"] = self.queued_spans()
 
             with_snapshot = self.should_send_snapshot_data()
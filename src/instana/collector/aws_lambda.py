@@ -41,12 +41,12 @@ class AWSLambdaCollector(BaseCollector):
     def should_send_snapshot_data(self):
         return self.snapshot_data and self.snapshot_data_sent is False
 
-    def prepare_payload(self):
+    def prepare_payload(self, with_spans=True):
         payload = DictionaryOfStan()
         payload["spans"] = None
         payload["metrics"] = None
 
-        if not self.span_queue.empty():
+        if with_spans and not self.span_queue.empty():
             payload["spans"] = self.queued_spans()
 
         if self.should_send_snapshot_data():
@@ -6,11 +6,16 @@ A Collector launches a background thread and continually collects & reports data
 can be any combination of metrics, snapshot data and spans.
 """
 import sys
+import time
 import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from ..log import logger
 from ..singletons import env_is_test
-from ..util import every, DictionaryOfStan
+from ..util import DictionaryOfStan
+from .span_buffer import SpanBuffer, drain_span_queue, convert_deferred_spans
+from .report_scheduler import AdaptiveReportScheduler
+from .trace_buffer import TailSamplingBuffer
 
 
 import queue # pylint: disable=import-error
@@ -28,7 +33,7 @@ class BaseCollector(object):
         # The name assigned to the spawned thread
         self.THREAD_NAME = "Instana Collector"
 
-        # The Queue where we store finished spans before they are sent
+        # The buffer where we store finished spans before they are sent
         if env_is_test:
             # Override span queue with a multiprocessing version
             # The test suite runs background applications - some in background threads,
@@ -37,7 +42,27 @@ class BaseCollector(object):
             import multiprocessing
             self.span_queue = multiprocessing.Queue()
         else:
-            self.span_queue = queue.Queue()
+            self.span_queue = SpanBuffer(agent.options.max_buffered_spans)
+
+        # When set, the recorder queues finished spans unconverted and the conversion to the
+        # wire format happens in queued_spans (in the reporting thread).  Not available with
+        # the multiprocessing queue of the test suite as unconverted spans can't be pickled.
+        self.defer_span_conversion = agent.options.defer_span_conversion and not env_is_test
+
+        # Optional pool of threads to convert deferred spans with; created on first use
+        self.span_conversion_workers = agent.options.span_conversion_workers
+        self.span_conversion_executor = None
+
+        # With tail based sampling, finished spans are held back here per trace until it is
+        # known if the trace is worth reporting
+        self.tail_buffer = None
+        options = agent.options
+        if options.tail_sampling:
+            self.tail_buffer = TailSamplingBuffer(options.tail_sampling_latency_threshold / 1000.0,
+                                                  options.tail_sampling_endpoints,
+                                                  options.tail_sampling_max_traces,
+                                                  options.tail_sampling_max_spans,
+                                                  options.tail_sampling_ttl)
 
         # The Queue where we store finished profiles before they are sent
         self.profile_queue = queue.Queue()
@@ -64,6 +89,12 @@ class BaseCollector(object):
         # Reporting interval for the background thread(s)
         self.report_interval = 1
 
+        # Adapts the report interval to the span load; created when the reporting thread starts
+        self.report_scheduler = None
+
+        # Number of spans in the last report
+        self.last_report_span_count = 0
+
         # Flag to indicate if start/shutdown state
         self.started = False
 
@@ -113,28 +144,57 @@ class BaseCollector(object):
         @return: None
         """
         self.thread_shutdown.set()
+        if self.report_scheduler is not None:
+            self.report_scheduler.wake()
         if report_final is True:
             logger.debug("Collector.shutdown: Reporting final data.")
             self.prepare_and_report_data()
         self.started = False
 
+        if self.span_conversion_executor is not None:
+            self.span_conversion_executor.shutdown(wait=False)
+            self.span_conversion_executor = None
+
     def thread_loop(self):
         """
         Just a loop that is run in the background thread.
         @return: None
         """
-        every(self.report_interval, self.background_report, "Instana Collector: prepare_and_report_data")
+        options = self.agent.options
+        scheduler = AdaptiveReportScheduler(self.report_interval, options.report_max_interval)
+        self.report_scheduler = scheduler
+        if isinstance(self.span_queue, SpanBuffer):
+            self.span_queue.set_flush_threshold(options.report_flush_threshold, scheduler.flush_event)
 
-    def background_report(self):
+        while True:
+            # Metrics and snapshot data go out on every regular report; spans go with them
+            # when the adaptive span interval elapsed, or on their own when flushed early.
+            early = scheduler.wait()
+            flush_spans = early or scheduler.spans_due()
+            try:
+                if self.background_report(with_metrics=not early, with_spans=flush_spans) is False:
+                    break
+            except Exception:
+                logger.debug("Problem while executing repetitive task: Instana Collector: prepare_and_report_data",
+                             exc_info=True)
+            if flush_spans:
+                scheduler.update(self.last_report_span_count, early)
+
+    def background_report(self, with_metrics=True, with_spans=True):
         """
         The main work-horse method to report data in the background thread.
+        @param with_metrics: report metrics and snapshot data (and any queued profiles)
+        @param with_spans: report the queued spans
         @return: Boolean
         """
         if self.thread_shutdown.is_set():
             logger.debug("Thread shutdown signal is active: Shutting down reporting thread")
             return False
 
-        self.prepare_and_report_data()
+        if with_metrics:
+            self.prepare_and_report_data(with_spans)
+        elif with_spans:
+            self.prepare_and_report_spans()
 
         if self.thread_shutdown.is_set():
             logger.debug("Thread shutdown signal is active: Shutting down reporting thread")
@@ -142,21 +202,56 @@ class BaseCollector(object):
 
         return True
 
-    def prepare_and_report_data(self):
+    def prepare_and_report_data(self, with_spans=True):
         """
         Prepare and report the data payload.
+        @param with_spans: include the queued spans; they stay queued for the next span flush otherwise
         @return: Boolean
         """
         if env_is_test:
             return True
         with self.background_report_lock:
-            payload = self.prepare_payload()
+            self.release_expired_traces()
+            payload = self.prepare_payload(with_spans)
+            self.last_report_span_count = len(payload.get("spans") or ())
             self.agent.report_data_payload(payload)
         return True
 
-    def prepare_payload(self):
+    def prepare_and_report_spans(self):
+        """
+        Report the queued spans without metrics, e.g. when the span buffer fills up early.
+        @return: Boolean
+        """
+        if env_is_test:
+            return True
+        with self.background_report_lock:
+            self.release_expired_traces()
+            payload = DictionaryOfStan()
+            payload["spans"] = self.queued_spans()
+            payload["profiles"] = []
+            payload["metrics"]["plugins"] = []
+            self.last_report_span_count = len(payload["spans"])
+            if payload["spans"]:
+                self.agent.report_data_payload(payload)
+        return True
+
+    def release_expired_traces(self):
+        """
+        Queue the spans of the tail sampled traces that expired and are worth reporting,
+        so that the buffered traces expire even when no more spans finish.
+        @return: None
+        """
+        if self.tail_buffer is None:
+            return
+        for json_span in self.tail_buffer.expire(time.time()):
+            if self.defer_span_conversion is not True:
+                json_span = json_span.materialize()
+            self.span_queue.put(json_span)
+
+    def prepare_payload(self, with_spans=True):
         """
         Method to prepare the data to be reported.
+        @param with_spans: include the queued spans
         @return: DictionaryOfStan()
         """
         logger.debug("BaseCollector: prepare_payload needs to be overridden")
@@ -178,14 +273,12 @@ class BaseCollector(object):
         Get all of the queued spans
         @return: list
         """
-        spans = []
-        while True:
-            try:
-                span = self.span_queue.get(False)
-            except queue.Empty:
-                break
-            else:
-                spans.append(span)
+        spans = drain_span_queue(self.span_queue)
+        if self.defer_span_conversion and spans:
+            if self.span_conversion_workers > 0 and self.span_conversion_executor is None:
+                self.span_conversion_executor = ThreadPoolExecutor(max_workers=self.span_conversion_workers,
+                                                                   thread_name_prefix="Instana Span Conversion")
+            spans = convert_deferred_spans(spans, self.span_conversion_executor)
         return spans
 
 
@@ -15,8 +15,10 @@ from instana.log import logger
 from instana.version import VERSION
 from instana.util import DictionaryOfStan
 from instana.util.runtime import determine_service_name
+from instana.util import sql
 
 from .base import BaseHelper
+from ..span_buffer import SpanBuffer
 
 PATH_OF_AUTOTRACE_WEBHOOK_SITEDIR = '/opt/instana/instrumentation/python/'
 
@@ -30,11 +32,24 @@ def is_webhook_instrumented():
 
 class RuntimeHelper(BaseHelper):
     """ Helper class to collect snapshot and metrics for this Python runtime """
+    # Counters of the TailSamplingBuffer reported as tracer metrics (tail_<name>)
+    TAIL_SAMPLING_STATS = ("hits", "misses", "kept", "dropped", "evicted", "expired")
 
     def __init__(self, collector):
         super(RuntimeHelper, self).__init__(collector)
         self.previous = DictionaryOfStan()
         self.previous_rusage = resource.getrusage(resource.RUSAGE_SELF)
+        self.previous_dropped_spans = 0
+        # (bytes_encoded, bytes_sent, dropped_spans) of the span uploads at the last collection
+        self.previous_span_upload = (0, 0, 0)
+        # (early_reports, idle_backoffs) of the report scheduler at the last collection
+        self.previous_report_scheduler = (0, 0)
+        # Statistics of the tail sampling buffer at the last collection
+        self.previous_tail_sampling = dict.fromkeys(self.TAIL_SAMPLING_STATS, 0)
+        # (hits, misses) of the SQL statement caches at the last collection
+        self.previous_sql_statement_cache = (0, 0)
+        # Samples dropped by the profiler at the last collection
+        self.previous_profiler_dropped_samples = 0
 
         if gc.isenabled():
             self.previous_gc_count = gc.get_count()
@@ -76,6 +91,12 @@ class RuntimeHelper(BaseHelper):
                 self._collect_gc_metrics(plugin_data, with_snapshot)
 
             self._collect_thread_metrics(plugin_data, with_snapshot)
+            self._collect_span_buffer_metrics(plugin_data, with_snapshot)
+            self._collect_span_upload_metrics(plugin_data, with_snapshot)
+            self._collect_report_scheduler_metrics(plugin_data, with_snapshot)
+            self._collect_tail_sampling_metrics(plugin_data, with_snapshot)
+            self._collect_sql_statement_cache_metrics(plugin_data, with_snapshot)
+            self._collect_profiler_metrics(plugin_data, with_snapshot)
 
             value_diff = rusage.ru_utime - self.previous_rusage.ru_utime
             self.apply_delta(value_diff, self.previous['data']['metrics'],
@@ -177,6 +198,117 @@ class RuntimeHelper(BaseHelper):
         except Exception:
             logger.debug("_collect_thread_metrics", exc_info=True)
 
+    def _collect_span_buffer_metrics(self, plugin_data, with_snapshot):
+        try:
+            span_buffer = self.collector.span_queue
+            if not isinstance(span_buffer, SpanBuffer):
+                return
+
+            dropped = span_buffer.dropped
+            value_diff = dropped - self.previous_dropped_spans
+            self.previous_dropped_spans = dropped
+            self.apply_delta(value_diff, self.previous['data']['metrics']['tracer'],
+                             plugin_data['data']['metrics']['tracer'], "dropped_spans", with_snapshot)
+        except Exception:
+            logger.debug("_collect_span_buffer_metrics", exc_info=True)
+
+    def _collect_span_upload_metrics(self, plugin_data, with_snapshot):
+        try:
+            span_uploader = getattr(self.collector.agent, "span_uploader", None)
+            if span_uploader is None:
+                return
+
+            stats = span_uploader.stats
+            current = (stats.bytes_encoded, stats.bytes_sent, stats.dropped_spans)
+            bytes_encoded, bytes_sent, dropped = [now - before for now, before
+                                                  in zip(current, self.previous_span_upload)]
+            self.previous_span_upload = current
+
+            tracer_metrics = plugin_data['data']['metrics']['tracer']
+            previous_tracer_metrics = self.previous['data']['metrics']['tracer']
+            self.apply_delta(bytes_sent, previous_tracer_metrics, tracer_metrics,
+                             "span_bytes_sent", with_snapshot)
+            self.apply_delta(dropped, previous_tracer_metrics, tracer_metrics,
+                             "span_upload_dropped", with_snapshot)
+            if bytes_sent > 0:
+                self.apply_delta(round(bytes_encoded / bytes_sent, 2), previous_tracer_metrics,
+                                 tracer_metrics, "span_compression_ratio", with_snapshot)
+        except Exception:
+            logger.debug("_collect_span_upload_metrics", exc_info=True)
+
+    def _collect_report_scheduler_metrics(self, plugin_data, with_snapshot):
+        try:
+            scheduler = self.collector.report_scheduler
+            if scheduler is None:
+                return
+
+            current = (scheduler.early_reports, scheduler.idle_backoffs)
+            early_reports, idle_backoffs = [now - before for now, before
+                                            in zip(current, self.previous_report_scheduler)]
+            self.previous_report_scheduler = current
+
+            tracer_metrics = plugin_data['data']['metrics']['tracer']
+            previous_tracer_metrics = self.previous['data']['metrics']['tracer']
+            self.apply_delta(int(scheduler.current_interval * 1000), previous_tracer_metrics, tracer_metrics,
+                             "span_flush_interval", with_snapshot)
+            self.apply_delta(early_reports, previous_tracer_metrics, tracer_metrics,
+                             "early_reports", with_snapshot)
+            self.apply_delta(idle_backoffs, previous_tracer_metrics, tracer_metrics,
+                             "idle_backoffs", with_snapshot)
+        except Exception:
+            logger.debug("_collect_report_scheduler_metrics", exc_info=True)
+
+    def _collect_tail_sampling_metrics(self, plugin_data, with_snapshot):
+        try:
+            tail_buffer = self.collector.tail_buffer
+            if tail_buffer is None:
+                return
+
+            tracer_metrics = plugin_data['data']['metrics']['tracer']
+            previous_tracer_metrics = self.previous['data']['metrics']['tracer']
+            for name in self.TAIL_SAMPLING_STATS:
+                value = getattr(tail_buffer, name)
+                self.apply_delta(value - self.previous_tail_sampling[name], previous_tracer_metrics,
+                                 tracer_metrics, "tail_" + name, with_snapshot)
+                self.previous_tail_sampling[name] = value
+
+            self.apply_delta(tail_buffer.buffered_traces(), previous_tracer_metrics, tracer_metrics,
+                             "tail_buffered_traces", with_snapshot)
+        except Exception:
+            logger.debug("_collect_tail_sampling_metrics", exc_info=True)
+
+    def _collect_sql_statement_cache_metrics(self, plugin_data, with_snapshot):
+        try:
+            current = sql.cache_statistics()
+            hits, misses = [now - before for now, before in zip(current, self.previous_sql_statement_cache)]
+            self.previous_sql_statement_cache = current
+
+            tracer_metrics = plugin_data['data']['metrics']['tracer']
+            previous_tracer_metrics = self.previous['data']['metrics']['tracer']
+            self.apply_delta(hits, previous_tracer_metrics, tracer_metrics, "sql_cache_hits", with_snapshot)
+            self.apply_delta(misses, previous_tracer_metrics, tracer_metrics, "sql_cache_misses", with_snapshot)
+            if hits + misses > 0:
+                self.apply_delta(round(hits / (hits + misses), 2), previous_tracer_metrics, tracer_metrics,
+                                 "sql_cache_hit_ratio", with_snapshot)
+        except Exception:
+            logger.debug("_collect_sql_statement_cache_metrics", exc_info=True)
+
+    def _collect_profiler_metrics(self, plugin_data, with_snapshot):
+        try:
+            # The singletons module imports the collectors, hence not imported at the top
+            from instana.singletons import get_profiler  # pylint: disable=import-outside-toplevel
+            profiler = get_profiler()
+            if profiler is None:
+                return
+
+            dropped = profiler.dropped_samples()
+            self.apply_delta(dropped - self.previous_profiler_dropped_samples,
+                             self.previous['data']['metrics']['tracer'],
+                             plugin_data['data']['metrics']['tracer'], "profiler_dropped_samples", with_snapshot)
+            self.previous_profiler_dropped_samples = dropped
+        except Exception:
+            logger.debug("_collect_profiler_metrics", exc_info=True)
+
     def _collect_runtime_snapshot(self, plugin_data):
         """ Gathers Python specific Snapshot information for this process """
         snapshot_payload = {}
@@ -30,7 +30,7 @@ class HostCollector(BaseCollector):
 
         super(HostCollector, self).start()
 
-    def prepare_and_report_data(self):
+    def prepare_and_report_data(self, with_spans=True):
         """
         We override this method from the base class so that we can handle the wait4init
         state machine case.
@@ -51,7 +51,13 @@ class HostCollector(BaseCollector):
         except Exception:
             logger.debug('Harmless state machine thread disagreement.  Will self-correct on next timer cycle.')
 
-        super(HostCollector, self).prepare_and_report_data()
+        super(HostCollector, self).prepare_and_report_data(with_spans)
+
+    def shutdown(self, report_final=True):
+        super(HostCollector, self).shutdown(report_final)
+        if report_final is True:
+            # The final report is sent by the report lanes of the agent
+            self.agent.flush_report_lanes()
 
     def should_send_snapshot_data(self):
         delta = int(time()) - self.snapshot_data_last_sent
@@ -59,14 +65,14 @@ class HostCollector(BaseCollector):
             return True
         return False
 
-    def prepare_payload(self):
+    def prepare_payload(self, with_spans=True):
         payload = DictionaryOfStan()
         payload["spans"] = []
         payload["profiles"] = []
         payload["metrics"]["plugins"] = []
 
         try:
-            if not self.span_queue.empty():
+            if with_spans and not self.span_queue.empty():
                 payload["spans"] = self.queued_spans()
 
             if not self.profile_queue.empty():
@@ -0,0 +1,82 @@
+# (c) Copyright IBM Corp. 2024
+
+"""
+Adaptive scheduling of the span flushes of the collector.
+
+Reports (metrics and snapshot data) are sent every `interval` seconds.  Spans are flushed
+with those reports on a schedule that adapts to the span load:
+- when the span buffer crosses its flush threshold, the spans are flushed right away in a
+  report of their own (but not more often than every `min_interval` seconds)
+- while there are no spans to flush, the span interval doubles up to `max_interval`, which
+  is the longest that a span waits before it is reported
+"""
+import threading
+import time
+
+
+class AdaptiveReportScheduler(object):
+    MIN_INTERVAL = 0.1
+
+    def __init__(self, interval, max_interval=None, min_interval=None):
+        """
+        @param interval: the regular report interval in seconds
+        @param max_interval: the longest span flush interval when idle; defaults to <interval> (no back off)
+        @param min_interval: the shortest time between two span flushes on early flushes
+        """
+        self.interval = interval
+        self.max_interval = max(interval, max_interval or interval)
+        self.min_interval = min(interval, self.MIN_INTERVAL if min_interval is None else min_interval)
+
+        # Current interval of the span flushes; a multiple of <interval>
+        self.current_interval = interval
+
+        # Set (e.g. by the span buffer) to request a span flush before the interval elapsed
+        self.flush_event = threading.Event()
+
+        # Totals of the scheduling decisions, reported as tracer metrics
+        self.early_reports = 0
+        self.idle_backoffs = 0
+
+        self._last_flush = time.time()
+        self._next_report = self._last_flush + interval
+
+    def wait(self):
+        """
+        Block until the next report is due or a span flush is requested early.
+        @return: Boolean - True if a span flush was requested early
+        """
+        early = self.flush_event.wait(max(0, self._next_report - time.time()))
+        if early:
+            self.flush_event.clear()
+            delay = self.min_interval - (time.time() - self._last_flush)
+            if delay > 0:
+                time.sleep(delay)
+        else:
+            # Regular reports keep their cadence, unless the reporting thread fell behind
+            self._next_report = max(self._next_report + self.interval, time.time())
+        return early
+
+    def spans_due(self):
+        """
+        Indicates if the spans are to be flushed with the regular report that is due.
+        Reports are sent on interval ticks, so half an interval of slack absorbs the jitter.
+        """
+        return time.time() - self._last_flush >= self.current_interval - self.interval / 2.0
+
+    def update(self, span_count, early):
+        """
+        Adapt the span flush interval after a flush of <span_count> spans.
+        """
+        self._last_flush = time.time()
+        if early:
+            self.early_reports += 1
+
+        if early or span_count:
+            self.current_interval = self.interval
+        elif self.current_interval < self.max_interval:
+            self.current_interval = min(self.current_interval * 2, self.max_interval)
+            self.idle_backoffs += 1
+
+    def wake(self):
+        """ Cut the current wait short, e.g. on shutdown """
+        self.flush_event.set()
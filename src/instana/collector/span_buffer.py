@@ -0,0 +1,208 @@
+# (c) Copyright IBM Corp. 2024
+
+"""
+A bounded, per-thread buffer for finished spans.
+
+Recording threads append to a list owned by their own thread so that the hot path never
+touches a shared mutex.  The collector takes everything that was buffered in one shot
+with `drain` once per report cycle.
+
+Optionally, spans can be buffered as DeferredSpan so that their conversion to the wire
+format runs in the reporting thread instead of the application thread.
+"""
+import queue
+import threading
+
+from ..log import logger
+
+
+class SpanBuffer(object):
+    """
+    Drop-in replacement for the `queue.Queue` formerly used as the span queue.
+
+    The total capacity is bounded by <max_size>.  Spans arriving while the buffer is full
+    are discarded and counted in `dropped` so that overload is visible in the metrics
+    instead of silently growing memory.
+
+    Under concurrent writers the capacity check and the counters are approximate (they
+    are updated without a lock); the size is re-synchronized on every drain.
+    """
+    DEFAULT_MAX_SIZE = 10000
+
+    def __init__(self, max_size=None):
+        if max_size is None or max_size <= 0:
+            max_size = self.DEFAULT_MAX_SIZE
+        self.max_size = max_size
+
+        # Total number of spans discarded because the buffer was full
+        self.dropped = 0
+
+        # Event set once <flush_threshold> spans are buffered, to trigger an early report
+        self.flush_threshold = None
+        self.flush_event = None
+
+        self._size = 0
+        self._local = threading.local()
+        # List of (thread, buffer) tuples; only modified under _registry_lock
+        self._buffers = []
+        self._registry_lock = threading.Lock()
+        # Serializes drains.  Never taken by the recording threads.
+        self._drain_lock = threading.Lock()
+
+    def _thread_buffer(self):
+        try:
+            return self._local.buffer
+        except AttributeError:
+            buffer = self._local.buffer = []
+            with self._registry_lock:
+                self._buffers = self._buffers + [(threading.current_thread(), buffer)]
+            return buffer
+
+    def put(self, span, block=True, timeout=None):
+        """
+        Append <span> to the buffer of the calling thread.
+        @return: Boolean - False if the span was dropped
+        """
+        if self._size >= self.max_size:
+            self.dropped += 1
+            return False
+
+        self._size += 1
+        self._thread_buffer().append(span)
+        if self._size == self.flush_threshold:
+            self.flush_event.set()
+        return True
+
+    def set_flush_threshold(self, threshold, event):
+        """
+        Set <event> whenever <threshold> spans are buffered.  As the size is maintained
+        without locking, a crossing can be missed under concurrent writers; the regular
+        report interval still applies then.
+        """
+        self.flush_threshold = threshold if threshold and threshold > 0 else None
+        self.flush_event = event
+
+    def put_nowait(self, span):
+        return self.put(span, block=False)
+
+    def get(self, block=True, timeout=None):
+        """
+        Remove and return a single span.  Only provided for `queue.Queue` compatibility;
+        use `drain` to retrieve spans in bulk.
+        """
+        with self._drain_lock:
+            for _, buffer in self._buffers:
+                try:
+                    span = buffer.pop(0)
+                except IndexError:
+                    continue
+                self._size -= 1
+                return span
+        raise queue.Empty
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def qsize(self):
+        return sum(len(buffer) for _, buffer in self._buffers)
+
+    def empty(self):
+        for _, buffer in self._buffers:
+            if buffer:
+                return False
+        return True
+
+    def drain(self):
+        """
+        Take all of the buffered spans at once.
+
+        Only the owning thread ever appends to a buffer and only the drain removes from it,
+        so copying and deleting a known-length prefix is safe without locking the writers.
+        @return: list
+        """
+        spans = []
+        with self._drain_lock:
+            prune = False
+            for thread, buffer in self._buffers:
+                count = len(buffer)
+                if count:
+                    spans.extend(buffer[:count])
+                    del buffer[:count]
+                elif not thread.is_alive():
+                    prune = True
+
+            if prune:
+                # Forget the buffers of threads that have exited
+                with self._registry_lock:
+                    self._buffers = [entry for entry in self._buffers
+                                     if entry[1] or entry[0].is_alive()]
+
+            self._size = self.qsize()
+        return spans
+
+
+def drain_span_queue(span_queue):
+    """
+    Retrieve all of the spans from <span_queue>, which can be a SpanBuffer or any
+    `queue.Queue` compatible object (as used by the test suite).
+    @return: list
+    """
+    if isinstance(span_queue, SpanBuffer):
+        return span_queue.drain()
+
+    spans = []
+    while True:
+        try:
+            span = span_queue.get(False)
+        except queue.Empty:
+            break
+        else:
+            spans.append(span)
+    return spans
+
+
+class DeferredSpan(object):
+    """
+    A finished span whose conversion to the wire format has been deferred to the
+    reporting thread.  <convert> is called with <args> to produce the reportable span.
+    """
+    __slots__ = ("convert", "args")
+
+    def __init__(self, convert, *args):
+        self.convert = convert
+        self.args = args
+
+    def materialize(self):
+        return self.convert(*self.args)
+
+
+def _materialize_spans(spans):
+    converted = []
+    for span in spans:
+        if isinstance(span, DeferredSpan):
+            try:
+                span = span.materialize()
+            except Exception:
+                logger.debug("SpanBuffer: span conversion failed; span dropped", exc_info=True)
+                continue
+        converted.append(span)
+    return converted
+
+
+def convert_deferred_spans(spans, executor=None, chunk_size=500):
+    """
+    Convert any DeferredSpan in <spans> into its reportable form.  Spans that are already
+    converted are passed through unchanged.
+
+    @param spans: list of spans as returned by drain_span_queue
+    @param executor: optional concurrent.futures.Executor to convert in chunks of <chunk_size>
+    @return: list
+    """
+    if executor is None or len(spans) <= chunk_size:
+        return _materialize_spans(spans)
+
+    chunks = [spans[i:i + chunk_size] for i in range(0, len(spans), chunk_size)]
+    converted = []
+    for chunk in executor.map(_materialize_spans, chunks):
+        converted.extend(chunk)
+    return converted
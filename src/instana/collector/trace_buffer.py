@@ -0,0 +1,150 @@
+# (c) Copyright IBM Corp. 2024
+
+"""
+Tail based sampling: finished spans are held back per trace until the local root span of
+the trace finishes.  Only the traces that turn out to be interesting are then reported:
+traces with errors, traces slower than a latency threshold or traces of configured
+endpoints.
+
+The buffer is bounded in traces and spans; the least recently updated traces are evicted
+first and traces whose root doesn't finish within the TTL expire (checked as spans are added
+and on every report cycle, see `expire`).  Evicted and expired traces are reported if they
+are already known to be interesting and dropped otherwise.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class _BufferedTrace(object):
+    __slots__ = ("spans", "errored", "last_update")
+
+    def __init__(self, now):
+        self.spans = []
+        self.errored = False
+        self.last_update = now
+
+
+class TailSamplingBuffer(object):
+    # Number of recent keep/drop decisions remembered for spans that finish after their root
+    MAX_DECISIONS = 1000
+
+    def __init__(self, latency_threshold=1.0, endpoints=None, max_traces=1000, max_spans=10000, ttl=30):
+        """
+        @param latency_threshold: traces whose root span takes at least this long (in seconds) are kept
+        @param endpoints: span operation names or endpoint paths of root spans whose traces are kept
+        @param max_traces: maximum number of traces buffered
+        @param max_spans: maximum number of spans buffered over all traces
+        @param ttl: seconds after the last span of a trace was added before it expires
+        """
+        self.latency_threshold = latency_threshold
+        self.endpoints = frozenset(endpoints or ())
+        self.max_traces = max(1, max_traces)
+        self.max_spans = max(1, max_spans)
+        self.ttl = ttl
+
+        # Statistics, reported as tracer metrics
+        self.hits = 0          # spans added to a trace that was already buffered
+        self.misses = 0        # spans that started a new buffered trace
+        self.kept = 0          # traces reported
+        self.dropped = 0       # uninteresting traces discarded when their root finished
+        self.evicted = 0       # traces removed to stay within the limits
+        self.expired = 0       # traces removed after the TTL
+
+        self.span_count = 0
+        self._traces = OrderedDict()
+        self._decisions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, span, reportable):
+        """
+        Buffer the finished <span> (an InstanaSpan) whose reportable form is <reportable>.
+        @return: list of reportable spans that can be reported now
+        """
+        trace_id = span.context.trace_id
+        errored = (span.tags.get('ec') or 0) > 0
+        now = time.time()
+        released = []
+
+        with self._lock:
+            decision = self._decisions.get(trace_id)
+            if decision is not None:
+                # A straggler of a trace that was already decided on
+                if decision:
+                    released.append(reportable)
+                return released
+
+            trace = self._traces.get(trace_id)
+            if trace is None:
+                self.misses += 1
+                trace = self._traces[trace_id] = _BufferedTrace(now)
+            else:
+                self.hits += 1
+                self._traces.move_to_end(trace_id)
+                trace.last_update = now
+
+            trace.spans.append(reportable)
+            trace.errored = trace.errored or errored
+            self.span_count += 1
+
+            if getattr(span, "local_root", False):
+                del self._traces[trace_id]
+                self.span_count -= len(trace.spans)
+                if trace.errored or self._is_interesting_root(span):
+                    self.kept += 1
+                    self._decide(trace_id, True)
+                    released.extend(trace.spans)
+                else:
+                    self.dropped += 1
+                    self._decide(trace_id, False)
+
+            self._enforce_limits(now, released)
+        return released
+
+    def expire(self, now):
+        """
+        Expire the traces that were not updated within the TTL before <now>, also when no
+        more spans are added to the buffer.
+        @return: list of reportable spans of expired traces that can be reported now
+        """
+        released = []
+        with self._lock:
+            self._enforce_limits(now, released)
+        return released
+
+    def buffered_traces(self):
+        return len(self._traces)
+
+    def _is_interesting_root(self, span):
+        if span.duration >= self.latency_threshold:
+            return True
+        if self.endpoints:
+            if span.operation_name in self.endpoints:
+                return True
+            path = span.tags.get('http.path')
+            if path is not None and path in self.endpoints:
+                return True
+        return False
+
+    def _decide(self, trace_id, keep):
+        self._decisions[trace_id] = keep
+        if len(self._decisions) > self.MAX_DECISIONS:
+            self._decisions.popitem(last=False)
+
+    def _enforce_limits(self, now, released):
+        traces = self._traces
+        deadline = now - self.ttl
+        while traces:
+            trace_id, trace = next(iter(traces.items()))
+            if trace.last_update < deadline:
+                self.expired += 1
+            elif len(traces) > self.max_traces or self.span_count > self.max_spans:
+                self.evicted += 1
+            else:
+                break
+
+            del traces[trace_id]
+            self.span_count -= len(trace.spans)
+            self._decide(trace_id, trace.errored)
+            if trace.errored:
+                released.extend(trace.spans)
@@ -20,7 +20,9 @@ try:
     async def stan_middleware(request, handler):
         try:
             ctx = async_tracer.extract(opentracing.Format.HTTP_HEADERS, request.headers)
-            request['scope'] = async_tracer.start_active_span('aiohttp-server', child_of=ctx)
+            # The path is known up front so that the sampler can apply endpoint overrides
+            request['scope'] = async_tracer.start_active_span('aiohttp-server', child_of=ctx,
+                                                              tags={'http.path': request.path})
             scope = request['scope']
 
             # Query param scrubbing
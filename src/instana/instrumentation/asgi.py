@@ -34,7 +34,6 @@ class InstanaASGIMiddleware:
     def _collect_kvs(self, scope, span):
         try:
             span.set_tag('span.kind', 'entry')
-            span.set_tag('http.path', scope.get('path'))
             span.set_tag('http.method', scope.get('method'))
 
             server = scope.get('server')
@@ -97,7 +96,9 @@ class InstanaASGIMiddleware:
                     span.log_exception(exc)
                     raise
 
-        with async_tracer.start_active_span("asgi", child_of=request_context) as tracing_scope:
+        # The path is known up front so that the sampler can apply endpoint overrides
+        start_tags = {'http.path': scope.get('path')}
+        with async_tracer.start_active_span("asgi", child_of=request_context, tags=start_tags) as tracing_scope:
             self._collect_kvs(scope, tracing_scope.span)
             if 'headers' in scope and agent.options.extra_http_headers is not None:
                 self._extract_custom_headers(tracing_scope.span, scope['headers'])
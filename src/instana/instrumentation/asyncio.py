@@ -9,6 +9,7 @@ from opentracing.scope_managers.contextvars import no_parent_scope
 from ..configurator import config
 from ..log import logger
 from ..singletons import async_tracer
+from ..util.active_scope import no_active_scope
 
 try:
     import asyncio
@@ -16,7 +17,7 @@ try:
     @wrapt.patch_function_wrapper("asyncio", "ensure_future")
     def ensure_future_with_instana(wrapped, instance, argv, kwargs):
         if config["asyncio_task_context_propagation"]["enabled"] is False:
-            with no_parent_scope():
+            with no_parent_scope(), no_active_scope():
                 return wrapped(*argv, **kwargs)
 
         scope = async_tracer.scope_manager.active
@@ -32,7 +33,7 @@ try:
         @wrapt.patch_function_wrapper("asyncio", "create_task")
         def create_task_with_instana(wrapped, instance, argv, kwargs):
             if config["asyncio_task_context_propagation"]["enabled"] is False:
-                with no_parent_scope():
+                with no_parent_scope(), no_active_scope():
                     return wrapped(*argv, **kwargs)
 
             scope = async_tracer.scope_manager.active
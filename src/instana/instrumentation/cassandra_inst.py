@@ -8,6 +8,7 @@ https://github.com/datastax/python-driver
 """
 import wrapt
 from ..log import logger
+from ..util.sql import sql_normalizer, statement_fingerprint
 from ..util.traceutils import get_tracer_tuple, tracing_is_off
 
 try:
@@ -58,9 +59,11 @@ try:
 
         ctags = {}
         if isinstance(fn.query, cassandra.query.SimpleStatement):
-            ctags["cassandra.query"] = fn.query.query_string
+            ctags["cassandra.query"] = sql_normalizer(fn.query.query_string)
         elif isinstance(fn.query, cassandra.query.BoundStatement):
-            ctags["cassandra.query"] = fn.query.prepared_statement.query_string
+            ctags["cassandra.query"] = sql_normalizer(fn.query.prepared_statement.query_string)
+        if "cassandra.query" in ctags:
+            ctags["cassandra.fingerprint"] = statement_fingerprint(ctags["cassandra.query"])
 
         ctags["cassandra.keyspace"] = fn.session.keyspace
         ctags["cassandra.cluster"] = fn.session.cluster.metadata.cluster_name
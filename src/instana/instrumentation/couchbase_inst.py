@@ -9,6 +9,7 @@ https://docs.couchbase.com/python-sdk/2.5/start-using-sdk.html
 import wrapt
 
 from ..log import logger
+from ..util.sql import sql_normalizer, statement_fingerprint
 from ..util.traceutils import get_tracer_tuple, tracing_is_off
 
 try:
@@ -46,7 +47,9 @@ try:
                 else:
                     query = query_arg
 
+                query = sql_normalizer(query)
                 scope.span.set_tag('couchbase.sql', query)
+                scope.span.set_tag('couchbase.fingerprint', statement_fingerprint(query))
         except:
             # No fail on key capture - best effort
             pass
@@ -48,7 +48,9 @@ class InstanaMiddleware(MiddlewareMixin):
             env = request.environ
 
             ctx = tracer.extract(ot.Format.HTTP_HEADERS, env)
-            request.iscope = tracer.start_active_span('django', child_of=ctx)
+            # The path is known up front so that the sampler can apply endpoint overrides
+            start_tags = {'http.path': env['PATH_INFO']} if 'PATH_INFO' in env else None
+            request.iscope = tracer.start_active_span('django', child_of=ctx, tags=start_tags)
 
             self._extract_custom_headers(request.iscope.span, env, format=True)
 
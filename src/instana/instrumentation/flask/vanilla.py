@@ -22,7 +22,9 @@ def before_request_with_instana(*argv, **kwargs):
         env = flask.request.environ
         ctx = tracer.extract(opentracing.Format.HTTP_HEADERS, env)
 
-        flask.g.scope = tracer.start_active_span('wsgi', child_of=ctx)
+        # The path is known up front so that the sampler can apply endpoint overrides
+        start_tags = {'http.path': env['PATH_INFO']} if 'PATH_INFO' in env else None
+        flask.g.scope = tracer.start_active_span('wsgi', child_of=ctx, tags=start_tags)
         span = flask.g.scope.span
 
         extract_custom_headers(span, env, format=True)
@@ -6,6 +6,7 @@ Instrumentation for the gevent package.
 """
 
 import sys
+import contextvars
 from ..log import logger
 from ..singletons import tracer
 
@@ -29,6 +30,10 @@ def instrument_gevent():
                 # TODO: Change to our own ScopeManagers
                 parent_scope_clone = _GeventScope(parent_scope.manager, parent_scope.span, finish_on_close=False)
                 tracer._scope_manager._set_greenlet_scope(parent_scope_clone, new_greenlet)
+                # Greenlets start with an empty context: carry over the active scope registry
+                # (see util.active_scope)
+                if hasattr(new_greenlet, "gr_context"):
+                    new_greenlet.gr_context = contextvars.copy_context()
 
         logger.debug(" -> Updating tracer to use gevent based context management")
         tracer._scope_manager = GeventScopeManager()
@@ -7,7 +7,7 @@ import wrapt
 
 from ..log import logger
 from ..util.traceutils import get_tracer_tuple, tracing_is_off
-from ..util.sql import sql_sanitizer
+from ..util.sql import sql_sanitizer, statement_fingerprint
 
 
 class CursorWrapper(wrapt.ObjectProxy):
@@ -28,7 +28,9 @@ class CursorWrapper(wrapt.ObjectProxy):
             if db_parameter_name:
                 span.set_tag(ext.DATABASE_INSTANCE, self._connect_params[1][db_parameter_name])
 
-            span.set_tag(ext.DATABASE_STATEMENT, sql_sanitizer(sql))
+            statement = sql_sanitizer(sql)
+            span.set_tag(ext.DATABASE_STATEMENT, statement)
+            span.set_tag('db.fingerprint', statement_fingerprint(statement))
             span.set_tag(ext.DATABASE_USER, self._connect_params[1]['user'])
             span.set_tag('host', self._connect_params[1]['host'])
             span.set_tag('port', self._connect_params[1]['port'])
@@ -31,7 +31,8 @@ class InstanaTweenFactory(object):
 
     def __call__(self, request):
         ctx = tracer.extract(ot.Format.HTTP_HEADERS, dict(request.headers))
-        scope = tracer.start_active_span('http', child_of=ctx)
+        # The path is known up front so that the sampler can apply endpoint overrides
+        scope = tracer.start_active_span('http', child_of=ctx, tags={'http.path': request.path})
 
         scope.span.set_tag(ext.SPAN_KIND, ext.SPAN_KIND_RPC_SERVER)
         scope.span.set_tag("http.host", request.host)
@@ -107,9 +107,9 @@ try:
                 pass
             headers = request.headers.copy()
             ctx = async_tracer.extract(opentracing.Format.HTTP_HEADERS, headers)
-            with async_tracer.start_active_span("asgi", child_of=ctx) as scope:
+            # The path is known up front so that the sampler can apply endpoint overrides
+            with async_tracer.start_active_span("asgi", child_of=ctx, tags={'http.path': request.path}) as scope:
                 scope.span.set_tag('span.kind', 'entry')
-                scope.span.set_tag('http.path', request.path)
                 scope.span.set_tag('http.method', request.method)
                 scope.span.set_tag('http.host', request.host)
                 if hasattr(request, "url"):
@@ -6,6 +6,7 @@ import re
 from operator import attrgetter
 
 from ..log import logger
+from ..util.sql import sql_normalizer, statement_fingerprint
 from ..util.traceutils import get_tracer_tuple, tracing_is_off
 
 try:
@@ -31,7 +32,9 @@ try:
 
             conn = kw['conn']
             url = str(conn.engine.url)
-            scope.span.set_tag('sqlalchemy.sql', kw['statement'])
+            statement = sql_normalizer(kw['statement'])
+            scope.span.set_tag('sqlalchemy.sql', statement)
+            scope.span.set_tag('sqlalchemy.fingerprint', statement_fingerprint(statement))
             scope.span.set_tag('sqlalchemy.eng', conn.engine.name)
             scope.span.set_tag('sqlalchemy.url', url_regexp.sub('//', url))
         except Exception as e:
@@ -43,7 +43,9 @@ try:
                 if hasattr(instance.request.headers, '__dict__') and '_dict' in instance.request.headers.__dict__:
                     ctx = tornado_tracer.extract(opentracing.Format.HTTP_HEADERS,
                                                  instance.request.headers.__dict__['_dict'])
-                scope = tornado_tracer.start_active_span('tornado-server', child_of=ctx)
+                # The path is known up front so that the sampler can apply endpoint overrides
+                scope = tornado_tracer.start_active_span('tornado-server', child_of=ctx,
+                                                         tags={'http.path': instance.request.path})
 
                 # Query param scrubbing
                 if instance.request.query is not None and len(instance.request.query) > 0:
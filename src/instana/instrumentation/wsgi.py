@@ -36,7 +36,9 @@ class InstanaWSGIMiddleware(object):
             return res
 
         ctx = tracer.extract(ot.Format.HTTP_HEADERS, env)
-        self.scope = tracer.start_active_span("wsgi", child_of=ctx)
+        # The path is known up front so that the sampler can apply endpoint overrides
+        start_tags = {'http.path': env['PATH_INFO']} if 'PATH_INFO' in env else None
+        self.scope = tracer.start_active_span("wsgi", child_of=ctx, tags=start_tags)
 
         if agent.options.extra_http_headers is not None:
             for custom_header in agent.options.extra_http_headers:
@@ -45,8 +47,6 @@ class InstanaWSGIMiddleware(object):
                 if wsgi_header in env:
                     self.scope.span.set_tag("http.header.%s" % custom_header, env[wsgi_header])
 
-        if 'PATH_INFO' in env:
-            self.scope.span.set_tag('http.path', env['PATH_INFO'])
         if 'QUERY_STRING' in env and len(env['QUERY_STRING']):
             scrubbed_params = strip_secrets_from_query(env['QUERY_STRING'], agent.options.secrets_matcher,
                                                        agent.options.secrets_list)
@@ -18,6 +18,46 @@ import logging
 
 from .log import logger
 from .util.runtime import determine_service_name
+from .sampling import parse_sampling_overrides
+
+
+def int_from_env(name, default):
+    """
+    Integer value of the environment variable <name>, or <default> if it is unset or invalid.
+    """
+    value = os.environ.get(name, None)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning("Likely invalid %s=%s value.  Using default.", name, value)
+        return default
+
+
+def float_from_env(name, default):
+    """
+    Float value of the environment variable <name>, or <default> if it is unset or invalid.
+    """
+    value = os.environ.get(name, None)
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        logger.warning("Likely invalid %s=%s value.  Using default.", name, value)
+        return default
+
+
+def bool_from_env(name, default=False):
+    """
+    Boolean value of the environment variable <name>: True for "1" or "true" (in any case),
+    or <default> if it is unset.
+    """
+    value = os.environ.get(name, None)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true')
 
 
 class BaseOptions(object):
@@ -40,6 +80,55 @@ class BaseOptions(object):
         if os.environ.get("INSTANA_ALLOW_EXIT_AS_ROOT", None) == '1':
             self.allow_exit_as_root = True
 
+        # Maximum number of finished spans buffered between two reports
+        self.max_buffered_spans = int_from_env("INSTANA_MAX_BUFFERED_SPANS", None)
+
+        # Convert finished spans to the wire format in the reporting thread instead of the
+        # application thread, optionally using a pool of worker threads
+        self.defer_span_conversion = bool_from_env("INSTANA_DEFER_SPAN_CONVERSION")
+        self.span_conversion_workers = int_from_env("INSTANA_SPAN_CONVERSION_WORKERS", 0)
+
+        # Longest span flush interval in seconds (backing off while no spans are recorded) and
+        # number of buffered spans that trigger a flush before the interval elapsed
+        self.report_max_interval = int_from_env("INSTANA_REPORT_MAX_INTERVAL", 5)
+        self.report_flush_threshold = int_from_env("INSTANA_REPORT_FLUSH_THRESHOLD", 1000)
+
+        # Head based sampling of new traces: sampling rate (0.0 - 1.0), maximum number of sampled
+        # traces per second (0 for no limit) and rate overrides per span operation name, endpoint
+        # path or service ("service:<name>") in the format <key>=<rate>[;<key>=<rate>]
+        self.sampling_rate = float_from_env("INSTANA_SAMPLING_RATE", 1.0)
+        self.sampling_max_traces_per_second = int_from_env("INSTANA_SAMPLING_MAX_TRACES_PER_SECOND", 0)
+        self.sampling_overrides = parse_sampling_overrides(os.environ.get("INSTANA_SAMPLING_OVERRIDES", None))
+
+        # Tail based sampling: hold finished spans back until the local root span finishes and only
+        # report traces with errors, slower than the latency threshold (in milliseconds) or of the
+        # listed endpoints (comma separated span operation names or paths)
+        self.tail_sampling = bool_from_env("INSTANA_TAIL_SAMPLING")
+        self.tail_sampling_latency_threshold = int_from_env("INSTANA_TAIL_SAMPLING_LATENCY_THRESHOLD", 1000)
+        self.tail_sampling_endpoints = [endpoint.strip() for endpoint in
+                                        os.environ.get("INSTANA_TAIL_SAMPLING_ENDPOINTS", "").split(',')
+                                        if endpoint.strip()]
+        self.tail_sampling_max_traces = int_from_env("INSTANA_TAIL_SAMPLING_MAX_TRACES", 1000)
+        self.tail_sampling_max_spans = int_from_env("INSTANA_TAIL_SAMPLING_MAX_SPANS", 10000)
+        self.tail_sampling_ttl = int_from_env("INSTANA_TAIL_SAMPLING_TTL", 30)
+
+        # AutoProfile: CPU samples of every thread rather than of the main thread only, and
+        # sampled allocation profiles with a lower memory overhead
+        self.autoprofile_all_threads = bool_from_env("INSTANA_AUTOPROFILE_ALL_THREADS")
+        self.autoprofile_allocation_sampling = bool_from_env("INSTANA_AUTOPROFILE_ALLOCATION_SAMPLING")
+
+        # Stack traces of exit spans: "all", "error" (only errored spans), "sampled" (one in
+        # <stack_trace_sample_every> spans) or "none", and their maximum length
+        self.stack_trace = "all"
+        value = os.environ.get("INSTANA_STACK_TRACE", None)
+        if value is not None:
+            if value.lower() in ("all", "error", "sampled", "none"):
+                self.stack_trace = value.lower()
+            else:
+                logger.warning("Likely invalid INSTANA_STACK_TRACE=%s value.  Using default.", value)
+        self.stack_trace_length = int_from_env("INSTANA_STACK_TRACE_LENGTH", 30)
+        self.stack_trace_sample_every = max(1, int_from_env("INSTANA_STACK_TRACE_SAMPLE_EVERY", 10))
+
         # Defaults
         self.secrets_matcher = 'contains-ignore-case'
         self.secrets_list = ['key', 'pass', 'secret']
@@ -72,6 +161,15 @@ class StandardOptions(BaseOptions):
         if not isinstance(self.agent_port, int):
             self.agent_port = int(self.agent_port)
 
+        # Spans are posted to the agent in chunks of at most this many spans / bytes
+        self.span_upload_max_spans = int_from_env("INSTANA_SPAN_UPLOAD_MAX_SPANS", 1000)
+        self.span_upload_max_bytes = int_from_env("INSTANA_SPAN_UPLOAD_MAX_BYTES", 1048576)
+        self.span_upload_gzip = bool_from_env("INSTANA_SPAN_UPLOAD_GZIP")
+        # Number of failed chunks that are retried per report
+        self.span_upload_retries = int_from_env("INSTANA_SPAN_UPLOAD_RETRIES", 1)
+        # Number of reports per payload type (spans, profiles, metrics) that may wait to be sent
+        self.report_lane_max_pending = int_from_env("INSTANA_REPORT_LANE_MAX_PENDING", 2)
+
 
 class ServerlessOptions(BaseOptions):
     """ Base class for serverless environments.  Holds settings common to all serverless environments. """
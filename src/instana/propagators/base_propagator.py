@@ -24,6 +24,9 @@ from instana.w3c_trace_context.tracestate import Tracestate
 # For injection, we only support the standard format:
 #   X-Instana-T
 
+# Marks an incoming tracestate that could not be parsed: it is propagated unchanged
+_UNPARSABLE = object()
+
 
 class BasePropagator(object):
     HEADER_KEY_T = 'X-INSTANA-T'
@@ -61,6 +64,27 @@ class BasePropagator(object):
     B_ALT_HEADER_KEY_TRACEPARENT = b'http_traceparent'
     B_ALT_HEADER_KEY_TRACESTATE = b'http_tracestate'
 
+    # Lower cased header key -> slot in the list filled by `_scan_headers`.  Each of the
+    # extracted headers has four slots, in order of precedence: standard, alternate, and
+    # the byte variations of both.
+    _EXTRACTED_HEADERS = ("t", "s", "l", "synthetic", "traceparent", "tracestate")
+    _HEADER_SLOTS = {}
+    for _index, _keys in enumerate((
+            (LC_HEADER_KEY_T, ALT_LC_HEADER_KEY_T, B_HEADER_KEY_T, B_ALT_LC_HEADER_KEY_T),
+            (LC_HEADER_KEY_S, ALT_LC_HEADER_KEY_S, B_HEADER_KEY_S, B_ALT_LC_HEADER_KEY_S),
+            (LC_HEADER_KEY_L, ALT_LC_HEADER_KEY_L, B_HEADER_KEY_L, B_ALT_LC_HEADER_KEY_L),
+            (LC_HEADER_KEY_SYNTHETIC, ALT_LC_HEADER_KEY_SYNTHETIC, B_HEADER_KEY_SYNTHETIC,
+             B_ALT_LC_HEADER_KEY_SYNTHETIC),
+            (HEADER_KEY_TRACEPARENT, ALT_HEADER_KEY_TRACEPARENT, B_HEADER_KEY_TRACEPARENT,
+             B_ALT_HEADER_KEY_TRACEPARENT),
+            (HEADER_KEY_TRACESTATE, ALT_HEADER_KEY_TRACESTATE, B_HEADER_KEY_TRACESTATE,
+             B_ALT_HEADER_KEY_TRACESTATE))):
+        for _priority, _key in enumerate(_keys):
+            _HEADER_SLOTS[_key] = _index * 4 + _priority
+    # Only keys of these lengths are lower cased and looked up
+    _HEADER_KEY_LENGTHS = frozenset(len(_key) for _key in _HEADER_SLOTS)
+    del _index, _keys, _priority, _key
+
     def __init__(self):
         self._tp = Traceparent()
         self._ts = Tracestate()
@@ -86,32 +110,55 @@ class BasePropagator(object):
         return dc
 
     @staticmethod
-    def _get_ctx_level(level):
+    def _parse_level(level):
         """
-        Extract the level value and return it, as it may include correlation values
+        Parse the X-INSTANA-L header, which may include correlation values, e.g.
+        "1,correlationType=web;correlationId=1234"
         :param level:
-        :return:
+        :return: level, correlation type, correlation id
         """
+        ctx_level, correlation_type, correlation_id = 1, None, None
+        if not level:
+            return ctx_level, correlation_type, correlation_id
+
+        correlation = None
         try:
-            ctx_level = int(level.split(",")[0]) if level else 1
+            value, _, correlation = level.partition(",")
+            ctx_level = int(value)
         except Exception:
             ctx_level = 1
-        return ctx_level
 
-    @staticmethod
-    def _set_correlation_properties(level, ctx):
+        if correlation:
+            for item in correlation.split(";"):
+                name, separator, value = item.partition("=")
+                if not separator:
+                    continue
+                name = name.strip()
+                if name == "correlationType":
+                    correlation_type = value
+                elif name == "correlationId":
+                    correlation_id = value
+            if correlation_type is None:
+                correlation_id = None
+        return ctx_level, correlation_type, correlation_id
+
+    def _parse_w3c_upstream(self, traceparent, tracestate):
         """
-        Set the correlation values if they are present
-        :param level:
-        :param ctx:
-        :return:
+        Parse the parts of the incoming traceparent and tracestate that are propagated unchanged, so that
+        injecting only has to splice in the instana values
+        :param traceparent:
+        :param tracestate:
+        :return: traceparent, tracestate, traceparent trace id, tracestate list members
         """
+        tp_trace_id = None
+        if traceparent is not None:
+            _, tp_trace_id, _, _ = self._tp.get_traceparent_fields(traceparent)
         try:
-            ctx.correlation_type = level.split(",")[1].split("correlationType=")[1].split(";")[0]
-            if "correlationId" in level:
-                ctx.correlation_id = level.split(",")[1].split("correlationId=")[1].split(";")[0]
+            members = self._ts.upstream_members(tracestate)
         except Exception:
-            logger.debug("extract instana correlation type/id error:", exc_info=True)
+            logger.debug("Something went wrong while parsing tracestate: {}:".format(tracestate), exc_info=True)
+            members = _UNPARSABLE
+        return traceparent, tracestate, tp_trace_id, members
 
     def _get_participating_trace_context(self, span_context):
         """
@@ -119,13 +166,21 @@ class BasePropagator(object):
         :param span_context:
         :return: traceparent, tracestate
         """
-        if span_context.long_trace_id and not span_context.trace_parent:
-            tp_trace_id = span_context.long_trace_id
-        else:
-            tp_trace_id = span_context.trace_id
         traceparent = span_context.traceparent
         tracestate = span_context.tracestate
-        traceparent = self._tp.update_traceparent(traceparent, tp_trace_id, span_context.span_id, span_context.level)
+
+        upstream = span_context.w3c_upstream
+        if upstream is None or upstream[0] is not traceparent or upstream[1] is not tracestate:
+            # Not extracted by us, or changed since
+            upstream = span_context.w3c_upstream = self._parse_w3c_upstream(traceparent, tracestate)
+
+        if traceparent is not None:
+            tp_trace_id = upstream[2]
+        elif span_context.long_trace_id and not span_context.trace_parent:
+            tp_trace_id = span_context.long_trace_id.zfill(32)
+        else:
+            tp_trace_id = span_context.trace_id.zfill(32)
+        traceparent = self._tp.format_traceparent(tp_trace_id, span_context.span_id, span_context.level)
 
         # In suppression mode do not update the tracestate and
         # do not add the 'in=' key-value pair to the incoming tracestate
@@ -133,7 +188,9 @@ class BasePropagator(object):
         if span_context.suppression:
             return traceparent, tracestate
 
-        tracestate = self._ts.update_tracestate(tracestate, span_context.trace_id, span_context.span_id)
+        members = upstream[3]
+        if members is not _UNPARSABLE:
+            tracestate = self._ts.format_tracestate(members, span_context.trace_id, span_context.span_id)
         return traceparent, tracestate
 
     def __determine_span_context(self, trace_id, span_id, level, synthetic, traceparent, tracestate,
@@ -159,7 +216,7 @@ class BasePropagator(object):
             trace_id, span_id = [None] * 2
             correlation = True
 
-        ctx_level = self._get_ctx_level(level)
+        ctx_level, correlation_type, correlation_id = self._parse_level(level)
         if ctx_level == 0 or level == '0':
             trace_id = ctx.trace_id = None
             span_id = ctx.span_id = None
@@ -197,16 +254,51 @@ class BasePropagator(object):
             ctx.synthetic = synthetic
 
         if correlation:
-            self._set_correlation_properties(level, ctx)
+            ctx.correlation_type = correlation_type
+            ctx.correlation_id = correlation_id
 
         if traceparent:
             ctx.traceparent = traceparent
             ctx.tracestate = tracestate
+            ctx.w3c_upstream = self._parse_w3c_upstream(traceparent, tracestate)
 
         ctx.level = ctx_level
 
         return ctx
 
+    @classmethod
+    def _scan_headers(cls, carrier):
+        """
+        Walk the carrier once and pick the tracing headers out of it.  List and tuple
+        carriers (e.g. ASGI scopes) are scanned as is, without converting them into a dict.
+
+        :param carrier: dict, object or list of key-value pairs
+        :return: list with a slot per header key variation, as given by _HEADER_SLOTS
+        """
+        if isinstance(carrier, dict):
+            items = carrier.items()
+        elif hasattr(carrier, "__dict__"):
+            items = carrier.__dict__.items()
+        elif isinstance(carrier, (list, tuple)):
+            items = carrier
+        else:
+            items = dict(carrier).items()
+
+        slots = cls._HEADER_SLOTS
+        lengths = cls._HEADER_KEY_LENGTHS
+        found = [None] * (len(cls._EXTRACTED_HEADERS) * 4)
+        for key, value in items:
+            if len(key) in lengths:
+                slot = slots.get(key.lower())
+                if slot is not None:
+                    found[slot] = value
+        return found
+
+    @staticmethod
+    def _header_value(found, index):
+        # The first non empty value of the variations of the header at <index>
+        return found[index * 4] or found[index * 4 + 1] or found[index * 4 + 2] or found[index * 4 + 3]
+
     def extract_instana_headers(self, dc):
         """
         Search carrier for the *HEADER* keys and return the tracing key-values
@@ -243,31 +335,6 @@ class BasePropagator(object):
 
         return trace_id, span_id, level, synthetic
 
-    def __extract_w3c_trace_context_headers(self, dc):
-        """
-        Search carrier for the *HEADER* keys and return the tracing key-values
-
-        :param dc: The dict or list potentially containing context
-        :return: traceparent, tracestate
-        """
-        traceparent, tracestate = [None] * 2
-
-        try:
-            traceparent = dc.get(self.HEADER_KEY_TRACEPARENT) or dc.get(self.ALT_HEADER_KEY_TRACEPARENT) or dc.get(
-                self.B_HEADER_KEY_TRACEPARENT) or dc.get(self.B_ALT_HEADER_KEY_TRACEPARENT)
-            if traceparent and isinstance(traceparent, bytes):
-                traceparent = traceparent.decode("utf-8")
-
-            tracestate = dc.get(self.HEADER_KEY_TRACESTATE) or dc.get(self.ALT_HEADER_KEY_TRACESTATE) or dc.get(
-                self.B_HEADER_KEY_TRACESTATE) or dc.get(self.B_ALT_HEADER_KEY_TRACESTATE)
-            if tracestate and isinstance(tracestate, bytes):
-                tracestate = tracestate.decode("utf-8")
-
-        except Exception:
-            logger.debug("extract error:", exc_info=True)
-
-        return traceparent, tracestate
-
     def extract(self, carrier, disable_w3c_trace_context=False):
         """
         This method overrides one of the Baseclasses as with the introduction of W3C trace context for the HTTP
@@ -278,14 +345,28 @@ class BasePropagator(object):
         """
         try:
             traceparent, tracestate = [None] * 2
-            headers = self.extract_headers_dict(carrier=carrier)
-            if headers is None:
+            try:
+                found = self._scan_headers(carrier)
+            except Exception:
+                logger.debug("extract: Couldn't convert %s", carrier)
                 return None
-            headers = {k.lower(): v for k, v in headers.items()}
 
-            trace_id, span_id, level, synthetic = self.extract_instana_headers(dc=headers)
+            trace_id, span_id, level, synthetic = [self._header_value(found, index) for index in range(4)]
+            if trace_id:
+                trace_id = header_to_long_id(trace_id)
+            if span_id:
+                span_id = header_to_id(span_id)
+            if level and isinstance(level, bytes):
+                level = level.decode("utf-8")
+            if synthetic:
+                synthetic = synthetic in ['1', b'1']
+
             if not disable_w3c_trace_context:
-                traceparent, tracestate = self.__extract_w3c_trace_context_headers(dc=headers)
+                traceparent, tracestate = self._header_value(found, 4), self._header_value(found, 5)
+                if traceparent and isinstance(traceparent, bytes):
+                    traceparent = traceparent.decode("utf-8")
+                if tracestate and isinstance(tracestate, bytes):
+                    tracestate = tracestate.decode("utf-8")
 
             if traceparent:
                 traceparent = self._tp.validate(traceparent)
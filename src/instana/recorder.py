@@ -4,26 +4,17 @@
 # Accept, process and queue spans for eventual reporting.
 
 import os
-import queue
 import sys
 
-from basictracer import Sampler
-
-from .span import RegisteredSpan, SDKSpan
+from .span import RegisteredSpan, SDKSpan, SPAN_TYPES
+from .collector.span_buffer import DeferredSpan, convert_deferred_spans, drain_span_queue
+from .sampling import InstanaSampler  # pylint: disable=unused-import
 
 
 
 class StanRecorder(object):
     THREAD_NAME = "Instana Span Reporting"
 
-    REGISTERED_SPANS = ("aiohttp-client", "aiohttp-server", "aws.lambda.entry",
-                        "boto3", "cassandra", "celery-client", "celery-worker",
-                        "couchbase", "django", "gcs", "gcps-producer",
-                        "gcps-consumer", "log", "memcache", "mongo", "mysql",
-                        "postgres", "pymongo", "rabbitmq", "redis","render",
-                        "rpc-client", "rpc-server", "sqlalchemy", "tornado-client",
-                        "tornado-server", "urllib3", "wsgi", "asgi")
-
     # Recorder thread for collection/reporting of spans
     thread = None
 
@@ -42,25 +33,15 @@ class StanRecorder(object):
 
     def queued_spans(self):
         """ Get all of the spans in the queue """
-        span = None
-        spans = []
-
         import time
         from .singletons import env_is_test
         if env_is_test is True:
             time.sleep(1)
 
         if self.agent.collector.span_queue.empty() is True:
-            return spans
+            return []
 
-        while True:
-            try:
-                span = self.agent.collector.span_queue.get(False)
-            except queue.Empty:
-                break
-            else:
-                spans.append(span)
-        return spans
+        return convert_deferred_spans(drain_span_queue(self.agent.collector.span_queue))
 
     def clear_spans(self):
         """ Clear the queue of spans """
@@ -69,7 +50,8 @@ class StanRecorder(object):
 
     def record_span(self, span):
         """
-        Convert the passed BasicSpan into and add it to the span queue
+        Convert the passed BasicSpan into and add it to the span queue.  If the collector
+        defers span conversion, the span is queued as is and converted by the reporting thread.
         """
         if span.context.suppression:
             return
@@ -80,17 +62,30 @@ class StanRecorder(object):
             if "INSTANA_SERVICE_NAME" in os.environ:
                 service_name = self.agent.options.service_name
 
-            if span.operation_name in self.REGISTERED_SPANS:
-                json_span = RegisteredSpan(span, source, service_name)
+            collector = self.agent.collector
+            tail_buffer = collector.tail_buffer
+            if collector.defer_span_conversion is True or tail_buffer is not None:
+                # Spans held back by tail based sampling are only converted if they are reported
+                json_span = DeferredSpan(self.convert_span, span, source, service_name)
             else:
-                service_name = self.agent.options.service_name
-                json_span = SDKSpan(span, source, service_name)
+                json_span = self.convert_span(span, source, service_name)
+
+            if tail_buffer is None:
+                # logger.debug("Recorded span: %s", json_span)
+                collector.span_queue.put(json_span)
+                return
 
-            # logger.debug("Recorded span: %s", json_span)
-            self.agent.collector.span_queue.put(json_span)
+            for json_span in tail_buffer.add(span, json_span):
+                if collector.defer_span_conversion is not True:
+                    json_span = json_span.materialize()
+                collector.span_queue.put(json_span)
 
+    def convert_span(self, span, source, service_name):
+        """
+        Convert the passed BasicSpan into a RegisteredSpan or SDKSpan
+        """
+        if span.operation_name in SPAN_TYPES:
+            return RegisteredSpan(span, source, service_name)
 
-class InstanaSampler(Sampler):
-    def sampled(self, _):
-        # We never sample
-        return False
+        service_name = self.agent.options.service_name
+        return SDKSpan(span, source, service_name)
@@ -0,0 +1,131 @@
+# (c) Copyright IBM Corp. 2024
+
+"""
+Head based sampling of new traces.
+
+The decision is taken once, when the local root span of a trace is started, and applies
+to the whole trace: unsampled traces get level 0, which suppresses the recording of their
+spans here and is propagated downstream (X-INSTANA-L: 0 and the sampled flag of the W3C
+traceparent) so that the services called honour it as well.
+"""
+import threading
+import time
+
+from basictracer import Sampler
+
+from .log import logger
+
+
+class TokenBucket(object):
+    """ Allows up to <rate> takes per second, with bursts of up to <rate> """
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.tokens = self.rate
+        self.last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """
+        @return: Boolean - True if a token was available
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+def parse_sampling_overrides(value):
+    """
+    Parse the sampling rate overrides from the format <key>=<rate>[;<key>=<rate>], where
+    <key> is a span operation name (e.g. "wsgi"), an endpoint path (e.g. "/health") or a
+    service name with the prefix "service:" (e.g. "service:checkout").
+    @return: dict
+    """
+    overrides = {}
+    if not value:
+        return overrides
+
+    for item in value.split(';'):
+        key, _, rate = item.partition('=')
+        key = key.strip()
+        try:
+            overrides[key] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            logger.warning("Couldn't parse the sampling rate override: %s", item)
+    return overrides
+
+
+class InstanaSampler(Sampler):
+    """
+    Samples new traces with a probability of <rate> (0.0 - 1.0), or the override configured
+    for the endpoint path, span operation name or service of the root span (in that order of
+    precedence), and caps the number of sampled traces per second at <max_traces_per_second>
+    (0 for no cap).  The service of a root span is its "service" tag or <service_name>.
+
+    With the defaults every trace is sampled and `enabled` is False, so that the tracer
+    can skip the sampler altogether.
+    """
+
+    SERVICE_PREFIX = "service:"
+
+    def __init__(self, rate=1.0, max_traces_per_second=0, overrides=None, service_name=None):
+        self.rate = min(1.0, max(0.0, rate))
+        self.overrides = overrides or {}
+        self.service_name = service_name
+        self.rate_limiter = TokenBucket(max_traces_per_second) if max_traces_per_second > 0 else None
+        self.enabled = self.rate < 1.0 or self.rate_limiter is not None or bool(self.overrides)
+
+        # Traces not sampled because of the sampling rate or the rate limit
+        self.sampled_out = 0
+        self.rate_limited = 0
+
+    @classmethod
+    def from_options(cls, options):
+        """ Create the sampler configured in <options> (see BaseOptions) """
+        if options is None:
+            return cls()
+        return cls(options.sampling_rate, options.sampling_max_traces_per_second, options.sampling_overrides,
+                   options.service_name)
+
+    def sampled(self, trace_id):
+        return self.should_sample(trace_id)
+
+    def should_sample(self, trace_id, operation_name=None, tags=None):
+        """
+        Decide if the trace <trace_id> that starts with a span <operation_name> is sampled.
+        @param trace_id: the trace id as hex string
+        @param tags: the tags the root span is started with; an "http.path" tag selects
+          the override of that endpoint and a "service" tag the override of that service
+        @return: Boolean
+        """
+        if not self.enabled:
+            return True
+
+        rate = self.rate
+        if self.overrides:
+            path = tags.get("http.path") if tags else None
+            service = (tags.get("service") if tags else None) or self.service_name
+            service_key = self.SERVICE_PREFIX + service if service else None
+            if path in self.overrides:
+                rate = self.overrides[path]
+            elif operation_name in self.overrides:
+                rate = self.overrides[operation_name]
+            elif service_key in self.overrides:
+                rate = self.overrides[service_key]
+
+        if rate < 1.0:
+            # The trace id is random: use (the low bits of) it as the dice roll
+            if rate <= 0.0 or int(trace_id[-8:], 16) >= rate * 0x100000000:
+                self.sampled_out += 1
+                return False
+
+        if self.rate_limiter is not None and not self.rate_limiter.take():
+            self.rate_limited += 1
+            return False
+
+        return True
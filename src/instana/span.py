@@ -12,6 +12,9 @@ or RegisteredSpan depending on type.
 BaseSpan: Base class containing the commonalities for the two descendants
   - SDKSpan: Class that represents an SDK type span
   - RegisteredSpan: Class that represents a Registered type span
+
+How a registered span is converted is described by the SpanType registered for its
+operation name (see register_span_type).
 """
 import six
 
@@ -19,12 +22,32 @@ from basictracer.span import BasicSpan
 import opentracing.ext.tags as ot_tags
 
 from .log import logger
-from .util import DictionaryOfStan
+from .util.stack import capture_frames, format_stack
 
 
 class InstanaSpan(BasicSpan):
+    # Captured stack trace: (code object, line number) pairs, formatted on conversion
     stack = None
     synthetic = False
+    local_root = False
+    # Length of the stack trace to capture on finish if the span errored (0 for none)
+    stack_on_error = 0
+
+    def set_tag(self, key, value):
+        # Suppressed (e.g. unsampled) spans are never recorded: don't bother collecting tags
+        if self.context.level == 0:
+            return self
+        return super(InstanaSpan, self).set_tag(key, value)
+
+    def log_kv(self, key_values, timestamp=None):
+        if self.context.level == 0:
+            return self
+        return super(InstanaSpan, self).log_kv(key_values, timestamp)
+
+    def finish(self, finish_time=None):
+        if self.stack_on_error and self.stack is None and self.tags.get('ec'):
+            self.stack = capture_frames(self.stack_on_error)
+        super(InstanaSpan, self).finish(finish_time)
 
     def mark_as_errored(self, tags=None):
         """
@@ -92,14 +115,93 @@ class InstanaSpan(BasicSpan):
             raise
 
 
+class SpanData(dict):
+    """
+    The `data` section of a reported span.
+
+    Unlike a DictionaryOfStan, nothing is created by merely reading it and None values are
+    never stored, so the payload holds just the keys that were actually set and serializes
+    without any null values.  Nested sections are created with `section`.
+
+    <schema> describes the nested sections known for the span type as a tree of dicts
+    (section name -> schema of that section).  Reading a known section that wasn't set
+    returns an empty section that is only attached to its parent once something is written
+    to it; reading any other key that wasn't set returns None.
+    """
+    __slots__ = ("schema", "_parent", "_key")
+
+    def __init__(self, schema=None, parent=None, key=None):
+        super(SpanData, self).__init__()
+        self.schema = _NO_SECTIONS if schema is None else schema
+        self._parent = parent
+        self._key = key
+
+    def __missing__(self, key):
+        if key in self.schema:
+            # Transient until written to, see __setitem__
+            return SpanData(self.schema.get(key), self, key)
+        return None
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        if self._parent is not None:
+            parent, self._parent = self._parent, None
+            section = dict.get(parent, self._key)
+            if section is None:
+                parent[self._key] = self
+            else:
+                # The section was attached through another read in the meantime
+                dict.update(section, self)
+
+    def __reduce__(self):
+        # Spans are pickled when they are queued across processes
+        return (SpanData, (self.schema,), None, None, iter(self.items()))
+
+    def section(self, key):
+        """
+        Return the nested section <key>, creating it when needed.
+        """
+        value = dict.get(self, key)
+        if value is None:
+            value = self[key] = SpanData(self.schema.get(key))
+        return value
+
+    def set(self, key, value):
+        """
+        Store <value> under <key> unless it is None.
+        """
+        if value is not None:
+            self[key] = value
+
+
+_NO_SECTIONS = {}
+
+
+def build_data_schema(paths):
+    """
+    Build the schema for SpanData from an iterable of section paths (tuples of keys).
+    @return: dict
+    """
+    schema = {"custom": {}}
+    for path in paths:
+        node = schema
+        for key in path:
+            node = node.setdefault(key, {})
+    return schema
+
+
+_BASE_DATA_SCHEMA = build_data_schema(())
+
+
 class BaseSpan(object):
-    sy = None
+    __slots__ = ("t", "p", "s", "l", "ts", "d", "f", "ec", "data", "stack", "sy",
+                 "n", "k", "tp", "ia", "lt", "crtp", "crid")
 
     def __str__(self):
-        return "BaseSpan(%s)" % self.__dict__.__str__()
+        return "BaseSpan(%s)" % self.to_dict().__str__()
 
     def __repr__(self):
-        return self.__dict__.__str__()
+        return self.to_dict().__str__()
 
     def __init__(self, span, source, service_name, **kwargs):
         # pylint: disable=invalid-name
@@ -111,13 +213,37 @@ class BaseSpan(object):
         self.d = int(round(span.duration * 1000))
         self.f = source
         self.ec = span.tags.pop('ec', None)
-        self.data = DictionaryOfStan()
-        self.stack = span.stack
+        self.data = SpanData(self._data_schema(span))
+        self.stack = format_stack(span.stack) if span.stack else None
+        self.sy = None
+        self.n = None
+        self.k = None
+        self.tp = None
+        self.ia = None
+        self.lt = None
+        self.crtp = None
+        self.crid = None
 
         if span.synthetic is True:
             self.sy = span.synthetic
 
-        self.__dict__.update(kwargs)
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+    def to_dict(self):
+        """
+        The fields of this span that are set, as used for the JSON payload.
+        @return: dict
+        """
+        fields = {}
+        for name in BaseSpan.__slots__:
+            value = getattr(self, name)
+            if value is not None:
+                fields[name] = value
+        return fields
+
+    def _data_schema(self, span):
+        return _BASE_DATA_SCHEMA
 
     def _populate_extra_span_attributes(self, span):
         if span.context.trace_parent:
@@ -138,7 +264,7 @@ class BaseSpan(object):
         :param tags: dict of tags
         :return: dict - a filtered set of tags
         """
-        filtered_tags = DictionaryOfStan()
+        filtered_tags = dict()
         for key in tags.keys():
             validated_key, validated_value = self._validate_tag(key, tags[key])
             if validated_key is not None and validated_value is not None:
@@ -191,9 +317,13 @@ class BaseSpan(object):
 
 
 class SDKSpan(BaseSpan):
+    __slots__ = ()
+
     ENTRY_KIND = ["entry", "server", "consumer"]
     EXIT_KIND = ["exit", "client", "producer"]
 
+    DATA_SCHEMA = build_data_schema([("sdk", "custom")])
+
     def __init__(self, span, source, service_name, **kwargs):
         # pylint: disable=invalid-name
         super(SDKSpan, self).__init__(span, source, service_name, **kwargs)
@@ -206,27 +336,31 @@ class SDKSpan(BaseSpan):
         if service_name is not None:
             self.data["service"] = service_name
 
-        self.data["sdk"]["name"] = span.operation_name
-        self.data["sdk"]["type"] = span_kind[0]
-        self.data["sdk"]["custom"]["tags"] = self._validate_tags(span.tags)
+        sdk = self.data.section("sdk")
+        sdk.set("name", span.operation_name)
+        sdk["type"] = span_kind[0]
+        sdk.section("custom")["tags"] = self._validate_tags(span.tags)
 
         if span.logs is not None and len(span.logs) > 0:
-            logs = DictionaryOfStan()
+            logs = dict()
             for log in span.logs:
                 filtered_key_values = self._validate_tags(log.key_values)
                 if len(filtered_key_values.keys()) > 0:
                     logs[repr(log.timestamp)] = filtered_key_values
-            self.data["sdk"]["custom"]["logs"] = logs
+            sdk.section("custom")["logs"] = logs
 
         if "arguments" in span.tags:
-            self.data['sdk']['arguments'] = span.tags["arguments"]
+            sdk.set('arguments', span.tags["arguments"])
 
         if "return" in span.tags:
-            self.data['sdk']['return'] = span.tags["return"]
+            sdk.set('return', span.tags["return"])
 
         if len(span.context.baggage) > 0:
             self.data["baggage"] = span.context.baggage
 
+    def _data_schema(self, span):
+        return self.DATA_SCHEMA
+
     def get_span_kind(self, span):
         """
         Will retrieve the `span.kind` tag and return a tuple containing the appropriate string and integer
@@ -245,267 +379,389 @@ class SDKSpan(BaseSpan):
 
 
 class RegisteredSpan(BaseSpan):
+    __slots__ = ()
+
     HTTP_SPANS = ("aiohttp-client", "aiohttp-server", "django", "http", "tornado-client",
                   "tornado-server", "urllib3", "wsgi", "asgi")
 
-    EXIT_SPANS = ("aiohttp-client", "boto3", "cassandra", "celery-client", "couchbase", "log", "memcache",
-                  "mongo", "mysql", "postgres", "rabbitmq", "redis", "rpc-client", "sqlalchemy",
-                  "tornado-client", "urllib3", "pymongo", "gcs", "gcps-producer")
-
-    ENTRY_SPANS = ("aiohttp-server", "aws.lambda.entry", "celery-worker", "django", "wsgi", "rabbitmq",
-                   "rpc-server", "tornado-server", "gcps-consumer", "asgi")
-
-    LOCAL_SPANS = ("render")
-
     def __init__(self, span, source, service_name, **kwargs):
         # pylint: disable=invalid-name
         super(RegisteredSpan, self).__init__(span, source, service_name, **kwargs)
         self.n = span.operation_name
-        self.k = 1
-
-        self.data["service"] = service_name
-        if span.operation_name in self.ENTRY_SPANS:
-            # entry
-            self._populate_entry_span_data(span)
-            self._populate_extra_span_attributes(span)
-        elif span.operation_name in self.EXIT_SPANS:
-            self.k = 2  # exit
-            self._populate_exit_span_data(span)
-        elif span.operation_name in self.LOCAL_SPANS:
-            self.k = 3  # intermediate span
-            self._populate_local_span_data(span)
-
-        if "rabbitmq" in self.data and self.data["rabbitmq"]["sort"] == "publish":
-            self.k = 2  # exit
-
-        # unify the span operation_name for gcps-producer and gcps-consumer
-        if "gcps" in span.operation_name:
-            self.n = 'gcps'
-
-        # Store any leftover tags in the custom section
-        if len(span.tags) > 0:
-            self.data["custom"]["tags"] = self._validate_tags(span.tags)
+        self.k = ENTRY
 
-    def _populate_entry_span_data(self, span):
-        if span.operation_name in self.HTTP_SPANS:
-            self._collect_http_tags(span)
+        self.data.set("service", service_name)
 
-        elif span.operation_name == "aws.lambda.entry":
-            self.data["lambda"]["arn"] = span.tags.pop('lambda.arn', "Unknown")
-            self.data["lambda"]["alias"] = None
-            self.data["lambda"]["runtime"] = "python"
-            self.data["lambda"]["functionName"] = span.tags.pop('lambda.name', "Unknown")
-            self.data["lambda"]["functionVersion"] = span.tags.pop('lambda.version', "Unknown")
-            self.data["lambda"]["trigger"] = span.tags.pop('lambda.trigger', None)
-            self.data["lambda"]["error"] = span.tags.pop('lambda.error', None)
-
-            trigger_type = self.data["lambda"]["trigger"]
-
-            if trigger_type in ["aws:api.gateway", "aws:application.load.balancer"]:
-                self._collect_http_tags(span)
-            elif trigger_type == 'aws:cloudwatch.events':
-                self.data["lambda"]["cw"]["events"]["id"] = span.tags.pop('data.lambda.cw.events.id', None)
-                self.data["lambda"]["cw"]["events"]["more"] = span.tags.pop('lambda.cw.events.more', False)
-                self.data["lambda"]["cw"]["events"]["resources"] = span.tags.pop('lambda.cw.events.resources', None)
-
-            elif trigger_type == 'aws:cloudwatch.logs':
-                self.data["lambda"]["cw"]["logs"]["group"] = span.tags.pop('lambda.cw.logs.group', None)
-                self.data["lambda"]["cw"]["logs"]["stream"] = span.tags.pop('lambda.cw.logs.stream', None)
-                self.data["lambda"]["cw"]["logs"]["more"] = span.tags.pop('lambda.cw.logs.more', None)
-                self.data["lambda"]["cw"]["logs"]["events"] = span.tags.pop('lambda.cw.logs.events', None)
-
-            elif trigger_type == 'aws:s3':
-                self.data["lambda"]["s3"]["events"] = span.tags.pop('lambda.s3.events', None)
-            elif trigger_type == 'aws:sqs':
-                self.data["lambda"]["sqs"]["messages"] = span.tags.pop('lambda.sqs.messages', None)
-
-        elif span.operation_name == "celery-worker":
-            self.data["celery"]["task"] = span.tags.pop('task', None)
-            self.data["celery"]["task_id"] = span.tags.pop('task_id', None)
-            self.data["celery"]["scheme"] = span.tags.pop('scheme', None)
-            self.data["celery"]["host"] = span.tags.pop('host', None)
-            self.data["celery"]["port"] = span.tags.pop('port', None)
-            self.data["celery"]["retry-reason"] = span.tags.pop('retry-reason', None)
-            self.data["celery"]["error"] = span.tags.pop('error', None)
-
-        elif span.operation_name == "gcps-consumer":
-            self.data["gcps"]["op"] = span.tags.pop('gcps.op', None)
-            self.data["gcps"]["projid"] = span.tags.pop('gcps.projid', None)
-            self.data["gcps"]["sub"] = span.tags.pop('gcps.sub', None)
-
-        elif span.operation_name == "rabbitmq":
-            self.data["rabbitmq"]["exchange"] = span.tags.pop('exchange', None)
-            self.data["rabbitmq"]["queue"] = span.tags.pop('queue', None)
-            self.data["rabbitmq"]["sort"] = span.tags.pop('sort', None)
-            self.data["rabbitmq"]["address"] = span.tags.pop('address', None)
-            self.data["rabbitmq"]["key"] = span.tags.pop('key', None)
-
-        elif span.operation_name == "rpc-server":
-            self.data["rpc"]["flavor"] = span.tags.pop('rpc.flavor', None)
-            self.data["rpc"]["host"] = span.tags.pop('rpc.host', None)
-            self.data["rpc"]["port"] = span.tags.pop('rpc.port', None)
-            self.data["rpc"]["call"] = span.tags.pop('rpc.call', None)
-            self.data["rpc"]["call_type"] = span.tags.pop('rpc.call_type', None)
-            self.data["rpc"]["params"] = span.tags.pop('rpc.params', None)
-            self.data["rpc"]["baggage"] = span.tags.pop('rpc.baggage', None)
-            self.data["rpc"]["error"] = span.tags.pop('rpc.error', None)
-        else:
-            logger.debug("SpanRecorder: Unknown entry span: %s" % span.operation_name)
-
-    def _populate_local_span_data(self, span):
-        if span.operation_name == "render":
-            self.data["render"]["name"] = span.tags.pop('name', None)
-            self.data["render"]["type"] = span.tags.pop('type', None)
-            self.data["log"]["message"] = span.tags.pop('message', None)
-            self.data["log"]["parameters"] = span.tags.pop('parameters', None)
+        span_type = SPAN_TYPES.get(span.operation_name)
+        if span_type is not None:
+            self.n = span_type.reported_name
+            self.k = span_type.kind
+            if span_type.kind == ENTRY:
+                self._populate_extra_span_attributes(span)
+            self._populate_span_data(span, span_type)
         else:
-            logger.debug("SpanRecorder: Unknown local span: %s" % span.operation_name)
-
-    def _populate_exit_span_data(self, span):
-        if span.operation_name in self.HTTP_SPANS:
-            self._collect_http_tags(span)
-
-        elif span.operation_name == "boto3":
-            # boto3 also sends http tags
-            self._collect_http_tags(span)
+            logger.debug("SpanRecorder: Unknown registered span: %s", span.operation_name)
 
-            for tag in ['op', 'ep', 'reg', 'payload', 'error']:
-                value = span.tags.pop(tag, None)
+        # Store any leftover tags in the custom section
+        if len(span.tags) > 0:
+            self.data.section("custom")["tags"] = self._validate_tags(span.tags)
+
+    def _data_schema(self, span):
+        span_type = SPAN_TYPES.get(span.operation_name)
+        if span_type is None:
+            return _BASE_DATA_SCHEMA
+        return span_type.schema
+
+    def _populate_span_data(self, span, span_type):
+        pop_tag = span.tags.pop
+        for parents, fields in span_type.sections:
+            # Only materialize the section once one of its values is set
+            target = None
+            for tag, key, default in fields:
+                value = default if tag is None else pop_tag(tag, default)
                 if value is not None:
-                    if tag == 'payload':
-                        self.data["boto3"][tag] = self._validate_tags(value)
-                    else:
-                        self.data["boto3"][tag] = value
-
-        elif span.operation_name == "cassandra":
-            self.data["cassandra"]["cluster"] = span.tags.pop('cassandra.cluster', None)
-            self.data["cassandra"]["query"] = span.tags.pop('cassandra.query', None)
-            self.data["cassandra"]["keyspace"] = span.tags.pop('cassandra.keyspace', None)
-            self.data["cassandra"]["fetchSize"] = span.tags.pop('cassandra.fetchSize', None)
-            self.data["cassandra"]["achievedConsistency"] = span.tags.pop('cassandra.achievedConsistency', None)
-            self.data["cassandra"]["triedHosts"] = span.tags.pop('cassandra.triedHosts', None)
-            self.data["cassandra"]["fullyFetched"] = span.tags.pop('cassandra.fullyFetched', None)
-            self.data["cassandra"]["error"] = span.tags.pop('cassandra.error', None)
-
-        elif span.operation_name == "celery-client":
-            self.data["celery"]["task"] = span.tags.pop('task', None)
-            self.data["celery"]["task_id"] = span.tags.pop('task_id', None)
-            self.data["celery"]["scheme"] = span.tags.pop('scheme', None)
-            self.data["celery"]["host"] = span.tags.pop('host', None)
-            self.data["celery"]["port"] = span.tags.pop('port', None)
-            self.data["celery"]["error"] = span.tags.pop('error', None)
-
-        elif span.operation_name == "couchbase":
-            self.data["couchbase"]["hostname"] = span.tags.pop('couchbase.hostname', None)
-            self.data["couchbase"]["bucket"] = span.tags.pop('couchbase.bucket', None)
-            self.data["couchbase"]["type"] = span.tags.pop('couchbase.type', None)
-            self.data["couchbase"]["error"] = span.tags.pop('couchbase.error', None)
-            self.data["couchbase"]["error_type"] = span.tags.pop('couchbase.error_type', None)
-            self.data["couchbase"]["sql"] = span.tags.pop('couchbase.sql', None)
-
-        elif span.operation_name == "rabbitmq":
-            self.data["rabbitmq"]["exchange"] = span.tags.pop('exchange', None)
-            self.data["rabbitmq"]["queue"] = span.tags.pop('queue', None)
-            self.data["rabbitmq"]["sort"] = span.tags.pop('sort', None)
-            self.data["rabbitmq"]["address"] = span.tags.pop('address', None)
-            self.data["rabbitmq"]["key"] = span.tags.pop('key', None)
-
-        elif span.operation_name == "redis":
-            self.data["redis"]["connection"] = span.tags.pop('connection', None)
-            self.data["redis"]["driver"] = span.tags.pop('driver', None)
-            self.data["redis"]["command"] = span.tags.pop('command', None)
-            self.data["redis"]["error"] = span.tags.pop('redis.error', None)
-            self.data["redis"]["subCommands"] = span.tags.pop('subCommands', None)
-
-        elif span.operation_name == "rpc-client":
-            self.data["rpc"]["flavor"] = span.tags.pop('rpc.flavor', None)
-            self.data["rpc"]["host"] = span.tags.pop('rpc.host', None)
-            self.data["rpc"]["port"] = span.tags.pop('rpc.port', None)
-            self.data["rpc"]["call"] = span.tags.pop('rpc.call', None)
-            self.data["rpc"]["call_type"] = span.tags.pop('rpc.call_type', None)
-            self.data["rpc"]["params"] = span.tags.pop('rpc.params', None)
-            self.data["rpc"]["baggage"] = span.tags.pop('rpc.baggage', None)
-            self.data["rpc"]["error"] = span.tags.pop('rpc.error', None)
-
-        elif span.operation_name == "sqlalchemy":
-            self.data["sqlalchemy"]["sql"] = span.tags.pop('sqlalchemy.sql', None)
-            self.data["sqlalchemy"]["eng"] = span.tags.pop('sqlalchemy.eng', None)
-            self.data["sqlalchemy"]["url"] = span.tags.pop('sqlalchemy.url', None)
-            self.data["sqlalchemy"]["err"] = span.tags.pop('sqlalchemy.err', None)
-
-        elif span.operation_name == "mysql":
-            self.data["mysql"]["host"] = span.tags.pop('host', None)
-            self.data["mysql"]["port"] = span.tags.pop('port', None)
-            self.data["mysql"]["db"] = span.tags.pop(ot_tags.DATABASE_INSTANCE, None)
-            self.data["mysql"]["user"] = span.tags.pop(ot_tags.DATABASE_USER, None)
-            self.data["mysql"]["stmt"] = span.tags.pop(ot_tags.DATABASE_STATEMENT, None)
-            self.data["mysql"]["error"] = span.tags.pop('mysql.error', None)
-
-        elif span.operation_name == "postgres":
-            self.data["pg"]["host"] = span.tags.pop('host', None)
-            self.data["pg"]["port"] = span.tags.pop('port', None)
-            self.data["pg"]["db"] = span.tags.pop(ot_tags.DATABASE_INSTANCE, None)
-            self.data["pg"]["user"] = span.tags.pop(ot_tags.DATABASE_USER, None)
-            self.data["pg"]["stmt"] = span.tags.pop(ot_tags.DATABASE_STATEMENT, None)
-            self.data["pg"]["error"] = span.tags.pop('pg.error', None)
-
-        elif span.operation_name == "mongo":
-            service = "%s:%s" % (span.tags.pop('host', None), span.tags.pop('port', None))
-            namespace = "%s.%s" % (span.tags.pop('db', "?"), span.tags.pop('collection', "?"))
-
-            self.data["mongo"]["service"] = service
-            self.data["mongo"]["namespace"] = namespace
-            self.data["mongo"]["command"] = span.tags.pop('command', None)
-            self.data["mongo"]["filter"] = span.tags.pop('filter', None)
-            self.data["mongo"]["json"] = span.tags.pop('json', None)
-            self.data["mongo"]["error"] = span.tags.pop('error', None)
-
-        elif span.operation_name == "gcs":
-            self.data["gcs"]["op"] = span.tags.pop('gcs.op')
-            self.data["gcs"]["bucket"] = span.tags.pop('gcs.bucket', None)
-            self.data["gcs"]["object"] = span.tags.pop('gcs.object', None)
-            self.data["gcs"]["entity"] = span.tags.pop('gcs.entity', None)
-            self.data["gcs"]["range"] = span.tags.pop('gcs.range', None)
-            self.data["gcs"]["sourceBucket"] = span.tags.pop('gcs.sourceBucket', None)
-            self.data["gcs"]["sourceObject"] = span.tags.pop('gcs.sourceObject', None)
-            self.data["gcs"]["sourceObjects"] = span.tags.pop('gcs.sourceObjects', None)
-            self.data["gcs"]["destinationBucket"] = span.tags.pop('gcs.destinationBucket', None)
-            self.data["gcs"]["destinationObject"] = span.tags.pop('gcs.destinationObject', None)
-            self.data["gcs"]["numberOfOperations"] = span.tags.pop('gcs.numberOfOperations', None)
-            self.data["gcs"]["projectId"] = span.tags.pop('gcs.projectId', None)
-            self.data["gcs"]["accessId"] = span.tags.pop('gcs.accessId', None)
-
-        elif span.operation_name == "gcps-producer":
-            self.data["gcps"]["op"] = span.tags.pop('gcps.op', None)
-            self.data["gcps"]["projid"] = span.tags.pop('gcps.projid', None)
-            self.data["gcps"]["top"] = span.tags.pop('gcps.top', None)
-
-        elif span.operation_name == "log":
-            # use last special key values
-            for l in span.logs:
-                if "message" in l.key_values:
-                    self.data["log"]["message"] = l.key_values.pop("message", None)
-                if "parameters" in l.key_values:
-                    self.data["log"]["parameters"] = l.key_values.pop("parameters", None)
-        else:
-            logger.debug("SpanRecorder: Unknown exit span: %s" % span.operation_name)
+                    if target is None:
+                        target = self.data
+                        for parent in parents:
+                            target = target.section(parent)
+                    target[key] = value
+
+        for collector in span_type.collectors:
+            collector(self, span)
 
     def _collect_http_tags(self, span):
-        self.data["http"]["host"] = span.tags.pop("http.host", None)
-        self.data["http"]["url"] = span.tags.pop(ot_tags.HTTP_URL, None)
-        self.data["http"]["path"] = span.tags.pop("http.path", None)
-        self.data["http"]["params"] = span.tags.pop('http.params', None)
-        self.data["http"]["method"] = span.tags.pop(ot_tags.HTTP_METHOD, None)
-        self.data["http"]["status"] = span.tags.pop(ot_tags.HTTP_STATUS_CODE, None)
-        self.data["http"]["path_tpl"] = span.tags.pop("http.path_tpl", None)
-        self.data["http"]["error"] = span.tags.pop('http.error', None)
+        self._populate_span_data(span, _HTTP_TAGS)
 
+    def _collect_http_headers(self, span):
         if len(span.tags) > 0:
             custom_headers = []
             for key in span.tags:
                 if key[0:12] == "http.header.":
                     custom_headers.append(key)
 
-            for key in custom_headers:
-                trimmed_key = key[12:]
-                self.data["http"]["header"][trimmed_key] = span.tags.pop(key)
+            if custom_headers:
+                headers = self.data.section("http").section("header")
+                for key in custom_headers:
+                    trimmed_key = key[12:]
+                    headers[trimmed_key] = span.tags.pop(key)
+
+    def _collect_lambda_trigger_tags(self, span):
+        trigger_type = self.data.section("lambda")["trigger"]
+
+        if trigger_type in ["aws:api.gateway", "aws:application.load.balancer"]:
+            self._collect_http_tags(span)
+        else:
+            trigger_tags = _LAMBDA_TRIGGER_TAGS.get(trigger_type)
+            if trigger_tags is not None:
+                self._populate_span_data(span, trigger_tags)
+
+    def _collect_boto3_tags(self, span):
+        for tag in ['op', 'ep', 'reg', 'payload', 'error']:
+            value = span.tags.pop(tag, None)
+            if value is not None:
+                if tag == 'payload':
+                    self.data.section("boto3")[tag] = self._validate_tags(value)
+                else:
+                    self.data.section("boto3")[tag] = value
+
+    def _collect_mongo_tags(self, span):
+        service = "%s:%s" % (span.tags.pop('host', None), span.tags.pop('port', None))
+        namespace = "%s.%s" % (span.tags.pop('db', "?"), span.tags.pop('collection', "?"))
+
+        mongo = self.data.section("mongo")
+        mongo["service"] = service
+        mongo["namespace"] = namespace
+
+    def _collect_log_tags(self, span):
+        # use last special key values
+        for l in span.logs:
+            if "message" in l.key_values:
+                self.data.section("log").set("message", l.key_values.pop("message", None))
+            if "parameters" in l.key_values:
+                self.data.section("log").set("parameters", l.key_values.pop("parameters", None))
+
+    def _collect_rabbitmq_kind(self, span):
+        rabbitmq = self.data["rabbitmq"]
+        if rabbitmq is not None and rabbitmq["sort"] == "publish":
+            self.k = EXIT
+
+
+# Values for the `k` (kind) field of a reported span
+ENTRY = 1
+EXIT = 2
+INTERMEDIATE = 3
+
+
+class SpanType(object):
+    """
+    Describes how spans with a given operation name are converted into a RegisteredSpan.
+
+    <fields> is a sequence of (tag, path) or (tag, path, default) tuples: the value of <tag> is
+    popped from the span tags and stored in the span data under <path>, which is either a
+    tuple of keys or a dot separated string (e.g. "redis.command").  A tag of None stores
+    <default> as a constant.  The paths are compiled once when the type is created.
+
+    <collectors> are called as collector(registered_span, span) after the fields have been
+    populated, for anything that can't be expressed as a simple tag to path mapping.
+    Sections written by collectors should be listed in <data_sections>.
+    """
+    __slots__ = ("name", "kind", "fields", "sections", "schema", "collectors", "capture_stack", "reported_name")
+
+    def __init__(self, name, kind, fields=(), collectors=(), capture_stack=None, reported_name=None,
+                 data_sections=()):
+        self.name = name
+        self.kind = kind
+        self.fields = tuple(fields)
+        self.sections = self._compile_fields(self.fields)
+        self.schema = build_data_schema([parents for parents, _ in self.sections] +
+                                        [self._split_path(path) for path in data_sections])
+        self.collectors = tuple(collectors)
+        # Exit spans get a backtrace by default
+        self.capture_stack = (kind == EXIT) if capture_stack is None else capture_stack
+        self.reported_name = reported_name or name
+
+    @staticmethod
+    def _split_path(path):
+        if isinstance(path, str):
+            return tuple(path.split("."))
+        return tuple(path)
+
+    @staticmethod
+    def _compile_fields(fields):
+        """
+        Group the fields by their parent path so that each nested section of the span data
+        is only looked up once per span.
+        @return: tuple of (parents, ((tag, key, default), ...)) tuples
+        """
+        sections = {}
+        for field in fields:
+            tag, path = field[0], SpanType._split_path(field[1])
+            default = field[2] if len(field) > 2 else None
+            sections.setdefault(path[:-1], []).append((tag, path[-1], default))
+        return tuple((parents, tuple(entries)) for parents, entries in sections.items())
+
+
+# Registry of span types keyed by operation name
+SPAN_TYPES = dict()
+
+
+def register_span_type(name, kind, fields=(), collectors=(), capture_stack=None, reported_name=None,
+                       data_sections=()):
+    """
+    Register (or replace) the span type for <name>.  Spans with this operation name are then
+    reported as registered spans.  See SpanType for the meaning of the arguments.
+
+    @return: SpanType
+    """
+    span_type = SpanType(name, kind, fields, collectors, capture_stack, reported_name, data_sections)
+    SPAN_TYPES[name] = span_type
+    return span_type
+
+
+_HTTP_FIELDS = (
+    ("http.host", "http.host"),
+    (ot_tags.HTTP_URL, "http.url"),
+    ("http.path", "http.path"),
+    ("http.params", "http.params"),
+    (ot_tags.HTTP_METHOD, "http.method"),
+    (ot_tags.HTTP_STATUS_CODE, "http.status"),
+    ("http.path_tpl", "http.path_tpl"),
+    ("http.error", "http.error"),
+)
+
+_HTTP_SECTIONS = ("http.header",)
+
+_HTTP_TAGS = SpanType("http", EXIT, _HTTP_FIELDS, collectors=(RegisteredSpan._collect_http_headers,))
+
+_LAMBDA_TRIGGER_TAGS = {
+    "aws:cloudwatch.events": SpanType("aws:cloudwatch.events", ENTRY, (
+        ("data.lambda.cw.events.id", "lambda.cw.events.id"),
+        ("lambda.cw.events.more", "lambda.cw.events.more", False),
+        ("lambda.cw.events.resources", "lambda.cw.events.resources"),
+    )),
+    "aws:cloudwatch.logs": SpanType("aws:cloudwatch.logs", ENTRY, (
+        ("lambda.cw.logs.group", "lambda.cw.logs.group"),
+        ("lambda.cw.logs.stream", "lambda.cw.logs.stream"),
+        ("lambda.cw.logs.more", "lambda.cw.logs.more"),
+        ("lambda.cw.logs.events", "lambda.cw.logs.events"),
+    )),
+    "aws:s3": SpanType("aws:s3", ENTRY, (
+        ("lambda.s3.events", "lambda.s3.events"),
+    )),
+    "aws:sqs": SpanType("aws:sqs", ENTRY, (
+        ("lambda.sqs.messages", "lambda.sqs.messages"),
+    )),
+}
+
+# Sections that can be written depending on the trigger of a Lambda invocation
+_LAMBDA_SECTIONS = _HTTP_SECTIONS + tuple(parents for trigger_tags in _LAMBDA_TRIGGER_TAGS.values()
+                                          for parents, _ in trigger_tags.sections)
+
+_CELERY_FIELDS = (
+    ("task", "celery.task"),
+    ("task_id", "celery.task_id"),
+    ("scheme", "celery.scheme"),
+    ("host", "celery.host"),
+    ("port", "celery.port"),
+)
+
+_GCPS_FIELDS = (
+    ("gcps.op", "gcps.op"),
+    ("gcps.projid", "gcps.projid"),
+)
+
+_RPC_FIELDS = (
+    ("rpc.flavor", "rpc.flavor"),
+    ("rpc.host", "rpc.host"),
+    ("rpc.port", "rpc.port"),
+    ("rpc.call", "rpc.call"),
+    ("rpc.call_type", "rpc.call_type"),
+    ("rpc.params", "rpc.params"),
+    ("rpc.baggage", "rpc.baggage"),
+    ("rpc.error", "rpc.error"),
+)
+
+for _name in ("aiohttp-server", "asgi", "django", "tornado-server", "wsgi"):
+    register_span_type(_name, ENTRY, _HTTP_FIELDS, _HTTP_TAGS.collectors, data_sections=_HTTP_SECTIONS)
+
+for _name in ("aiohttp-client", "tornado-client", "urllib3"):
+    register_span_type(_name, EXIT, _HTTP_FIELDS, _HTTP_TAGS.collectors, data_sections=_HTTP_SECTIONS)
+
+register_span_type("aws.lambda.entry", ENTRY, (
+    ("lambda.arn", "lambda.arn", "Unknown"),
+    (None, "lambda.alias", None),
+    (None, "lambda.runtime", "python"),
+    ("lambda.name", "lambda.functionName", "Unknown"),
+    ("lambda.version", "lambda.functionVersion", "Unknown"),
+    ("lambda.trigger", "lambda.trigger"),
+    ("lambda.error", "lambda.error"),
+), collectors=(RegisteredSpan._collect_lambda_trigger_tags,), data_sections=_LAMBDA_SECTIONS)
+
+# boto3 also sends http tags
+register_span_type("boto3", EXIT, _HTTP_FIELDS,
+                   collectors=_HTTP_TAGS.collectors + (RegisteredSpan._collect_boto3_tags,),
+                   data_sections=_HTTP_SECTIONS + ("boto3",))
+
+register_span_type("cassandra", EXIT, (
+    ("cassandra.cluster", "cassandra.cluster"),
+    ("cassandra.query", "cassandra.query"),
+    ("cassandra.fingerprint", "cassandra.fingerprint"),
+    ("cassandra.keyspace", "cassandra.keyspace"),
+    ("cassandra.fetchSize", "cassandra.fetchSize"),
+    ("cassandra.achievedConsistency", "cassandra.achievedConsistency"),
+    ("cassandra.triedHosts", "cassandra.triedHosts"),
+    ("cassandra.fullyFetched", "cassandra.fullyFetched"),
+    ("cassandra.error", "cassandra.error"),
+))
+
+register_span_type("celery-client", EXIT, _CELERY_FIELDS + (
+    ("error", "celery.error"),
+))
+
+register_span_type("celery-worker", ENTRY, _CELERY_FIELDS + (
+    ("retry-reason", "celery.retry-reason"),
+    ("error", "celery.error"),
+))
+
+register_span_type("couchbase", EXIT, (
+    ("couchbase.hostname", "couchbase.hostname"),
+    ("couchbase.bucket", "couchbase.bucket"),
+    ("couchbase.type", "couchbase.type"),
+    ("couchbase.error", "couchbase.error"),
+    ("couchbase.error_type", "couchbase.error_type"),
+    ("couchbase.sql", "couchbase.sql"),
+    ("couchbase.fingerprint", "couchbase.fingerprint"),
+))
+
+register_span_type("gcps-consumer", ENTRY, _GCPS_FIELDS + (
+    ("gcps.sub", "gcps.sub"),
+), reported_name="gcps")
+
+register_span_type("gcps-producer", EXIT, _GCPS_FIELDS + (
+    ("gcps.top", "gcps.top"),
+), reported_name="gcps")
+
+register_span_type("gcs", EXIT, (
+    ("gcs.op", "gcs.op"),
+    ("gcs.bucket", "gcs.bucket"),
+    ("gcs.object", "gcs.object"),
+    ("gcs.entity", "gcs.entity"),
+    ("gcs.range", "gcs.range"),
+    ("gcs.sourceBucket", "gcs.sourceBucket"),
+    ("gcs.sourceObject", "gcs.sourceObject"),
+    ("gcs.sourceObjects", "gcs.sourceObjects"),
+    ("gcs.destinationBucket", "gcs.destinationBucket"),
+    ("gcs.destinationObject", "gcs.destinationObject"),
+    ("gcs.numberOfOperations", "gcs.numberOfOperations"),
+    ("gcs.projectId", "gcs.projectId"),
+    ("gcs.accessId", "gcs.accessId"),
+))
+
+register_span_type("log", EXIT, collectors=(RegisteredSpan._collect_log_tags,), data_sections=("log",))
+
+register_span_type("memcache", EXIT)
+
+register_span_type("mongo", EXIT, (
+    ("command", "mongo.command"),
+    ("filter", "mongo.filter"),
+    ("json", "mongo.json"),
+    ("error", "mongo.error"),
+), collectors=(RegisteredSpan._collect_mongo_tags,))
+
+register_span_type("mysql", EXIT, (
+    ("host", "mysql.host"),
+    ("port", "mysql.port"),
+    (ot_tags.DATABASE_INSTANCE, "mysql.db"),
+    (ot_tags.DATABASE_USER, "mysql.user"),
+    (ot_tags.DATABASE_STATEMENT, "mysql.stmt"),
+    ("db.fingerprint", "mysql.fingerprint"),
+    ("mysql.error", "mysql.error"),
+))
+
+register_span_type("postgres", EXIT, (
+    ("host", "pg.host"),
+    ("port", "pg.port"),
+    (ot_tags.DATABASE_INSTANCE, "pg.db"),
+    (ot_tags.DATABASE_USER, "pg.user"),
+    (ot_tags.DATABASE_STATEMENT, "pg.stmt"),
+    ("db.fingerprint", "pg.fingerprint"),
+    ("pg.error", "pg.error"),
+))
+
+register_span_type("pymongo", EXIT)
+
+# rabbitmq spans are entries unless they publish a message; they always get a backtrace
+register_span_type("rabbitmq", ENTRY, (
+    ("exchange", "rabbitmq.exchange"),
+    ("queue", "rabbitmq.queue"),
+    ("sort", "rabbitmq.sort"),
+    ("address", "rabbitmq.address"),
+    ("key", "rabbitmq.key"),
+), collectors=(RegisteredSpan._collect_rabbitmq_kind,), capture_stack=True)
+
+register_span_type("redis", EXIT, (
+    ("connection", "redis.connection"),
+    ("driver", "redis.driver"),
+    ("command", "redis.command"),
+    ("redis.error", "redis.error"),
+    ("subCommands", "redis.subCommands"),
+))
+
+register_span_type("render", INTERMEDIATE, (
+    ("name", "render.name"),
+    ("type", "render.type"),
+    ("message", "log.message"),
+    ("parameters", "log.parameters"),
+))
+
+register_span_type("rpc-client", EXIT, _RPC_FIELDS)
+
+register_span_type("rpc-server", ENTRY, _RPC_FIELDS)
+
+register_span_type("sqlalchemy", EXIT, (
+    ("sqlalchemy.sql", "sqlalchemy.sql"),
+    ("sqlalchemy.fingerprint", "sqlalchemy.fingerprint"),
+    ("sqlalchemy.eng", "sqlalchemy.eng"),
+    ("sqlalchemy.url", "sqlalchemy.url"),
+    ("sqlalchemy.err", "sqlalchemy.err"),
+))
@@ -3,6 +3,17 @@
 
 
 class SpanContext():
+    """
+    The propagated state of a span.
+
+    The baggage dict is shared by reference between a context and the children derived
+    from it, so it must not be modified in place: `with_baggage_item` returns a new context
+    with a copy of the baggage instead.
+    """
+    __slots__ = ("level", "trace_id", "span_id", "sampled", "synthetic", "_baggage",
+                 "trace_parent", "instana_ancestor", "long_trace_id", "correlation_type",
+                 "correlation_id", "traceparent", "tracestate", "w3c_upstream", "local")
+
     def __init__(
             self,
             trace_id=None,
@@ -27,62 +38,11 @@ class SpanContext():
         self.correlation_id = None
         self.traceparent = None  # temporary storage of the validated traceparent header of the incoming request
         self.tracestate = None  # temporary storage of the tracestate header
-
-    @property
-    def traceparent(self):
-        return self._traceparent
-
-    @traceparent.setter
-    def traceparent(self, value):
-        self._traceparent = value
-
-    @property
-    def tracestate(self):
-        return self._tracestate
-
-    @tracestate.setter
-    def tracestate(self, value):
-        self._tracestate = value
-
-    @property
-    def trace_parent(self):
-        return self._trace_parent
-
-    @trace_parent.setter
-    def trace_parent(self, value):
-        self._trace_parent = value
-
-    @property
-    def instana_ancestor(self):
-        return self._instana_ancestor
-
-    @instana_ancestor.setter
-    def instana_ancestor(self, value):
-        self._instana_ancestor = value
-
-    @property
-    def long_trace_id(self):
-        return self._long_trace_id
-
-    @long_trace_id.setter
-    def long_trace_id(self, value):
-        self._long_trace_id = value
-
-    @property
-    def correlation_type(self):
-        return self._correlation_type
-
-    @correlation_type.setter
-    def correlation_type(self, value):
-        self._correlation_type = value
-
-    @property
-    def correlation_id(self):
-        return self._correlation_id
-
-    @correlation_id.setter
-    def correlation_id(self, value):
-        self._correlation_id = value
+        # (traceparent, tracestate, traceparent trace id, tracestate list members) parsed once
+        # from the incoming headers, see BasePropagator._get_participating_trace_context
+        self.w3c_upstream = None
+        # True for the contexts of spans started in this process, False for extracted ones
+        self.local = False
 
     @property
     def baggage(self):
@@ -92,12 +52,39 @@ class SpanContext():
     def suppression(self):
         return self.level == 0
 
+    def derive_child(self, span_id):
+        """
+        The context of a child span of this context's span in the same trace.  The trace
+        state, baggage and propagation headers are shared with this context by reference.
+        @param span_id: the ID of the child span
+        @return: SpanContext
+        """
+        child = SpanContext.__new__(SpanContext)
+        child.level = self.level
+        child.trace_id = self.trace_id
+        child.span_id = span_id
+        child.sampled = self.sampled
+        child.synthetic = False
+        child._baggage = self._baggage
+        child.trace_parent = self.trace_parent
+        child.instana_ancestor = self.instana_ancestor
+        child.long_trace_id = self.long_trace_id
+        child.correlation_type = self.correlation_type
+        child.correlation_id = self.correlation_id
+        child.traceparent = self.traceparent
+        child.tracestate = self.tracestate
+        child.w3c_upstream = self.w3c_upstream
+        child.local = True
+        return child
+
     def with_baggage_item(self, key, value):
         new_baggage = self._baggage.copy()
         new_baggage[key] = value
-        return SpanContext(
+        ctx = SpanContext(
             trace_id=self.trace_id,
             span_id=self.span_id,
             sampled=self.sampled,
             level=self.level,
             baggage=new_baggage)
+        ctx.local = self.local
+        return ctx
@@ -2,18 +2,19 @@
 # (c) Copyright Instana Inc. 2016
 
 
-import os
-import re
 import time
-import traceback
+import itertools
 
 import opentracing as ot
 from basictracer import BasicTracer
 
 from .util.ids import generate_id
+from .util.stack import capture_frames
+from .util.active_scope import RegisteredScope
 from .span_context import SpanContext
-from .span import InstanaSpan, RegisteredSpan
-from .recorder import StanRecorder, InstanaSampler
+from .span import InstanaSpan, SPAN_TYPES
+from .recorder import StanRecorder
+from .sampling import InstanaSampler
 from .propagators.http_propagator import HTTPPropagator
 from .propagators.text_propagator import TextPropagator
 from .propagators.binary_propagator import BinaryPropagator
@@ -25,8 +26,18 @@ class InstanaTracer(BasicTracer):
         if recorder is None:
             recorder = StanRecorder()
 
+        agent = getattr(recorder, "agent", None)
+        options = getattr(agent, "options", None)
+        sampler = InstanaSampler.from_options(options)
+
+        # Stack trace capture policy for exit spans (see BaseOptions)
+        self.stack_trace = getattr(options, "stack_trace", "all")
+        self.stack_trace_length = getattr(options, "stack_trace_length", 30)
+        self.stack_trace_sample_every = getattr(options, "stack_trace_sample_every", 10)
+        self._stack_trace_counter = itertools.count()
+
         super(InstanaTracer, self).__init__(
-            recorder, InstanaSampler(), scope_manager)
+            recorder, sampler, scope_manager)
 
         self._propagators[ot.Format.HTTP_HEADERS] = HTTPPropagator()
         self._propagators[ot.Format.TEXT_MAP] = TextPropagator()
@@ -51,7 +62,8 @@ class InstanaTracer(BasicTracer):
             ignore_active_span=ignore_active_span,
         )
 
-        return self.scope_manager.activate(span, finish_on_close)
+        # Registered so that util.traceutils can find the active tracer in one lookup
+        return RegisteredScope(self, self.scope_manager.activate(span, finish_on_close))
 
     def start_span(self,
                    operation_name=None,
@@ -82,29 +94,23 @@ class InstanaTracer(BasicTracer):
 
         # Assemble the child ctx
         gid = generate_id()
-        ctx = SpanContext(span_id=gid)
         if parent_ctx is not None and parent_ctx.trace_id is not None:
-            if hasattr(parent_ctx, '_baggage') and parent_ctx._baggage is not None:
-                ctx._baggage = parent_ctx._baggage.copy()
-            ctx.trace_id = parent_ctx.trace_id
-            ctx.sampled = parent_ctx.sampled
-            ctx.long_trace_id = parent_ctx.long_trace_id
-            ctx.trace_parent = parent_ctx.trace_parent
-            ctx.instana_ancestor = parent_ctx.instana_ancestor
-            ctx.level = parent_ctx.level
-            ctx.correlation_type = parent_ctx.correlation_type
-            ctx.correlation_id = parent_ctx.correlation_id
-            ctx.traceparent = parent_ctx.traceparent
-            ctx.tracestate = parent_ctx.tracestate
+            ctx = parent_ctx.derive_child(gid)
         else:
-            ctx.trace_id = gid
-            ctx.sampled = self.sampler.sampled(ctx.trace_id)
+            ctx = SpanContext(trace_id=gid, span_id=gid)
+            ctx.local = True
             if parent_ctx is not None:
                 ctx.level = parent_ctx.level
                 ctx.correlation_type = parent_ctx.correlation_type
                 ctx.correlation_id = parent_ctx.correlation_id
                 ctx.traceparent = parent_ctx.traceparent
                 ctx.tracestate = parent_ctx.tracestate
+                ctx.w3c_upstream = parent_ctx.w3c_upstream
+
+            # Head based sampling decision for the new trace: unsampled traces are suppressed
+            ctx.sampled = ctx.level != 0 and self.sampler.should_sample(gid, operation_name, tags)
+            if not ctx.sampled:
+                ctx.level = 0
 
         # Tie it all together
         span = InstanaSpan(self,
@@ -117,8 +123,20 @@ class InstanaTracer(BasicTracer):
         if parent_ctx is not None:
             span.synthetic = parent_ctx.synthetic
 
-        if operation_name in RegisteredSpan.EXIT_SPANS:
-            self.__add_stack(span)
+        # The first span of the trace in this process: no parent, or a parent that was
+        # extracted from an incoming request or message.  Spans started as children of the
+        # context of another span of this process are not, even if passed as `child_of`
+        span.local_root = parent_ctx is None or not parent_ctx.local
+
+        span_type = SPAN_TYPES.get(operation_name)
+        if span_type is not None and span_type.capture_stack and ctx.level != 0:
+            policy = self.stack_trace
+            if policy == "all" or (policy == "sampled" and
+                                   next(self._stack_trace_counter) % self.stack_trace_sample_every == 0):
+                span.stack = capture_frames(self.stack_trace_length)
+            elif policy == "error":
+                # Captured when the span finishes, if it errored
+                span.stack_on_error = self.stack_trace_length
 
         return span
 
@@ -133,45 +151,3 @@ class InstanaTracer(BasicTracer):
             return self._propagators[format].extract(carrier, disable_w3c_trace_context)
 
         raise ot.UnsupportedFormatException()
-
-    def __add_stack(self, span, limit=30):
-        """
-        Adds a backtrace to <span>.  The default length limit for
-        stack traces is 30 frames.  A hard limit of 40 frames is enforced.
-        """
-        try:
-            sanitized_stack = []
-            if limit > 40:
-                limit = 40
-
-            trace_back = traceback.extract_stack()
-            trace_back.reverse()
-            for frame in trace_back:
-                # Exclude Instana frames unless we're in dev mode
-                if "INSTANA_DEBUG" not in os.environ:
-                    if re_tracer_frame.search(frame[0]) is not None:
-                        continue
-
-                    if re_with_stan_frame.search(frame[2]) is not None:
-                        continue
-
-                sanitized_stack.append({
-                    "c": frame[0],
-                    "n": frame[1],
-                    "m": frame[2]
-                })
-
-            if len(sanitized_stack) > limit:
-                # (limit * -1) gives us negative form of <limit> used for
-                # slicing from the end of the list. e.g. stack[-30:]
-                span.stack = sanitized_stack[(limit*-1):]
-            else:
-                span.stack = sanitized_stack
-        except Exception:
-            # No fail
-            pass
-
-
-# Used by __add_stack
-re_tracer_frame = re.compile(r"/instana/.*\.py$")
-re_with_stan_frame = re.compile('with_instana')
@@ -17,6 +17,22 @@ def nested_dictionary():
 DictionaryOfStan = nested_dictionary
 
 
+def _extractor(o):
+    """
+    Serialization hook for json.dumps: objects are serialized from their attributes
+    (or their `to_dict` method for slotted objects such as spans), skipping None values.
+    """
+    if hasattr(o, '__dict__'):
+        return {k.lower(): v for k, v in o.__dict__.items() if v is not None}
+
+    to_dict = getattr(o, 'to_dict', None)
+    if to_dict is not None:
+        return to_dict()
+
+    logger.debug("Couldn't serialize non dict type: %s", type(o))
+    return {}
+
+
 def to_json(obj):
     """
     Convert obj to json.  Used mostly to convert the classes in json_span.py until we switch to nested
@@ -26,14 +42,7 @@ def to_json(obj):
     :return:  json string
     """
     try:
-        def extractor(o):
-            if not hasattr(o, '__dict__'):
-                logger.debug("Couldn't serialize non dict type: %s", type(o))
-                return {}
-            else:
-                return {k.lower(): v for k, v in o.__dict__.items() if v is not None}
-
-        return json.dumps(obj, default=extractor, sort_keys=False, separators=(',', ':')).encode()
+        return json.dumps(obj, default=_extractor, sort_keys=False, separators=(',', ':')).encode()
     except Exception:
         logger.debug("to_json non-fatal encoding issue: ", exc_info=True)
 
@@ -45,14 +54,7 @@ def to_pretty_json(obj):
     :return:  json string
     """
     try:
-        def extractor(o):
-            if not hasattr(o, '__dict__'):
-                logger.debug("Couldn't serialize non dict type: %s", type(o))
-                return {}
-            else:
-                return {k.lower(): v for k, v in o.__dict__.items() if v is not None}
-
-        return json.dumps(obj, default=extractor, sort_keys=True, indent=4, separators=(',', ':'))
+        return json.dumps(obj, default=_extractor, sort_keys=True, indent=4, separators=(',', ':'))
     except Exception:
         logger.debug("to_pretty_json non-fatal encoding issue: ", exc_info=True)
 
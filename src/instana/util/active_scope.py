@@ -0,0 +1,60 @@
+# (c) Copyright IBM Corp. 2024
+
+"""
+Registry of the active (tracer, span) pair.
+
+Each tracer keeps its active span in its own scope manager (thread-local, contextvars or
+tornado), so answering "which tracer is active?" used to mean probing all of them.  The
+tracers also record every activation in a single contextvar, which makes the check one
+lookup.  Context variables are local to threads and asyncio tasks (tasks start with a copy
+of the context of their creator), so the registry follows the same boundaries as the scope
+managers.
+"""
+import contextlib
+import contextvars
+
+from opentracing import Scope
+
+# (tracer, span) of the most recently activated scope, or None
+_active = contextvars.ContextVar("instana_active_scope", default=None)
+
+
+def get_active():
+    """
+    @return: (tracer, span) of the active scope or None
+    """
+    return _active.get()
+
+
+class RegisteredScope(Scope):
+    """
+    Wraps the scope returned by a scope manager: the span is registered as active when the
+    scope is created, and the previously active (tracer, span) is restored when it is closed.
+    """
+    def __init__(self, tracer, scope):
+        super(RegisteredScope, self).__init__(scope.manager, scope.span)
+        self._scope = scope
+        self._entry = (tracer, scope.span)
+        self._previous = _active.get()
+        _active.set(self._entry)
+
+    def close(self):
+        self._scope.close()
+        # Scopes may be closed out of order or from another context; like the thread-local
+        # scope manager, only the active one restores its predecessor.  Restoring uses set()
+        # rather than a reset token, which would fail in a different context.
+        if _active.get() is self._entry:
+            _active.set(self._previous)
+
+
+@contextlib.contextmanager
+def no_active_scope():
+    """
+    Context manager that unregisters the active scope, e.g. so that new asyncio tasks do
+    not inherit it.  See opentracing.scope_managers.contextvars.no_parent_scope.
+    """
+    token = _active.set(None)
+    try:
+        yield
+    finally:
+        _active.reset(token)
@@ -2,29 +2,61 @@
 # (c) Copyright Instana Inc. 2020
 
 import os
-import time
 import random
-
-_rnd = random.Random()
-_current_pid = 0
+import threading
 
 BAD_ID = "BADCAFFE"  # Bad Caffe
 
+# Number of IDs generated at once from os.urandom by each thread
+_ID_BATCH_SIZE = 256
+
+
+class _IdState(threading.local):
+    """ Per-thread ID generator state, so that threads never share (or lock) a generator """
+    def __init__(self):
+        self.hex_ids = iter(())
+        # Seeded from os.urandom
+        self.rnd = random.Random()
+
+
+_state = _IdState()
+
+
+def _reset_after_fork():
+    # The child must not hand out the IDs buffered (or the PRNG sequence) of its parent
+    global _state
+    _state = _IdState()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _refill():
+    batch = os.urandom(8 * _ID_BATCH_SIZE).hex()
+    _state.hex_ids = hex_ids = iter([batch[i:i + 16] for i in range(0, len(batch), 16)])
+    return next(hex_ids)
+
 
 def generate_id():
     """ Generate a 64bit base 16 ID for use as a Span or Trace ID """
-    global _current_pid
+    try:
+        return next(_state.hex_ids)
+    except StopIteration:
+        return _refill()
+
 
-    pid = os.getpid()
-    if _current_pid != pid:
-        _current_pid = pid
-        _rnd.seed(int(1000000 * time.time()) ^ pid)
-    new_id = format(_rnd.randint(0, 18446744073709551615), '02x')
+def generate_int_id():
+    """
+    Generate a 64bit ID as an int, for callers that keep IDs as ints and only encode them
+    (with format_id) when they are serialized
+    """
+    return _state.rnd.getrandbits(64)
 
-    if len(new_id) < 16:
-        new_id = new_id.zfill(16)
 
-    return new_id
+def format_id(int_id):
+    """ The fixed width base 16 form of the 64bit <int_id>, as returned by generate_id """
+    return "%016x" % int_id
 
 
 def header_to_long_id(header):
@@ -2,6 +2,8 @@
 # (c) Copyright Instana Inc. 2020
 
 import re
+import threading
+from collections import OrderedDict
 from urllib import parse
 
 from ..log import logger
@@ -53,6 +55,133 @@ def contains_secret(candidate, matcher, kwlist):
         logger.debug("contains_secret", exc_info=True)
 
 
+class SecretsMatcher(object):
+    """
+    A secrets matcher and keyword list compiled once into a single regex or set lookup, with an
+    LRU cache of scrubbed query strings.  Use `get_secrets_matcher` to share instances.
+    """
+    CACHE_SIZE = 256
+    # Longer query strings are not cached
+    MAX_CACHED_LENGTH = 2048
+
+    def __init__(self, matcher, kwlist):
+        self.matcher = matcher
+        self.kwlist = list(kwlist)
+
+        # Keywords that must be found in the (lower cased for *-ignore-case) query string for any
+        # key to match: the query strings without them are returned untouched.  None for regex.
+        self._screen = None
+        self._ignore_case = matcher in ('equals-ignore-case', 'contains-ignore-case')
+
+        if matcher == 'equals-ignore-case':
+            keywords = frozenset(keyword.lower() for keyword in kwlist)
+            self.matches = lambda key: key.lower() in keywords
+            self._screen = keywords
+        elif matcher == 'equals':
+            keywords = frozenset(kwlist)
+            self.matches = keywords.__contains__
+            self._screen = keywords
+        elif matcher == 'contains-ignore-case':
+            keywords = frozenset(keyword.lower() for keyword in kwlist)
+            pattern = re.compile("|".join(re.escape(keyword) for keyword in keywords))
+            self.matches = lambda key: pattern.search(key.lower()) is not None
+            self._screen = keywords
+        elif matcher == 'contains':
+            keywords = frozenset(kwlist)
+            pattern = re.compile("|".join(re.escape(keyword) for keyword in keywords))
+            self.matches = lambda key: pattern.search(key) is not None
+            self._screen = keywords
+        elif matcher == 'regex':
+            try:
+                pattern = re.compile("|".join("(?:%s)" % regexp for regexp in kwlist))
+                self.matches = lambda key: pattern.match(key) is not None
+            except re.error:
+                # e.g. global inline flags that are only valid at the start of each expression
+                patterns = [re.compile(regexp) for regexp in kwlist]
+                self.matches = lambda key: any(p.match(key) for p in patterns)
+        else:
+            raise ValueError("unknown matcher %s" % matcher)
+
+        if not kwlist:
+            self.matches = lambda key: False
+        elif self._screen is not None and any(' ' in keyword for keyword in self._screen):
+            # A '+' in the query decodes to a space: don't screen for such keywords
+            self._screen = None
+
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def could_match(self, query):
+        """
+        False if no key of <query> can match, without parsing it
+        """
+        if self._screen is None or '%' in query:
+            # Percent encoded keys are only known once decoded
+            return True
+        if self._ignore_case:
+            query = query.lower()
+        for keyword in self._screen:
+            if keyword in query:
+                return True
+        return False
+
+    def strip_secrets(self, query):
+        """
+        Scrub the values of the matching keys of <query> (without path)
+        :return: the scrubbed query, or <query> unchanged if nothing matched
+        """
+        cache = self._cache
+        cacheable = len(query) <= self.MAX_CACHED_LENGTH
+        if cacheable:
+            with self._cache_lock:
+                result = cache.get(query)
+                if result is not None:
+                    cache.move_to_end(query)
+                    return result
+
+        result = query
+        if self.could_match(query):
+            params = parse.parse_qsl(query, keep_blank_values=True)
+            redacted = ['<redacted>']
+            found = False
+            for index, kv in enumerate(params):
+                if self.matches(kv[0]):
+                    params[index] = (kv[0], redacted)
+                    found = True
+            if found:
+                result = parse.unquote(parse.urlencode(params, doseq=True))
+
+        if cacheable:
+            with self._cache_lock:
+                cache[query] = result
+                if len(cache) > self.CACHE_SIZE:
+                    cache.popitem(last=False)
+        return result
+
+
+# (matcher, keywords) -> SecretsMatcher
+_matchers = {}
+
+
+def get_secrets_matcher(matcher, kwlist):
+    """
+    The compiled SecretsMatcher for <matcher> and <kwlist>, e.g. options.secrets_matcher and
+    options.secrets_list.  The instance is reused as long as the configuration doesn't change.
+    """
+    key = (matcher, tuple(kwlist))
+    try:
+        return _matchers[key]
+    except KeyError:
+        pass
+
+    secrets_matcher = SecretsMatcher(matcher, kwlist)
+    if len(_matchers) >= 16:
+        # The configuration changes rarely (e.g. once the agent announced the secrets)
+        _matchers.clear()
+    _matchers[key] = secrets_matcher
+    return secrets_matcher
+
+
 def strip_secrets_from_query(qp, matcher, kwlist):
     """
     This function will scrub the secrets from a query param string based on the passed in matcher and kwlist.
@@ -63,6 +192,8 @@ def strip_secrets_from_query(qp, matcher, kwlist):
 
     /signup?blah=1&secret=password&valid=true will result in /signup?blah=1&secret=<redacted>&valid=true
 
+    Query strings without any matching key are returned untouched.
+
     :param qp: a string representing the query params in URL form (unencoded)
     :param matcher: the matcher to use
     :param kwlist: the list of keywords to match
@@ -82,49 +213,21 @@ def strip_secrets_from_query(qp, matcher, kwlist):
         if not '=' in qp:
             return qp
 
+        try:
+            secrets_matcher = get_secrets_matcher(matcher, kwlist)
+        except ValueError:
+            logger.debug("strip_secrets_from_query: unknown matcher")
+            return qp
+
         if '?' in qp:
             path, query = qp.split('?')
         else:
             query = qp
 
-        params = parse.parse_qsl(query, keep_blank_values=True)
-        redacted = ['<redacted>']
-
-        if matcher == 'equals-ignore-case':
-            for keyword in kwlist:
-                for index, kv in enumerate(params):
-                    if kv[0].lower() == keyword.lower():
-                        params[index] = (kv[0], redacted)
-        elif matcher == 'equals':
-            for keyword in kwlist:
-                for index, kv in enumerate(params):
-                    if kv[0] == keyword:
-                        params[index] = (kv[0], redacted)
-        elif matcher == 'contains-ignore-case':
-            for keyword in kwlist:
-                for index, kv in enumerate(params):
-                    if keyword.lower() in kv[0].lower():
-                        params[index] = (kv[0], redacted)
-        elif matcher == 'contains':
-            for keyword in kwlist:
-                for index, kv in enumerate(params):
-                    if keyword in kv[0]:
-                        params[index] = (kv[0], redacted)
-        elif matcher == 'regex':
-            for regexp in kwlist:
-                for index, kv in enumerate(params):
-                    if re.match(regexp, kv[0]):
-                        params[index] = (kv[0], redacted)
-        else:
-            logger.debug("strip_secrets_from_query: unknown matcher")
-            return qp
-
-        result = parse.urlencode(params, doseq=True)
-        query = parse.unquote(result)
-
+        scrubbed = secrets_matcher.strip_secrets(query)
         if path:
-            query = path + '?' + query
+            scrubbed = path + '?' + scrubbed
 
-        return query
+        return scrubbed
     except Exception:
         logger.debug("strip_secrets_from_query", exc_info=True)
@@ -0,0 +1,169 @@
+# (c) Copyright IBM Corp. 2024
+
+"""
+JSON encoding of span batches for reporting.
+
+When orjson is installed, spans are written field by field into a reusable output buffer:
+None fields are skipped as they are encountered, without building an intermediate dict
+per span.  Otherwise the batch is encoded in a single pass of the C accelerated encoder of
+the standard library json module, which is faster than driving it one value at a time.
+
+Trace, span and parent IDs may be kept as ints (see util.ids.generate_int_id): they are
+written in their fixed width base 16 form, as generated by util.ids.generate_id.
+"""
+import json
+
+from ..log import logger
+from . import _extractor
+from .ids import format_id
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# The span fields that hold trace, span and parent IDs
+_ID_FIELDS = ("t", "p", "s")
+
+
+def _span_fields(o):
+    fields = _extractor(o)
+    for name in _ID_FIELDS:
+        value = fields.get(name)
+        if isinstance(value, int):
+            fields[name] = format_id(value)
+    return fields
+
+
+_stdlib_encoder = json.JSONEncoder(default=_span_fields, separators=(',', ':'))
+
+
+def _orjson_dumps(value):
+    try:
+        return orjson.dumps(value, default=_span_fields)
+    except TypeError:
+        # e.g. integers wider than 64 bit or non-string dict keys
+        return _stdlib_encoder.encode(value).encode()
+
+
+class SpanBatchEncoder(object):
+    """
+    Encodes lists of spans as a JSON array.  One instance reuses its output buffer across
+    batches and is not meant to be shared between threads.
+    """
+    # Don't hold on to the memory of exceptionally large batches
+    MAX_RETAINED_BUFFER = 1048576
+
+    def __init__(self, fast_backend=True):
+        """
+        @param fast_backend: use orjson when it is installed
+        """
+        if fast_backend and orjson is not None:
+            self.backend = "orjson"
+        else:
+            self.backend = "json"
+
+        self._buffer = bytearray()
+        # Per span class: tuple of (field name, b'"field":', is an ID field) for the slotted fields
+        self._field_keys = {}
+
+    def encode(self, spans):
+        """
+        Encode <spans> to JSON.
+        @return: bytes or None if the batch could not be encoded
+        """
+        try:
+            if self.backend == "json":
+                return _stdlib_encoder.encode(spans).encode()
+            return self._encode_streaming(spans)
+        except Exception:
+            logger.debug("SpanBatchEncoder non-fatal encoding issue: ", exc_info=True)
+            return None
+
+    def encode_chunks(self, spans, max_spans, max_bytes):
+        """
+        Encode <spans> as a series of JSON arrays of at most <max_spans> spans and, unless a
+        single span is larger than that, at most <max_bytes> bytes.
+        @return: generator of (span count, bytes or None if the chunk could not be encoded)
+        """
+        max_spans = max(1, max_spans)
+        for start in range(0, len(spans), max_spans):
+            pending = [spans[start:start + max_spans]]
+            while pending:
+                chunk = pending.pop()
+                body = self.encode(chunk)
+                if body is not None and len(body) > max_bytes and len(chunk) > 1:
+                    middle = len(chunk) // 2
+                    pending.append(chunk[middle:])
+                    pending.append(chunk[:middle])
+                    continue
+                yield len(chunk), body
+
+    def _encode_streaming(self, spans):
+        buffer = self._buffer
+        del buffer[:]
+        try:
+            buffer += b'['
+            first = True
+            for span in spans:
+                if first:
+                    first = False
+                else:
+                    buffer += b','
+                self._write_span(buffer, span)
+            buffer += b']'
+            return bytes(buffer)
+        finally:
+            if len(buffer) > self.MAX_RETAINED_BUFFER:
+                self._buffer = bytearray()
+
+    def _write_span(self, buffer, span):
+        field_keys = self._fields_of(type(span))
+        if field_keys is None:
+            # Not a slotted span: dicts, profiles or legacy span objects
+            buffer += _orjson_dumps(span)
+            return
+
+        separator = b'{'
+        for name, key, is_id in field_keys:
+            value = getattr(span, name, None)
+            if value is None:
+                continue
+            buffer += separator
+            buffer += key
+            if is_id and isinstance(value, int):
+                buffer += b'"%016x"' % value
+            else:
+                buffer += _orjson_dumps(value)
+            separator = b','
+
+        if separator == b'{':
+            buffer += b'{'
+        buffer += b'}'
+
+    def _fields_of(self, cls):
+        try:
+            return self._field_keys[cls]
+        except KeyError:
+            pass
+
+        names = []
+        # Only classes with slots all the way down (no instance __dict__) are written field
+        # by field; BaseSpan and its descendants are
+        if cls.__dictoffset__ == 0:
+            for klass in reversed(cls.__mro__):
+                slots = klass.__dict__.get('__slots__', ())
+                if isinstance(slots, str):
+                    slots = (slots,)
+                for name in slots:
+                    if name not in names and not name.startswith('_'):
+                        names.append(name)
+
+        field_keys = None
+        if names:
+            field_keys = tuple((name, json.dumps(name.lower()).encode() + b':', name in _ID_FIELDS)
+                               for name in names)
+
+        self._field_keys[cls] = field_keys
+        return field_keys
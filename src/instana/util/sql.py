@@ -2,16 +2,190 @@
 # (c) Copyright Instana Inc. 2020
 
 import re
+import sys
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+# Statements are truncated to this length before they are sanitized
+MAX_STATEMENT_LENGTH = 8192
+
+
+class SanitizedStatementCache(object):
+    """
+    LRU cache of sanitized SQL statements keyed by the raw statement.  ORMs send the same
+    statement shapes over and over, so most statements only have to be scanned once.
+
+    The cache is bounded by the number of entries and by the total length of the cached
+    statements; the least recently used entries are evicted first.  Statements longer than
+    <max_statement_length> (e.g. bulk inserts) are not cached.
+    """
+    def __init__(self, max_entries=1024, max_size=1024 * 1024, max_statement_length=2048):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.max_statement_length = max_statement_length
+
+        # Statistics, reported by the runtime metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, sql):
+        with self._lock:
+            sanitized = self._entries.get(sql)
+            if sanitized is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(sql)
+            return sanitized
+
+    def put(self, sql, sanitized):
+        if len(sql) > self.max_statement_length:
+            return
+
+        with self._lock:
+            if sql in self._entries:
+                return
+            self._entries[sql] = sanitized
+            self.size += len(sql) + len(sanitized)
+            while len(self._entries) > self.max_entries or self.size > self.max_size:
+                evicted, evicted_sanitized = self._entries.popitem(last=False)
+                self.size -= len(evicted) + len(evicted_sanitized)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+# Used by sql_sanitizer and sql_normalizer
+statement_cache = SanitizedStatementCache()
+normalized_statement_cache = SanitizedStatementCache()
+
+
+def cache_statistics():
+    """
+    :return: (hits, misses) of the statement caches
+    """
+    return (statement_cache.hits + normalized_statement_cache.hits,
+            statement_cache.misses + normalized_statement_cache.misses)
+
+
+def _truncate(sql):
+    sql = sql[:MAX_STATEMENT_LENGTH]
+    if sql.count("'") % 2:
+        # Don't leak the start of a string literal that was cut in half
+        sql = sql[:sql.rindex("'")] + "?"
+    return sql
+
+
+def _sanitize(sql):
+    if len(sql) <= MAX_STATEMENT_LENGTH:
+        return normalize_statement(regexp_sql_values.sub('?', sql))
+    return normalize_statement(regexp_sql_values.sub('?', _truncate(sql))) + "..."
+
+
+def normalize_statement(sql):
+    """
+    Normalizes the shape of a SQL statement: comments are removed, whitespace is collapsed
+    and lists of placeholders in IN clauses, e.g. "IN (?, ?, ?)", become "IN (?+)".  Quoted
+    literals and identifiers are left untouched.
+
+    :param sql: The SQL statement to be normalized
+    :return: String - the normalized statement
+    """
+    sql = regexp_sql_layout.sub(_normalize_layout, sql).strip()
+    return regexp_sql_in_list.sub(r"\1 (?+)", sql)
+
+
+def _normalize_layout(match):
+    quoted = match.group(1)
+    if quoted is not None:
+        return quoted
+    return ' '
+
 
 def sql_sanitizer(sql):
     """
-    Removes values from valid SQL statements and returns a stripped version.
+    Removes values from valid SQL statements and returns a stripped and normalized version
+    (see normalize_statement).  Statements longer than MAX_STATEMENT_LENGTH are truncated
+    (and end with "...").  Statements of the same shape share one interned string.
 
     :param sql: The SQL statement to be sanitized
     :return: String - A sanitized SQL statement without values.
     """
-    return regexp_sql_values.sub('?', sql)
+    if not isinstance(sql, str):
+        return regexp_sql_values.sub('?', sql)
+
+    sanitized = statement_cache.get(sql)
+    if sanitized is None:
+        sanitized = sys.intern(_sanitize(sql))
+        statement_cache.put(sql, sanitized)
+    return sanitized
+
+
+def sql_normalizer(sql):
+    """
+    Normalizes statements that are reported with their values, e.g. parameterized SQLAlchemy,
+    CQL or N1QL statements (see normalize_statement).  Statements longer than
+    MAX_STATEMENT_LENGTH are truncated (and end with "...").  Statements of the same shape
+    share one interned string.  Anything but strings is returned as is.
+
+    :param sql: The statement to be normalized
+    :return: String - the normalized statement
+    """
+    if not isinstance(sql, str):
+        return sql
+
+    normalized = normalized_statement_cache.get(sql)
+    if normalized is None:
+        if len(sql) <= MAX_STATEMENT_LENGTH:
+            normalized = normalize_statement(sql)
+        else:
+            normalized = normalize_statement(_truncate(sql)) + "..."
+        normalized = sys.intern(normalized)
+        normalized_statement_cache.put(sql, normalized)
+    return normalized
+
+
+def statement_fingerprint(sql):
+    """
+    A stable hash of the normalized statement (see sql_normalizer), shared by all the
+    statements of the same shape.  The instrumentations pass the statements they report,
+    which are already normalized and interned, so the hash is memoized per statement.
+
+    :param sql: The statement
+    :return: String - 16 hex digits, or None for anything but strings
+    """
+    if not isinstance(sql, str):
+        return None
+    return _fingerprint(sql)
+
+
+@lru_cache(maxsize=1024)
+def _fingerprint(sql):
+    normalized = sql_normalizer(sql)
+    return hashlib.blake2b(normalized.encode("utf-8", "replace"), digest_size=8).hexdigest()
+
 
+# Used by sql_sanitizer: string literals (with '' or backslash escaped quotes) and numbers
+regexp_sql_values = re.compile(r"('(?:[^'\\]|\\[\s\S])*'|\d*\.\d+|\d+|NULL)")
 
-# Used by sql_sanitizer
-regexp_sql_values = re.compile(r"('[\s\S][^']*'|\d*\.\d+|\d+|NULL)")
\ No newline at end of file
+# Used by normalize_statement: quoted literals or identifiers (kept), with doubled or backslash
+# escaped (e.g. MySQL 'it\'s') quotes, or runs of whitespace and comments (collapsed to a single
+# space)
+regexp_sql_layout = re.compile(r"""('(?:[^'\\]|''|\\[\s\S])*'|"(?:[^"\\]|""|\\[\s\S])*")"""
+                               r"""|(?:\s|--[^\n]*|/\*[\s\S]*?\*/)+""")
+_placeholder = r"(?:\?|%s|%\(\w+\)s|:\w+\??|\$(?:\d+|\?))"
+regexp_sql_in_list = re.compile(r"\b(IN)\s*\(\s*%s(?:\s*,\s*%s)*\s*\)" % (_placeholder, _placeholder),
+                                re.IGNORECASE)
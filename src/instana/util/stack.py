@@ -0,0 +1,106 @@
+# (c) Copyright IBM Corp. 2024
+
+"""
+Capture of the stack traces reported with exit spans.
+
+The stack is walked frame by frame with sys._getframe, newest frame first, and the walk
+stops as soon as <limit> frames are collected.  No source lines are read.  Capturing only
+keeps (code object, line number) pairs; they are formatted into the reported
+{"c", "n", "m"} entries with `format_stack` when the span is converted for reporting.
+Both the "is this an Instana frame" decision and the formatted entries are cached.
+"""
+import os
+import re
+import sys
+
+# Frames of the Instana package or of `with_instana` wrappers are left out of the stack
+# traces (unless INSTANA_DEBUG is set)
+re_tracer_frame = re.compile(r"/instana/.*\.py$")
+re_with_stan_frame = re.compile('with_instana')
+
+# A hard limit for the length of captured stack traces
+MAX_STACK_LENGTH = 40
+
+_MAX_CACHE_SIZE = 8192
+
+# code object -> True for Instana frames
+_instana_code_cache = {}
+
+# (code object, line number) -> entry {"c", "n", "m"}, shared by all the reported spans
+_entry_cache = {}
+
+
+def _bounded_set(cache, key, value):
+    if len(cache) >= _MAX_CACHE_SIZE:
+        # Bounded: start over rather than tracking usage on the hot path
+        cache.clear()
+    cache[key] = value
+
+
+def is_instana_code(code):
+    try:
+        return _instana_code_cache[code]
+    except KeyError:
+        pass
+
+    result = (re_tracer_frame.search(code.co_filename) is not None or
+              re_with_stan_frame.search(code.co_name) is not None)
+    _bounded_set(_instana_code_cache, code, result)
+    return result
+
+
+def capture_frames(limit=30, skip=1):
+    """
+    Capture the stack of the calling thread without formatting it, newest frame first.
+    @param limit: the maximum number of frames (capped at MAX_STACK_LENGTH)
+    @param skip: the number of (innermost) frames to leave out; 1 omits the caller
+    @return: tuple of (code object, line number) pairs
+    """
+    limit = min(limit, MAX_STACK_LENGTH)
+    if limit <= 0:
+        return ()
+
+    try:
+        frame = sys._getframe(skip + 1)
+    except ValueError:
+        return ()
+
+    frames = []
+    # Include the Instana frames in dev mode
+    debug = "INSTANA_DEBUG" in os.environ
+    while frame is not None:
+        code = frame.f_code
+        if debug or not is_instana_code(code):
+            frames.append((code, frame.f_lineno))
+            if len(frames) >= limit:
+                break
+        frame = frame.f_back
+    return tuple(frames)
+
+
+def format_stack(frames):
+    """
+    Format frames captured with `capture_frames` as reported.
+    @param frames: iterable of (code object, line number) pairs
+    @return: list of {"c": file, "n": line, "m": function} dicts
+    """
+    stack = []
+    for key in frames:
+        try:
+            entry = _entry_cache[key]
+        except KeyError:
+            code, lineno = key
+            entry = {"c": sys.intern(code.co_filename), "n": lineno, "m": sys.intern(code.co_name)}
+            _bounded_set(_entry_cache, key, entry)
+        stack.append(entry)
+    return stack
+
+
+def capture_stack(limit=30, skip=1):
+    """
+    Capture and format the stack of the calling thread, newest frame first.
+    @param limit: the maximum number of frames (capped at MAX_STACK_LENGTH)
+    @param skip: the number of (innermost) frames to leave out; 1 omits the caller
+    @return: list of {"c": file, "n": line, "m": function} dicts
+    """
+    return format_stack(capture_frames(limit, skip + 1))
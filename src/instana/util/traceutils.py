@@ -1,7 +1,8 @@
 # (c) Copyright IBM Corp. 2021
 # (c) Copyright Instana Inc. 2021
 
-from ..singletons import agent, tracer, async_tracer, tornado_tracer
+from ..singletons import agent, tracer
+from .active_scope import get_active
 from ..log import logger
 
 
@@ -17,29 +18,30 @@ def extract_custom_headers(tracing_span, headers):
 
 
 def get_active_tracer():
-    try:
-        if tracer.active_span:
-            return tracer
-        elif async_tracer.active_span:
-            return async_tracer
-        elif tornado_tracer.active_span:
-            return tornado_tracer
-        else:
-            return None
-    except Exception:
-        # Do not try to log this with instana, as there is no active tracer and there will be an infinite loop at least
-        # for PY2
+    """
+    @return: the tracer (tracer, async_tracer or tornado_tracer) with an active span or None
+    """
+    active = get_active()
+    if active is None:
         return None
+    return active[0]
 
 
 def get_tracer_tuple():
-    active_tracer = get_active_tracer()
-    if active_tracer:
-        return (active_tracer, active_tracer.active_span, active_tracer.active_span.operation_name)
+    """
+    The tracer, parent span and parent operation name for new exit spans, in one lookup
+    of the active scope registry (see util.active_scope).
+    @return: (tracer, span, operation name); (tracer, None, None) when only exit spans
+             without a parent are traced and (None, None, None) when tracing is off
+    """
+    active = get_active()
+    if active is not None:
+        active_tracer, span = active
+        return (active_tracer, span, span.operation_name)
     elif agent.options.allow_exit_as_root:
         return (tracer, None, None)
     return (None, None, None)
 
 
 def tracing_is_off():
-    return not (bool(get_active_tracer()) or agent.options.allow_exit_as_root)
+    return get_active() is None and not agent.options.allow_exit_as_root
@@ -67,12 +67,15 @@ class Traceparent:
             #   downstream.
             _, trace_id, _, _ = self.get_traceparent_fields(traceparent)
 
-        parent_id = in_span_id.zfill(16)
-        flags = level & SAMPLED_BITMASK
-        flags = format(flags, '0>2x')
+        return self.format_traceparent(trace_id, in_span_id, level)
 
-        traceparent = "{version}-{traceid}-{parentid}-{flags}".format(version=self.SPECIFICATION_VERSION,
-                                                                        traceid=trace_id,
-                                                                        parentid=parent_id,
-                                                                        flags=flags)
-        return traceparent
+    def format_traceparent(self, trace_id, in_span_id, level):
+        """
+        Builds the traceparent header sent downstream
+        :param trace_id: the (32 characters) trace id of the traceparent header
+        :param in_span_id: instana span id, used as the parent id
+        :param level: instana level, used to determine the value of sampled flag
+        :return: the traceparent header
+        """
+        flags = "01" if level & SAMPLED_BITMASK else "00"
+        return "%s-%s-%s-%s" % (self.SPECIFICATION_VERSION, trace_id, in_span_id.zfill(16), flags)
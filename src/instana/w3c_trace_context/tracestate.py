@@ -32,6 +32,63 @@ class Tracestate:
             logger.debug("extract instana ancestor error:", exc_info=True)
         return None
 
+    def upstream_members(self, tracestate):
+        """
+        The list members of an incoming tracestate that are propagated after the instana one:
+        without the existing in= entry and truncated to leave room for the instana one.  They
+        only depend on the incoming header, so they can be computed once per request.
+
+        :param tracestate: original tracestate header
+        :return: the list members as a string, or None if there were none at all
+        """
+        if tracestate is None or tracestate == "":
+            return None
+
+        # remove the existing in= entry
+        if "in=" in tracestate:
+            splitted = tracestate.split("in=")
+            before_in = splitted[0]
+            after_in = splitted[1].split(",")[1:]
+            tracestate = '{}{}'.format(before_in, ",".join(after_in))
+        # tracestate can contain a max of 32 list members, if it contains up to 31
+        # we can safely add the instana one without the need to truncate anything
+        list_members = tracestate.split(",")
+        if len(list_members) <= self.MAX_NUMBER_OF_LIST_MEMBERS - 1:
+            return tracestate
+
+        list_members_to_remove = len(list_members) - self.MAX_NUMBER_OF_LIST_MEMBERS + 1
+        # Number 1 priority members to be removed are the ones larger than 128 characters
+        for i, m in reversed(list(enumerate(list_members))):
+            if len(m) > self.REMOVE_ENTRIES_LARGER_THAN:
+                list_members.pop(i)
+                list_members_to_remove -= 1
+            if list_members_to_remove == 0:
+                break
+        # if there are still more than 31 list members remaining, we remove as many members
+        # from the end as necessary to remain just 31 list members
+        while list_members_to_remove > 0:
+            list_members.pop()
+            list_members_to_remove -= 1
+        # the tracestate containing just 31 list members
+        return ",".join(list_members)
+
+    @staticmethod
+    def format_tracestate(members, in_trace_id, in_span_id):
+        """
+        Splice the instana list member in front of the upstream list members
+
+        :param members: list members as returned by upstream_members
+        :param in_trace_id: instana trace_id
+        :param in_span_id: instana parent_id
+        :return: tracestate
+        """
+        # if span_id is shorter than 16 characters we prepend zeros
+        instana_tracestate = "in=" + in_trace_id + ";" + in_span_id.zfill(16)
+        if members is None:
+            return instana_tracestate
+        # adding instana as first list member
+        return instana_tracestate + "," + members
+
     def update_tracestate(self, tracestate, in_trace_id, in_span_id):
         """
         Method to update the tracestate property with the instana trace_id and span_id
@@ -42,40 +99,7 @@ class Tracestate:
         :return: tracestate updated
         """
         try:
-            span_id = in_span_id.zfill(16)  # if span_id is shorter than 16 characters we prepend zeros
-            instana_tracestate = "in={};{}".format(in_trace_id, span_id)
-            if tracestate is None or tracestate == "":
-                tracestate = instana_tracestate
-            else:
-                # remove the existing in= entry
-                if "in=" in tracestate:
-                    splitted = tracestate.split("in=")
-                    before_in = splitted[0]
-                    after_in = splitted[1].split(",")[1:]
-                    tracestate = '{}{}'.format(before_in, ",".join(after_in))
-                # tracestate can contain a max of 32 list members, if it contains up to 31
-                # we can safely add the instana one without the need to truncate anything
-                if len(tracestate.split(",")) <= self.MAX_NUMBER_OF_LIST_MEMBERS - 1:
-                    tracestate = "{},{}".format(instana_tracestate, tracestate)
-                else:
-                    list_members = tracestate.split(",")
-                    list_members_to_remove = len(list_members) - self.MAX_NUMBER_OF_LIST_MEMBERS + 1
-                    # Number 1 priority members to be removed are the ones larger than 128 characters
-                    for i, m in reversed(list(enumerate(list_members))):
-                        if len(m) > self.REMOVE_ENTRIES_LARGER_THAN:
-                            list_members.pop(i)
-                            list_members_to_remove -= 1
-                        if list_members_to_remove == 0:
-                            break
-                    # if there are still more than 31 list members remaining, we remove as many members
-                    # from the end as necessary to remain just 31 list members
-                    while list_members_to_remove > 0:
-                        list_members.pop()
-                        list_members_to_remove -= 1
-                    # update the tracestate containing just 31 list members
-                    tracestate = ",".join(list_members)
-                    # adding instana as first list member, total of 32 list members
-                    tracestate = "{},{}".format(instana_tracestate, tracestate)
+            return self.format_tracestate(self.upstream_members(tracestate), in_trace_id, in_span_id)
         except Exception:
             logger.debug("Something went wrong while updating tracestate: {}:".format(tracestate), exc_info=True)
 
@@ -5,6 +5,8 @@ import time
 import unittest
 import random
 import threading
+import tracemalloc
+from collections import namedtuple
 
 from instana.autoprofile.profiler import Profiler
 from instana.autoprofile.runtime import min_version, runtime_info
@@ -60,6 +62,130 @@ class AllocationSamplerTestCase(unittest.TestCase):
 
         self.assertTrue('test_allocation_sampler.py' in str(profile))
 
+    def test_sampled_allocation_profiles(self):
+        if runtime_info.OS_WIN or not min_version(3, 4):
+            return
+
+        profiler = Profiler(None)
+        profiler.start(disable_timers=True, allocation_sampler_sampled=True)
+        sampler = AllocationSampler(profiler)
+        sampler.setup()
+        sampler.reset()
+        self.assertTrue(sampler.sampled)
+
+        retained = []
+        def mem_retain(n=20000):
+            for i in range(0, n):
+                retained.append(str(i))
+
+        def mem_temporary(n=20000):
+            return [str(i) for i in range(0, n)]
+
+        def profiling_span():
+            # tracemalloc is started from the main thread (SIGUSR2)
+            sampler.start_sampler()
+            time.sleep(0.1)
+            temporary = mem_temporary()
+            # end of a SNAPSHOT_INTERVAL, only used by allocation rate spans
+            if not sampler.growth_span:
+                sampler.take_snapshot()
+                # tracing goes on until the end of the span
+                self.assertTrue(tracemalloc.is_tracing())
+            temporary = None
+            mem_retain()
+            sampler.stop_sampler()
+
+        # allocation rate span, then heap growth span
+        profiling_span()
+        self.assertTrue(sampler.growth_span is False)
+        profiling_span()
+        self.assertTrue(sampler.growth_span)
+
+        profiles = sampler.build_profiles(2000, 120000)
+        self.assertEqual(2, len(profiles))
+
+        temporary_line = "'file_line': %d" % (mem_temporary.__code__.co_firstlineno + 1)
+        retained_line = "'file_line': %d" % (mem_retain.__code__.co_firstlineno + 2)
+
+        rate_profile = profiles[0].to_dict()
+        self.assertEqual('memory-allocation-rate', rate_profile['type'])
+        self.assertTrue(temporary_line in str(rate_profile))
+        self.assertTrue(retained_line in str(rate_profile))
+        # The allocations of the profiler and of tracemalloc (e.g. of compare_to) are filtered out
+        self.assertFalse('tracemalloc.py' in str(rate_profile))
+        self.assertFalse(profiler.frame_cache.profiler_dir in str(rate_profile))
+
+        # Only the retained allocations are reported as growth
+        growth_profile = profiles[1].to_dict()
+        self.assertEqual('memory-heap-growth', growth_profile['type'])
+        self.assertTrue(retained_line in str(growth_profile))
+        self.assertFalse(temporary_line in str(growth_profile))
+
+    def test_sampled_bytes_are_carried_over_per_profile(self):
+        profiler = Profiler(None)
+        profiler.start(disable_timers=True, allocation_sampler_sampled=True)
+        sampler = AllocationSampler(profiler)
+        sampler.reset()
+
+        Frame = namedtuple('Frame', 'filename lineno')
+        Stat = namedtuple('Stat', 'traceback size')
+        StatDiff = namedtuple('StatDiff', 'traceback size_diff')
+
+        class Snapshot(object):
+            def __init__(self, filename, size):
+                self.stats = [Stat([Frame(filename, 1)], size)]
+
+            def statistics(self, key_type):
+                return self.stats
+
+            def compare_to(self, old_snapshot, key_type):
+                return [StatDiff(stat.traceback, stat.size) for stat in self.stats]
+
+        half = sampler.SAMPLING_INTERVAL_BYTES // 2
+        sampler.process_sampled_snapshot(Snapshot('rate.py', half), False)
+        # The remainder of the allocation rate profile is not attributed to heap growth
+        sampler.process_sampled_snapshot(Snapshot('growth.py', half), True)
+        self.assertEqual({}, sampler.top.children)
+        self.assertEqual({}, sampler.growth_top.children)
+
+        sampler.process_sampled_snapshot(Snapshot('rate.py', half), False)
+        self.assertEqual(1, len(sampler.top.children))
+        self.assertEqual(half, sampler.unsampled_growth_bytes)
+
+        sampler.reset()
+        self.assertEqual(0, sampler.unsampled_rate_bytes)
+        self.assertEqual(0, sampler.unsampled_growth_bytes)
+
+    def test_allocation_rate_counts_growth_since_the_previous_snapshot(self):
+        if runtime_info.OS_WIN or not min_version(3, 4):
+            return
+
+        profiler = Profiler(None)
+        profiler.start(disable_timers=True, allocation_sampler_sampled=True)
+        sampler = AllocationSampler(profiler)
+        sampler.setup()
+        sampler.reset()
+
+        def allocate(n=20000):
+            return [str(i) for i in range(0, n)]
+
+        def num_samples(node):
+            return node.num_samples + sum(num_samples(child) for child in node.children.values())
+
+        tracemalloc.start(sampler.SAMPLED_TRACEBACK_SIZE)
+        try:
+            first = allocate()
+            sampler.process_sampled_snapshot(tracemalloc.take_snapshot(), False)
+            first_samples = num_samples(sampler.top)
+            self.assertTrue(first_samples > 0)
+
+            # Only the profiler allocated since, processing the previous snapshot: the blocks
+            # of the previous interval are not counted again
+            sampler.process_sampled_snapshot(tracemalloc.take_snapshot(), False)
+            self.assertEqual(first_samples, num_samples(sampler.top))
+        finally:
+            tracemalloc.stop()
+            sampler.rate_snapshot = None
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,12 +1,14 @@
 # (c) Copyright IBM Corp. 2021
 # (c) Copyright Instana Inc. 2020
 
+import asyncio
 import os
 import time
 import unittest
 import random
 import threading
 
+from instana.autoprofile.profile import SampleBuffer
 from instana.autoprofile.profiler import Profiler
 from instana.autoprofile.runtime import runtime_info
 from instana.autoprofile.samplers.block_sampler import BlockSampler
@@ -74,6 +76,139 @@ class BlockSamplerTestCase(unittest.TestCase):
         self.assertTrue('lock_wait' in str(profile))
         self.assertTrue('event_wait' in str(profile))
 
+    def test_samples_are_aggregated_during_the_span(self):
+        if runtime_info.OS_WIN:
+            return
+
+        profiler = Profiler(None)
+        profiler.start(disable_timers=True)
+        sampler = BlockSampler(profiler)
+        sampler.AGGREGATE_INTERVAL = 0.2
+        sampler.samples = SampleBuffer(10)
+        sampler.spare_samples = SampleBuffer(10)
+        sampler.setup()
+        sampler.reset()
+
+        event = threading.Event()
+
+        def worker_wait():
+            event.wait()
+
+        workers = [threading.Thread(target=worker_wait) for _ in range(60)]
+        for worker in workers:
+            worker.start()
+
+        def record():
+            sampler.start_sampler()
+            time.sleep(1.5)
+            sampler.stop_sampler()
+
+        record_t = threading.Thread(target=record)
+        record_t.start()
+        record_t.join()
+        event.set()
+        for worker in workers:
+            worker.join()
+
+        # Each buffer holds ~0.2s of samples of all threads, far less than the span
+        self.assertLess(sampler.samples.capacity, 60 * 1.5 / sampler.SAMPLING_RATE)
+        self.assertEqual(0, sampler.dropped_samples)
+
+        def num_samples(node):
+            return node.num_samples + sum(num_samples(child) for child in node.children.values())
+
+        def find(node, method_name):
+            if node.method_name == method_name:
+                return node
+            for child in node.children.values():
+                found = find(child, method_name)
+                if found is not None:
+                    return found
+
+        self.assertGreater(num_samples(find(sampler.top, 'worker_wait')), 60 * 20)
+
+    def test_asyncio_block_profile(self):
+        if runtime_info.OS_WIN:
+            return
+
+        profiler = Profiler(None)
+        profiler.start(disable_timers=True)
+        sampler = BlockSampler(profiler)
+        sampler.setup()
+        sampler.reset()
+
+        async def await_sleep():
+            await asyncio.sleep(1.5)
+
+        async def await_task():
+            await await_sleep()
+
+        async def stall_loop():
+            await asyncio.sleep(0.5)
+            time.sleep(0.5)
+
+        async def record():
+            sampler.start_sampler()
+            await asyncio.gather(await_task(), stall_loop())
+            sampler.stop_sampler()
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(record())
+        finally:
+            loop.close()
+
+        profiles = sampler.build_profiles(2000, 120000)
+        self.assertEqual(2, len(profiles))
+
+        block_profile = profiles[0].to_dict()
+        self.assertTrue('await_sleep' in str(block_profile))
+        self.assertTrue('await_task' in str(block_profile))
+
+        stall_profile = profiles[1].to_dict()
+        self.assertEqual('event-loop-stalls', stall_profile['type'])
+        self.assertTrue('stall_loop' in str(stall_profile))
+        self.assertFalse('await_sleep' in str(stall_profile))
+
+    def test_asyncio_many_tasks(self):
+        if runtime_info.OS_WIN:
+            return
+
+        profiler = Profiler(None)
+        profiler.start(disable_timers=True)
+        sampler = BlockSampler(profiler)
+        sampler.setup()
+        sampler.reset()
+
+        async def await_request():
+            await asyncio.sleep(1.5)
+
+        async def record():
+            sampler.start_sampler()
+            await asyncio.gather(*[await_request() for _ in range(400)])
+            sampler.stop_sampler()
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(record())
+        finally:
+            loop.close()
+
+        # Unfolded, the 400 task stacks of each sample would fill the buffer within a second
+        self.assertEqual(0, sampler.dropped_samples)
+
+        def num_samples(node):
+            return node.num_samples + sum(num_samples(child) for child in node.children.values())
+
+        def find_all(node, method_name):
+            # The task stacks and the stack of the main thread both pass through await_request
+            if node.method_name == method_name:
+                return [node]
+            return [found for child in node.children.values() for found in find_all(child, method_name)]
+
+        nodes = find_all(sampler.top, 'await_request')
+        self.assertGreater(sum(num_samples(node) for node in nodes), 400 * 20)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -8,6 +8,7 @@ import threading
 import sys
 import traceback
 
+from instana.autoprofile.profile import SampleBuffer
 from instana.autoprofile.profiler import Profiler
 from instana.autoprofile.runtime import runtime_info
 from instana.autoprofile.samplers.cpu_sampler import CPUSampler
@@ -46,6 +47,96 @@ class CPUSamplerTestCase(unittest.TestCase):
 
         self.assertTrue('cpu_work_main_thread' in str(profile))
 
+    def test_cpu_profile_all_threads(self):
+        if runtime_info.OS_WIN:
+            return
+
+        profiler = Profiler(None)
+        profiler.start(disable_timers=True, cpu_sampler_all_threads=True)
+        sampler = CPUSampler(profiler)
+        sampler.setup()
+        if not sampler.all_threads:
+            return
+        sampler.reset()
+
+        done = threading.Event()
+
+        def cpu_work_worker_thread():
+            i = 0
+            while not done.is_set():
+                text = "text1" + str(i)
+                i += 1
+
+        worker_t = threading.Thread(target=cpu_work_worker_thread, name="cpu-worker")
+        worker_t.start()
+
+        sampler.start_sampler()
+        deadline = time.time() + 2
+        while time.time() < deadline:
+            str(random.random())
+        sampler.stop_sampler()
+
+        done.set()
+        worker_t.join()
+
+        profile = sampler.build_profile(2000, 120000).to_dict()
+        roots = [root['method_name'] for root in profile['roots']]
+
+        self.assertTrue('Thread cpu-worker' in roots)
+        self.assertTrue('Thread MainThread' in roots)
+        self.assertTrue('cpu_work_worker_thread' in str(profile))
+
+    def test_update_profile(self):
+        profiler = Profiler(None)
+        profiler.start(disable_timers=True)
+        sampler = CPUSampler(profiler)
+        sampler.reset()
+
+        def leaf():
+            return sampler.recover_stack(sys._getframe())
+
+        stack = leaf()
+        self.assertIs(leaf.__code__, stack[0][0])
+        sampler.update_profile(sampler.top, stack)
+        sampler.update_profile(sampler.top, stack)
+
+        node = sampler.top
+        for code, lineno in reversed(stack):
+            self.assertEqual(1, len(node.children))
+            node = node.children[(code, lineno)]
+        self.assertEqual('leaf', node.method_name)
+        self.assertEqual(__file__, node.file_name)
+        self.assertEqual(2, node.num_samples)
+
+        profile = sampler.build_profile(2000, 120000).to_dict()
+        self.assertTrue('leaf' in str(profile))
+
+    def test_buffered_samples(self):
+        profiler = Profiler(None)
+        profiler.start(disable_timers=True)
+        sampler = CPUSampler(profiler)
+        sampler.samples = SampleBuffer(3)
+        sampler.reset()
+
+        def leaf():
+            for _ in range(5):
+                sampler.process_sample(sys._getframe())
+
+        leaf()
+        # Nothing is added to the call tree by the signal handler
+        self.assertEqual({}, sampler.top.children)
+        self.assertEqual(3, sampler.samples.count)
+
+        sampler.aggregate_samples()
+        self.assertEqual(0, sampler.samples.count)
+        self.assertEqual(2, sampler.dropped_samples)
+
+        node = sampler.top
+        while node.children:
+            node = list(node.children.values())[0]
+        self.assertEqual('leaf', node.method_name)
+        self.assertEqual(3, node.num_samples)
+
 
 if __name__ == '__main__':
     unittest.main()
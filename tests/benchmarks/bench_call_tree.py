@@ -0,0 +1,100 @@
+# (c) Copyright IBM Corp. 2024
+
+"""
+Microbenchmark for the per-sample work of the CPU and block samplers: recovering a stack
+and adding it to the call tree, compared to the former implementation keyed by formatted
+'{method} ({file}:{line})' strings.
+
+    python tests/benchmarks/bench_call_tree.py [iterations] [depth]
+"""
+import sys
+import time
+
+from instana.autoprofile.profile import CallSite
+from instana.autoprofile.profiler import Profiler
+from instana.autoprofile.samplers.cpu_sampler import CPUSampler
+
+MAX_TRACEBACK_SIZE = 25
+
+
+class StringKeyedCallSite(object):
+    __slots__ = ['method_name', 'file_name', 'file_line', 'measurement', 'num_samples', 'children']
+
+    def __init__(self, method_name, file_name, file_line):
+        self.method_name = method_name
+        self.file_name = file_name
+        self.file_line = file_line
+        self.measurement = 0
+        self.num_samples = 0
+        self.children = dict()
+
+    def create_key(self, method_name, file_name, file_line):
+        return '{0} ({1}:{2})'.format(method_name, file_name, file_line)
+
+    def find_or_add_child(self, method_name, file_name, file_line):
+        key = self.create_key(method_name, file_name, file_line)
+        child = self.children.get(key)
+        if child == None:
+            child = StringKeyedCallSite(method_name, file_name, file_line)
+            self.children[key] = child
+        return child
+
+    def increment(self, value, count):
+        self.measurement += value
+        self.num_samples += count
+
+
+def string_keyed_sample(profiler, top, frame):
+    stack = []
+    depth = 0
+    while frame is not None and depth <= MAX_TRACEBACK_SIZE:
+        if frame.f_code and frame.f_code.co_name and frame.f_code.co_filename:
+            func_name = frame.f_code.co_name
+            filename = frame.f_code.co_filename
+            lineno = frame.f_lineno
+            if filename and profiler.frame_cache.is_profiler_frame(filename):
+                return
+            stack.append((func_name, filename, lineno))
+            frame = frame.f_back
+        depth += 1
+
+    current_node = top
+    for func_name, filename, lineno in reversed(stack):
+        current_node = current_node.find_or_add_child(func_name, filename, lineno)
+    current_node.increment(1, 1)
+
+
+def nested(depth, function):
+    if depth:
+        return nested(depth - 1, function)
+    return function()
+
+
+def main(iterations=20000, depth=30):
+    profiler = Profiler(None)
+    profiler.start(disable_timers=True)
+    sampler = CPUSampler(profiler)
+    sampler.reset()
+    string_keyed_top = StringKeyedCallSite('', '', 0)
+
+    def tuple_keyed():
+        sampler.update_profile(sampler.top, sampler.recover_stack(sys._getframe()))
+
+    def string_keyed():
+        string_keyed_sample(profiler, string_keyed_top, sys._getframe())
+
+    print("%-16s %12s" % ("implementation", "usec/sample"))
+    for label, sample in (("string keys", string_keyed), ("tuple keys", tuple_keyed)):
+        def run():
+            start = time.perf_counter()
+            for _ in range(iterations):
+                sample()
+            return time.perf_counter() - start
+        elapsed = nested(depth, run)
+        print("%-16s %12.2f" % (label, elapsed / iterations * 1e6))
+
+    profiler.destroy()
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,67 @@
+# (c) Copyright IBM Corp. 2024
+
+"""
+Microbenchmark for util.ids.generate_id, compared to the former implementation (one
+module-global random.Random, os.getpid on every call and format/zfill), single threaded
+and with concurrent threads.
+
+    python tests/benchmarks/bench_id_generation.py [iterations] [threads]
+"""
+import os
+import sys
+import time
+import random
+import threading
+
+from instana.util.ids import format_id, generate_id, generate_int_id
+
+_rnd = random.Random()
+_current_pid = 0
+
+
+def previous_generate_id():
+    global _current_pid
+
+    pid = os.getpid()
+    if _current_pid != pid:
+        _current_pid = pid
+        _rnd.seed(int(1000000 * time.time()) ^ pid)
+    new_id = format(_rnd.randint(0, 18446744073709551615), '02x')
+
+    if len(new_id) < 16:
+        new_id = new_id.zfill(16)
+
+    return new_id
+
+
+def int_ids_formatted():
+    return format_id(generate_int_id())
+
+
+def timed(function, iterations, threads):
+    def run():
+        for _ in range(iterations):
+            function()
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+
+def main(iterations=200000, threads=4):
+    print("%-22s %8s %14s" % ("implementation", "threads", "nsec/id"))
+    for label, function in (("previous generate_id", previous_generate_id),
+                            ("generate_id", generate_id),
+                            ("generate_int_id", generate_int_id),
+                            ("format_id(int id)", int_ids_formatted)):
+        for count in (1, threads):
+            elapsed = timed(function, iterations, count)
+            print("%-22s %8d %14.1f" % (label, count, elapsed / (iterations * count) * 1e9))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,93 @@
+# (c) Copyright IBM Corp. 2024
+
+"""
+Microbenchmark for the conversion of finished InstanaSpans into RegisteredSpans.
+
+Prints the average cost per span for each registered span type.  Run with:
+
+    python tests/benchmarks/bench_span_conversion.py [iterations]
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("INSTANA_TEST", "true")
+
+from instana.recorder import StanRecorder
+from instana.span import RegisteredSpan, SPAN_TYPES
+from instana.tracer import InstanaTracer
+
+HTTP_TAGS = {
+    "http.host": "example.com", "http.url": "http://example.com/api", "http.path": "/api",
+    "http.params": "a=1", "http.method": "GET", "http.status_code": 200,
+    "http.header.X-Custom": "value",
+}
+
+SPAN_TAGS = {
+    "aiohttp-client": HTTP_TAGS,
+    "aiohttp-server": HTTP_TAGS,
+    "asgi": HTTP_TAGS,
+    "aws.lambda.entry": {"lambda.arn": "arn:aws:lambda:fn", "lambda.name": "fn", "lambda.version": "1",
+                         "lambda.trigger": "aws:sqs", "lambda.sqs.messages": [{"queue": "q"}]},
+    "boto3": dict(HTTP_TAGS, op="ListBuckets", ep="https://s3", reg="us-east-1", payload={"Bucket": "b"}),
+    "cassandra": {"cassandra.cluster": "c", "cassandra.query": "SELECT 1", "cassandra.keyspace": "k",
+                  "cassandra.fetchSize": 10},
+    "celery-client": {"task": "t", "task_id": "1", "scheme": "redis", "host": "localhost", "port": 6379},
+    "celery-worker": {"task": "t", "task_id": "1", "scheme": "redis", "host": "localhost", "port": 6379},
+    "couchbase": {"couchbase.hostname": "h", "couchbase.bucket": "b", "couchbase.type": "get"},
+    "django": HTTP_TAGS,
+    "gcps-consumer": {"gcps.op": "consume", "gcps.projid": "p", "gcps.sub": "s"},
+    "gcps-producer": {"gcps.op": "publish", "gcps.projid": "p", "gcps.top": "t"},
+    "gcs": {"gcs.op": "objects.get", "gcs.bucket": "b", "gcs.object": "o"},
+    "log": {},
+    "memcache": {},
+    "mongo": {"host": "localhost", "port": 27017, "db": "d", "collection": "c", "command": "find"},
+    "mysql": {"host": "localhost", "port": 3306, "db.instance": "d", "db.user": "u", "db.statement": "SELECT 1"},
+    "postgres": {"host": "localhost", "port": 5432, "db.instance": "d", "db.user": "u", "db.statement": "SELECT 1"},
+    "pymongo": {},
+    "rabbitmq": {"exchange": "e", "queue": "q", "sort": "publish", "address": "localhost", "key": "k"},
+    "redis": {"connection": "redis://localhost", "driver": "redis-py", "command": "GET"},
+    "render": {"name": "index.html", "type": "template"},
+    "rpc-client": {"rpc.flavor": "grpc", "rpc.host": "localhost", "rpc.port": 50051, "rpc.call": "/Svc/Call"},
+    "rpc-server": {"rpc.flavor": "grpc", "rpc.host": "localhost", "rpc.port": 50051, "rpc.call": "/Svc/Call"},
+    "sqlalchemy": {"sqlalchemy.sql": "SELECT 1", "sqlalchemy.eng": "sqlite", "sqlalchemy.url": "sqlite://"},
+    "tornado-client": HTTP_TAGS,
+    "tornado-server": HTTP_TAGS,
+    "urllib3": HTTP_TAGS,
+    "wsgi": HTTP_TAGS,
+}
+
+
+def make_spans(tracer, operation_name, count):
+    spans = []
+    for _ in range(count):
+        span = tracer.start_span(operation_name, tags=dict(SPAN_TAGS.get(operation_name, {})))
+        span.stack = None
+        if operation_name == "log":
+            span.log_kv({"message": "hello", "parameters": "()"})
+        span.finish()
+        spans.append(span)
+    return spans
+
+
+def main(iterations=2000):
+    tracer = InstanaTracer(recorder=StanRecorder())
+    # Don't queue anything while preparing the spans
+    tracer.recorder = type("NullRecorder", (), {"record_span": lambda self, span: None})()
+
+    source = {"e": os.getpid(), "h": "bench"}
+    total = 0.0
+    print("%-18s %12s" % ("span type", "usec/span"))
+    for operation_name in sorted(SPAN_TYPES):
+        spans = make_spans(tracer, operation_name, iterations)
+        start = time.perf_counter()
+        for span in spans:
+            RegisteredSpan(span, source, None)
+        elapsed = time.perf_counter() - start
+        total += elapsed
+        print("%-18s %12.2f" % (operation_name, elapsed / iterations * 1e6))
+    print("%-18s %12.2f" % ("average", total / (iterations * len(SPAN_TYPES)) * 1e6))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
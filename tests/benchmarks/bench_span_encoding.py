@@ -0,0 +1,51 @@
+# (c) Copyright IBM Corp. 2024
+
+"""
+Microbenchmark for the JSON encoding of a batch of RegisteredSpans (one of each
+registered span type per iteration) with util.to_json and the SpanBatchEncoder backends.
+
+    python tests/benchmarks/bench_span_encoding.py [iterations]
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("INSTANA_TEST", "true")
+
+from instana.recorder import StanRecorder
+from instana.span import RegisteredSpan, SPAN_TYPES
+from instana.tracer import InstanaTracer
+from instana.util import to_json
+from instana.util.span_encoder import SpanBatchEncoder, orjson
+
+from bench_span_conversion import make_spans
+
+
+def main(iterations=100, rounds=5):
+    tracer = InstanaTracer(recorder=StanRecorder())
+    tracer.recorder = type("NullRecorder", (), {"record_span": lambda self, span: None})()
+
+    source = {"e": os.getpid(), "h": "bench"}
+    spans = []
+    for operation_name in sorted(SPAN_TYPES):
+        spans.extend(RegisteredSpan(span, source, None)
+                     for span in make_spans(tracer, operation_name, iterations))
+
+    encoders = [("to_json", to_json), ("json", SpanBatchEncoder(fast_backend=False).encode)]
+    if orjson is not None:
+        encoders.append(("orjson", SpanBatchEncoder().encode))
+
+    print("%d spans" % len(spans))
+    print("%-10s %12s %12s" % ("encoder", "usec/span", "bytes"))
+    for label, encode in encoders:
+        best = None
+        for _ in range(rounds):
+            start = time.perf_counter()
+            encoded = encode(spans)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print("%-10s %12.2f %12d" % (label, best / len(spans) * 1e6, len(encoded)))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
@@ -0,0 +1,54 @@
+# (c) Copyright IBM Corp. 2024
+
+"""
+Microbenchmark for the stack trace capture of exit spans, compared to the former
+traceback.extract_stack based implementation.  capture_frames is the part of the
+capture that runs on the application thread; formatting happens when spans are reported.
+
+    python tests/benchmarks/bench_stack_capture.py [iterations] [depth]
+"""
+import re
+import sys
+import time
+import traceback
+
+from instana.util.stack import capture_frames, capture_stack
+
+re_tracer_frame = re.compile(r"/instana/.*\.py$")
+re_with_stan_frame = re.compile('with_instana')
+
+
+def extract_stack_capture(limit=30):
+    sanitized_stack = []
+    trace_back = traceback.extract_stack()
+    trace_back.reverse()
+    for frame in trace_back:
+        if re_tracer_frame.search(frame[0]) is not None:
+            continue
+        if re_with_stan_frame.search(frame[2]) is not None:
+            continue
+        sanitized_stack.append({"c": frame[0], "n": frame[1], "m": frame[2]})
+    return sanitized_stack[(limit * -1):]
+
+
+def nested(depth, function):
+    if depth:
+        return nested(depth - 1, function)
+    return function()
+
+
+def main(iterations=20000, depth=50):
+    print("%-16s %12s" % ("implementation", "usec/capture"))
+    for label, capture in (("extract_stack", extract_stack_capture), ("capture_stack", capture_stack),
+                           ("capture_frames", capture_frames)):
+        def run():
+            start = time.perf_counter()
+            for _ in range(iterations):
+                capture(30)
+            return time.perf_counter() - start
+        elapsed = nested(depth, run)
+        print("%-16s %12.2f" % (label, elapsed / iterations * 1e6))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,48 @@
+# (c) Copyright IBM Corp. 2024
+
+"""
+Microbenchmark for the W3C trace context propagation of outbound calls: HTTPPropagator.inject
+for a context extracted from an incoming request with 0, 5 and 32 tracestate list members.
+"uncached" parses the incoming traceparent and tracestate again on every inject, as before
+they were cached on the SpanContext at extract time.
+
+    python tests/benchmarks/bench_w3c_propagation.py [iterations]
+"""
+import sys
+import time
+
+from instana.propagators.http_propagator import HTTPPropagator
+from instana.util.ids import generate_id
+
+TRACEPARENT = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+
+def incoming_headers(members):
+    headers = {"traceparent": TRACEPARENT}
+    if members:
+        headers["tracestate"] = ",".join(["vendor%d=value%d" % (i, i) for i in range(members - 1)] +
+                                         ["in=1234d0e0e4736234;1234567890abcdef"])
+    return headers
+
+
+def main(iterations=50000):
+    propagator = HTTPPropagator()
+    span_ids = [generate_id() for _ in range(iterations)]
+
+    print("%-10s %10s %14s" % ("members", "cache", "usec/inject"))
+    for members in (0, 5, 32):
+        extracted = propagator.extract(incoming_headers(members))
+        for cached in (False, True):
+            ctx = extracted.derive_child(extracted.span_id)
+            start = time.perf_counter()
+            for span_id in span_ids:
+                ctx.span_id = span_id
+                if not cached:
+                    ctx.w3c_upstream = None
+                propagator.inject(ctx, {})
+            elapsed = time.perf_counter() - start
+            print("%-10d %10s %14.2f" % (members, "cached" if cached else "uncached", elapsed / iterations * 1e6))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -288,3 +288,40 @@ class TestOTSpan(unittest.TestCase):
 
         log_data = my_log_span.data['sdk']['custom']['logs']
         self.assertEqual(len(log_data), 2)
+
+    def test_registered_span_json_has_no_nulls(self):
+        with tracer.start_active_span('wsgi') as scope:
+            scope.span.set_tag('http.method', 'GET')
+
+        spans = tracer.recorder.queued_spans()
+        self.assertEqual(len(spans), 1)
+
+        wsgi_span = spans[0]
+        self.assertFalse(hasattr(wsgi_span, '__dict__'))
+        # Unset values read as None without being materialized
+        self.assertIsNone(wsgi_span.data['http']['error'])
+        self.assertIsNone(wsgi_span.data['service'])
+        self.assertNotIn('service', wsgi_span.data)
+        self.assertNotIn('error', wsgi_span.data['http'])
+
+        span_dict = json.loads(to_json(wsgi_span))
+        self.assertEqual(span_dict['n'], 'wsgi')
+        self.assertEqual(span_dict['data'], {'http': {'method': 'GET'}})
+        self.assertNotIn('null', to_json(wsgi_span).decode())
+
+    def test_reading_unset_sections_creates_nothing(self):
+        with tracer.start_active_span('wsgi') as scope:
+            scope.span.set_tag('http.method', 'GET')
+        with tracer.start_active_span('rabbitmq'):
+            pass
+
+        wsgi_span, rabbitmq_span = tracer.recorder.queued_spans()
+
+        self.assertIsNone(wsgi_span.data['http']['header']['x-custom'])
+        self.assertEqual(wsgi_span.to_dict()['data'], {'http': {'method': 'GET'}})
+        self.assertNotIn('rabbitmq', rabbitmq_span.to_dict()['data'])
+
+        # Writing into a section read before attaches it
+        header = wsgi_span.data['http']['header']
+        header['x-custom'] = 'value'
+        self.assertEqual(wsgi_span.data['http']['header'], {'x-custom': 'value'})
@@ -2,19 +2,26 @@
 # (c) Copyright Instana Inc. 2020
 
 import os
+import gzip
+import json
+import time
 import logging
 import unittest
+import threading
 
 from mock import MagicMock, patch
 import requests
 
-from instana.agent.host import HostAgent
+from instana.agent.host import AnnounceData, HostAgent
+from instana.agent.report_lanes import ReportLane
+from instana.agent.span_uploader import SpanUploader
 from instana.fsm import Discovery
 from instana.log import logger
 from instana.options import StandardOptions
 from instana.recorder import StanRecorder
 from instana.singletons import get_agent, set_agent, get_tracer, set_tracer
 from instana.tracer import InstanaTracer
+from instana.util import DictionaryOfStan
 
 
 class TestHost(unittest.TestCase):
@@ -37,6 +44,7 @@ class TestHost(unittest.TestCase):
                 "INSTANA_ENDPOINT_URL", "INSTANA_ENDPOINT_PROXY",
                 "INSTANA_AGENT_KEY", "INSTANA_LOG_LEVEL",
                 "INSTANA_SERVICE_NAME", "INSTANA_SECRETS", "INSTANA_TAGS",
+                "INSTANA_AUTOPROFILE_ALL_THREADS", "INSTANA_AUTOPROFILE_ALLOCATION_SAMPLING",
                 )
 
         for variable_name in variable_names:
@@ -60,6 +68,20 @@ class TestHost(unittest.TestCase):
         self.assertTrue(hasattr(self.agent.options, 'secrets_list'))
         self.assertEqual(self.agent.options.secrets_list, ['key', 'pass', 'secret'])
 
+    def test_autoprofile_options(self):
+        options = StandardOptions()
+        self.assertFalse(options.autoprofile_all_threads)
+        self.assertFalse(options.autoprofile_allocation_sampling)
+
+        os.environ["INSTANA_AUTOPROFILE_ALL_THREADS"] = "True"
+        os.environ["INSTANA_AUTOPROFILE_ALLOCATION_SAMPLING"] = "1"
+        options = StandardOptions()
+        self.assertTrue(options.autoprofile_all_threads)
+        self.assertTrue(options.autoprofile_allocation_sampling)
+
+        os.environ["INSTANA_AUTOPROFILE_ALL_THREADS"] = "no"
+        self.assertFalse(StandardOptions().autoprofile_all_threads)
+
     def test_options_have_extra_http_headers(self):
         self.create_agent_and_setup_tracer()
         self.assertTrue(hasattr(self.agent, 'options'))
@@ -271,3 +293,196 @@ class TestHost(unittest.TestCase):
 
         self.assertFalse(result)
         self.assertIn(msg, log.output[0])
+
+
+class TestSpanUploader(unittest.TestCase):
+    def setUp(self):
+        self.agent = HostAgent()
+        self.url = "http://localhost:42699/com.instana.plugin.python/traces.4242"
+        self.spans = [{"n": "sdk", "s": str(i)} for i in range(5)]
+        backoff = patch.object(SpanUploader, "BACKOFF", 0)
+        backoff.start()
+        self.addCleanup(backoff.stop)
+
+    def tearDown(self):
+        os.environ.pop("INSTANA_SPAN_UPLOAD_GZIP", None)
+
+    def _response(self, status_code=200):
+        response = MagicMock()
+        response.status_code = status_code
+        return response
+
+    def _posted_spans(self, mock_post):
+        spans = []
+        for call in mock_post.call_args_list:
+            data = call.kwargs["data"]
+            if call.kwargs["headers"].get("Content-Encoding") == "gzip":
+                data = gzip.decompress(data)
+            spans.extend(json.loads(data))
+        return spans
+
+    def test_options(self):
+        self.assertEqual(1000, self.agent.options.span_upload_max_spans)
+        self.assertEqual(1048576, self.agent.options.span_upload_max_bytes)
+        self.assertFalse(self.agent.options.span_upload_gzip)
+        self.assertEqual(1, self.agent.options.span_upload_retries)
+
+        os.environ["INSTANA_SPAN_UPLOAD_GZIP"] = "true"
+        self.assertTrue(StandardOptions().span_upload_gzip)
+
+    @patch.object(requests.Session, "post")
+    def test_upload_in_chunks_of_max_spans(self, mock_post):
+        mock_post.return_value = self._response()
+        self.agent.options.span_upload_max_spans = 2
+
+        response = self.agent.span_uploader.upload(self.url, self.spans)
+
+        self.assertIs(mock_post.return_value, response)
+        self.assertEqual(3, mock_post.call_count)
+        self.assertEqual(self.spans, self._posted_spans(mock_post))
+        stats = self.agent.span_uploader.stats
+        self.assertEqual(3, stats.chunks)
+        self.assertEqual(5, stats.spans_sent)
+        self.assertEqual(stats.bytes_encoded, stats.bytes_sent)
+        self.assertEqual(0, stats.dropped_spans)
+
+    @patch.object(requests.Session, "post")
+    def test_upload_in_chunks_of_max_bytes(self, mock_post):
+        mock_post.return_value = self._response()
+        self.agent.options.span_upload_max_bytes = 60
+
+        self.agent.span_uploader.upload(self.url, self.spans)
+
+        self.assertGreater(mock_post.call_count, 1)
+        for call in mock_post.call_args_list:
+            self.assertLessEqual(len(call.kwargs["data"]), 60)
+        self.assertEqual(self.spans, self._posted_spans(mock_post))
+
+    @patch.object(requests.Session, "post")
+    def test_upload_gzip(self, mock_post):
+        mock_post.return_value = self._response()
+        self.agent.options.span_upload_gzip = True
+        spans = self.spans * 100
+
+        self.agent.span_uploader.upload(self.url, spans)
+
+        self.assertEqual(1, mock_post.call_count)
+        self.assertEqual("gzip", mock_post.call_args.kwargs["headers"]["Content-Encoding"])
+        self.assertEqual(spans, self._posted_spans(mock_post))
+        stats = self.agent.span_uploader.stats
+        self.assertGreater(stats.bytes_encoded, stats.bytes_sent)
+
+    @patch.object(requests.Session, "post")
+    def test_failed_chunk_is_retried_once(self, mock_post):
+        mock_post.side_effect = [requests.exceptions.ConnectionError(), self._response()]
+
+        response = self.agent.span_uploader.upload(self.url, self.spans)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(2, mock_post.call_count)
+        stats = self.agent.span_uploader.stats
+        self.assertEqual(1, stats.retries)
+        self.assertEqual(5, stats.spans_sent)
+        self.assertEqual(0, stats.dropped_spans)
+
+    @patch.object(requests.Session, "post")
+    def test_only_failed_chunks_are_dropped(self, mock_post):
+        mock_post.side_effect = [self._response(), self._response(500), self._response(503),
+                                 self._response(500), self._response(), self._response()]
+        self.agent.options.span_upload_max_spans = 2
+
+        response = self.agent.span_uploader.upload(self.url, self.spans * 2)
+
+        self.assertEqual(200, response.status_code)
+        # Chunk 2 fails with its retry, chunk 3 fails with the retry budget exhausted; the
+        # other chunks are still delivered
+        self.assertEqual(6, mock_post.call_count)
+        stats = self.agent.span_uploader.stats
+        self.assertEqual(3, stats.chunks)
+        self.assertEqual(6, stats.spans_sent)
+        self.assertEqual(4, stats.dropped_spans)
+        self.assertEqual(1, stats.retries)
+
+
+class TestReportLanes(unittest.TestCase):
+    def setUp(self):
+        self.agent = HostAgent()
+        self.agent.announce_data = AnnounceData(pid=4242, agentUuid="uuid")
+
+    def _payload(self, spans):
+        payload = DictionaryOfStan()
+        payload["spans"] = spans
+        payload["profiles"] = []
+        payload["metrics"]["plugins"] = [{"data": {"pid": 4242}}]
+        return payload
+
+    def test_lane_sends_in_order(self):
+        sent = []
+        lane = ReportLane("test", lambda session, payload: sent.append(payload))
+        for payload in range(2):
+            self.assertTrue(lane.submit(payload))
+            self.assertTrue(lane.flush(1))
+        self.assertEqual([0, 1], sent)
+        self.assertEqual("Instana test reporter", lane._thread.name)
+
+    def test_full_lane_drops_payloads(self):
+        release = threading.Event()
+        lane = ReportLane("test", lambda session, payload: release.wait(5), max_pending=1)
+        lane.submit("in flight")
+        # Wait for the lane thread to pick the first payload up
+        while lane.queue.qsize():
+            time.sleep(0.01)
+        self.assertTrue(lane.submit("pending"))
+        self.assertFalse(lane.submit("dropped"))
+        self.assertEqual(1, lane.dropped)
+        self.assertFalse(lane.flush(0.05))
+
+        release.set()
+        self.assertTrue(lane.flush(1))
+
+    @patch.object(requests.Session, "post")
+    def test_report_data_payload_uses_lanes(self, mock_post):
+        response = MagicMock()
+        response.status_code = 200
+        response.content = b''
+        mock_post.return_value = response
+
+        self.agent.report_data_payload(self._payload([{"n": "sdk"}]))
+        self.assertTrue(self.agent.flush_report_lanes(1))
+
+        urls = sorted(call.args[0] for call in mock_post.call_args_list)
+        self.assertEqual(2, len(urls))
+        self.assertTrue(urls[0].endswith("/com.instana.plugin.python.4242"))
+        self.assertTrue(urls[1].endswith("/com.instana.plugin.python/traces.4242"))
+        self.assertIsNotNone(self.agent.last_seen)
+
+    @patch.object(requests.Session, "post")
+    def test_slow_span_lane_does_not_delay_metrics(self, mock_post):
+        release = threading.Event()
+        response = MagicMock()
+        response.status_code = 200
+        response.content = b''
+
+        def post(url, **kwargs):
+            if "traces" in url:
+                release.wait(5)
+            return response
+        mock_post.side_effect = post
+
+        try:
+            for report in range(4):
+                self.agent.report_data_payload(self._payload([{"n": "sdk"}]))
+                self.assertTrue(self.agent.metric_lane.flush(1))
+                if report == 0:
+                    # Wait for the first span batch to be in flight
+                    while self.agent.span_lane.queue.qsize():
+                        time.sleep(0.01)
+
+            metric_posts = [call for call in mock_post.call_args_list if "traces" not in call.args[0]]
+            self.assertEqual(4, len(metric_posts))
+            # One batch in flight, two pending and the last one dropped
+            self.assertEqual(1, self.agent.span_lane.dropped)
+            self.assertEqual(1, self.agent.span_uploader.stats.dropped_spans)
+        finally:
+            release.set()
+        self.assertTrue(self.agent.flush_report_lanes(1))
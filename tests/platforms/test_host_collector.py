@@ -2,6 +2,7 @@
 # (c) Copyright Instana Inc. 2020
 
 import os
+import time
 import unittest
 import sys
 
@@ -12,7 +13,13 @@ from instana.recorder import StanRecorder
 from instana.agent.host import HostAgent
 from instana.collector.helpers.runtime import PATH_OF_AUTOTRACE_WEBHOOK_SITEDIR
 from instana.collector.host import HostCollector
-from instana.singletons import get_agent, set_agent, get_tracer, set_tracer
+from instana.collector.report_scheduler import AdaptiveReportScheduler
+from instana.collector.span_buffer import DeferredSpan, SpanBuffer
+from instana.collector.trace_buffer import TailSamplingBuffer
+from instana.util import sql
+from instana.util.sql import SanitizedStatementCache
+from instana.autoprofile.profiler import Profiler
+from instana.singletons import get_agent, set_agent, get_tracer, set_tracer, get_profiler, set_profiler
 from instana.version import VERSION
 
 class TestHostCollector(unittest.TestCase):
@@ -160,6 +167,128 @@ class TestHostCollector(unittest.TestCase):
         self.assertEqual('Manual', python_plugin['data']['snapshot']['m'])
         self.assertNotIn('metrics', python_plugin['data'])
 
+    def test_prepare_payload_reports_dropped_spans(self):
+        self.create_agent_and_setup_tracer()
+        self.agent.collector.span_queue = SpanBuffer(max_size=2)
+        for span in range(5):
+            self.agent.collector.span_queue.put(span)
+
+        payload = self.agent.collector.prepare_payload()
+        self.assertEqual(payload['spans'], [0, 1])
+
+        metrics = payload['metrics']['plugins'][0]['data']['metrics']
+        self.assertIn('tracer', metrics)
+        self.assertEqual(metrics['tracer']['dropped_spans'], 3)
+
+    def test_prepare_payload_reports_report_scheduler_metrics(self):
+        self.create_agent_and_setup_tracer()
+        scheduler = AdaptiveReportScheduler(1, max_interval=5)
+        self.agent.collector.report_scheduler = scheduler
+        scheduler.update(0, False)
+        scheduler.update(0, False)
+
+        payload = self.agent.collector.prepare_payload()
+        metrics = payload['metrics']['plugins'][0]['data']['metrics']
+        self.assertEqual(metrics['tracer']['span_flush_interval'], 4000)
+        self.assertEqual(metrics['tracer']['idle_backoffs'], 2)
+        self.assertEqual(metrics['tracer']['early_reports'], 0)
+
+    def test_prepare_payload_holds_spans_between_span_flushes(self):
+        self.create_agent_and_setup_tracer()
+        self.agent.collector.span_queue = SpanBuffer()
+        self.agent.collector.span_queue.put(1)
+
+        payload = self.agent.collector.prepare_payload(with_spans=False)
+        self.assertEqual(payload['spans'], [])
+        self.assertEqual(len(payload['metrics']['plugins']), 1)
+
+        payload = self.agent.collector.prepare_payload()
+        self.assertEqual(payload['spans'], [1])
+
+    def test_prepare_payload_reports_tail_sampling_metrics(self):
+        self.create_agent_and_setup_tracer()
+        tail_buffer = TailSamplingBuffer()
+        self.agent.collector.tail_buffer = tail_buffer
+        tail_buffer.kept = 2
+        tail_buffer.dropped = 5
+        tail_buffer.evicted = 1
+
+        payload = self.agent.collector.prepare_payload()
+        metrics = payload['metrics']['plugins'][0]['data']['metrics']
+        self.assertEqual(metrics['tracer']['tail_kept'], 2)
+        self.assertEqual(metrics['tracer']['tail_dropped'], 5)
+        self.assertEqual(metrics['tracer']['tail_evicted'], 1)
+        self.assertEqual(metrics['tracer']['tail_buffered_traces'], 0)
+
+    def test_expired_tail_sampled_traces_are_queued_on_report(self):
+        self.create_agent_and_setup_tracer()
+        collector = self.agent.collector
+        collector.span_queue = SpanBuffer()
+        collector.tail_buffer = TailSamplingBuffer(ttl=30)
+        # An errored span of a trace whose root never finishes
+        span = InstanaTracer(recorder=StanRecorder()).start_span("redis")
+        span.mark_as_errored()
+        span.local_root = False
+        collector.tail_buffer.add(span, DeferredSpan(lambda: "converted"))
+        self.assertEqual(1, collector.tail_buffer.buffered_traces())
+
+        collector.release_expired_traces()
+        self.assertEqual(1, collector.tail_buffer.buffered_traces())
+
+        with patch("instana.collector.base.time") as mock_time:
+            mock_time.time.return_value = time.time() + 31
+            collector.release_expired_traces()
+        self.assertEqual(0, collector.tail_buffer.buffered_traces())
+        self.assertEqual(["converted"], collector.queued_spans())
+
+    def test_prepare_payload_reports_sql_statement_cache_metrics(self):
+        self.create_agent_and_setup_tracer()
+        with patch.object(sql, "statement_cache", SanitizedStatementCache()), \
+                patch.object(sql, "normalized_statement_cache", SanitizedStatementCache()):
+            sql.statement_cache.hits = 2
+            sql.statement_cache.misses = 1
+            sql.normalized_statement_cache.hits = 1
+
+            payload = self.agent.collector.prepare_payload()
+            metrics = payload['metrics']['plugins'][0]['data']['metrics']
+            self.assertEqual(metrics['tracer']['sql_cache_hits'], 3)
+            self.assertEqual(metrics['tracer']['sql_cache_misses'], 1)
+            self.assertEqual(metrics['tracer']['sql_cache_hit_ratio'], 0.75)
+
+    def test_prepare_payload_reports_span_upload_metrics(self):
+        self.create_agent_and_setup_tracer()
+        stats = self.agent.span_uploader.stats
+        stats.bytes_encoded = 3000
+        stats.bytes_sent = 1000
+        stats.dropped_spans = 4
+
+        payload = self.agent.collector.prepare_payload()
+        metrics = payload['metrics']['plugins'][0]['data']['metrics']
+        self.assertEqual(metrics['tracer']['span_bytes_sent'], 1000)
+        self.assertEqual(metrics['tracer']['span_compression_ratio'], 3.0)
+        self.assertEqual(metrics['tracer']['span_upload_dropped'], 4)
+
+        # Counters are reported as the difference since the last collection
+        stats.bytes_encoded = 3500
+        stats.bytes_sent = 1500
+        payload = self.agent.collector.prepare_payload()
+        metrics = payload['metrics']['plugins'][0]['data']['metrics']
+        self.assertEqual(metrics['tracer']['span_bytes_sent'], 500)
+        self.assertEqual(metrics['tracer']['span_compression_ratio'], 1.0)
+        self.assertEqual(metrics['tracer']['span_upload_dropped'], 0)
+
+    def test_prepare_payload_reports_profiler_dropped_samples(self):
+        self.create_agent_and_setup_tracer()
+        profiler = Profiler(self.agent)
+        self.addCleanup(set_profiler, get_profiler())
+        set_profiler(profiler)
+        profiler.cpu_sampler_scheduler.sampler.dropped_samples = 3
+        profiler.block_sampler_scheduler.sampler.dropped_samples = 4
+
+        payload = self.agent.collector.prepare_payload()
+        metrics = payload['metrics']['plugins'][0]['data']['metrics']
+        self.assertEqual(metrics['tracer']['profiler_dropped_samples'], 7)
+
     @patch.object(HostCollector, "should_send_snapshot_data")
     def test_prepare_payload_with_snapshot_with_python_packages(self, mock_should_send_snapshot_data):
         mock_should_send_snapshot_data.return_value = True
@@ -362,3 +362,75 @@ class TestHTTPPropagatorTC(unittest.TestCase):
         # Assert that the tracestate is propagated
         self.assertIn('tracestate', downstream_carrier)
         self.assertEqual(carrier['tracestate'], downstream_carrier['tracestate'])
+
+    def test_extract_asgi_scope_headers(self):
+        carrier = [(b'host', b'localhost'), (b'user-agent', b'python-requests/2.23.0'),
+                   (b'x-instana-t', b'1234d0e0e4736234'),
+                   (b'x-instana-s', b'1234567890abcdef'),
+                   (b'x-instana-l', b'1'),
+                   (b'x-instana-synthetic', b'1')]
+        ctx = self.hptc.extract(carrier)
+        self.assertEqual(ctx.trace_id, "1234d0e0e4736234")
+        self.assertEqual(ctx.span_id, "1234567890abcdef")
+        self.assertEqual(ctx.level, 1)
+        self.assertTrue(ctx.synthetic)
+
+    def test_extract_wsgi_environ_headers(self):
+        carrier = {
+            'REQUEST_METHOD': 'GET',
+            'HTTP_X_INSTANA_T': '1234d0e0e4736234',
+            'HTTP_X_INSTANA_S': '1234567890abcdef',
+            'HTTP_X_INSTANA_L': '1',
+            'HTTP_TRACEPARENT': '00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01',
+        }
+        ctx = self.hptc.extract(carrier)
+        self.assertEqual(ctx.trace_id, "1234d0e0e4736234")
+        self.assertEqual(ctx.span_id, "1234567890abcdef")
+        self.assertEqual(ctx.traceparent, '00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01')
+
+    def test_extract_standard_header_has_precedence(self):
+        carrier = [('HTTP_X_INSTANA_T', 'aaaaaaaaaaaaaaaa'), ('X-Instana-T', '1234d0e0e4736234'),
+                   ('X-Instana-S', ''), ('HTTP_X_INSTANA_S', '1234567890abcdef')]
+        ctx = self.hptc.extract(carrier)
+        self.assertEqual(ctx.trace_id, "1234d0e0e4736234")
+        self.assertEqual(ctx.span_id, "1234567890abcdef")
+
+    def test_extract_unsupported_carrier(self):
+        self.assertIsNone(self.hptc.extract(42))
+        self.assertIsNone(self.hptc.extract([('x-instana-t',)]))
+
+    def test_parse_level(self):
+        self.assertEqual((1, None, None), self.hptc._parse_level(None))
+        self.assertEqual((0, None, None), self.hptc._parse_level('0'))
+        self.assertEqual((1, "web", "1234"), self.hptc._parse_level('1,correlationType=web;correlationId=1234'))
+        self.assertEqual((1, "web", "1234"), self.hptc._parse_level('1, correlationType=web; correlationId=1234'))
+        self.assertEqual((1, "mobile", None), self.hptc._parse_level('1,correlationType=mobile'))
+        self.assertEqual((1, None, None), self.hptc._parse_level('1,correlationTypeweb;correlationId=1234'))
+        self.assertEqual((1, None, None), self.hptc._parse_level('x'))
+        self.assertEqual((1, None, None), self.hptc._parse_level(['1']))
+
+    def test_inject_uses_cached_upstream_trace_context(self):
+        carrier = {
+            'traceparent': '00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01',
+            'tracestate': 'congo=t61rcWkgMzE,in=1111111111111111;2222222222222222,rojo=00f067aa0ba902b7',
+        }
+        ctx = self.hptc.extract(carrier)
+        self.assertEqual(ctx.w3c_upstream, (carrier['traceparent'], carrier['tracestate'],
+                                            '4bf92f3577b34da6a3ce929d0e0e4736',
+                                            'congo=t61rcWkgMzE,rojo=00f067aa0ba902b7'))
+
+        for span_id in ('1234567890abcdef', 'fedcba0987654321'):
+            ctx.span_id = span_id
+            downstream_carrier = {}
+            self.hptc.inject(ctx, downstream_carrier)
+            self.assertEqual('00-4bf92f3577b34da6a3ce929d0e0e4736-' + span_id + '-01',
+                             downstream_carrier['traceparent'])
+            self.assertEqual('in=' + ctx.trace_id + ';' + span_id + ',congo=t61rcWkgMzE,rojo=00f067aa0ba902b7',
+                             downstream_carrier['tracestate'])
+
+        # A tracestate changed after the extraction is parsed again
+        ctx.tracestate = 'rojo=00f067aa0ba902b7'
+        downstream_carrier = {}
+        self.hptc.inject(ctx, downstream_carrier)
+        self.assertEqual('in=' + ctx.trace_id + ';fedcba0987654321,rojo=00f067aa0ba902b7',
+                         downstream_carrier['tracestate'])
@@ -0,0 +1,82 @@
+# (c) Copyright IBM Corp. 2024
+
+import time
+import threading
+from unittest import TestCase
+
+from instana.collector.report_scheduler import AdaptiveReportScheduler
+from instana.collector.span_buffer import SpanBuffer
+
+
+class TestAdaptiveReportScheduler(TestCase):
+    def test_backs_off_when_idle(self):
+        scheduler = AdaptiveReportScheduler(1, max_interval=5)
+        intervals = []
+        for _ in range(4):
+            scheduler.update(0, False)
+            intervals.append(scheduler.current_interval)
+
+        self.assertEqual(intervals, [2, 4, 5, 5])
+        self.assertEqual(scheduler.idle_backoffs, 3)
+
+        # Back to the regular interval as soon as there are spans
+        scheduler.update(10, False)
+        self.assertEqual(scheduler.current_interval, 1)
+
+    def test_no_back_off_without_max_interval(self):
+        scheduler = AdaptiveReportScheduler(1)
+        scheduler.update(0, False)
+        self.assertEqual(scheduler.current_interval, 1)
+        self.assertEqual(scheduler.idle_backoffs, 0)
+
+    def test_early_report_on_span_buffer_threshold(self):
+        scheduler = AdaptiveReportScheduler(5, max_interval=10, min_interval=0)
+        scheduler.update(0, False)
+        self.assertEqual(scheduler.current_interval, 10)
+
+        span_buffer = SpanBuffer()
+        span_buffer.set_flush_threshold(3, scheduler.flush_event)
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(scheduler.wait()))
+        start = time.time()
+        waiter.start()
+        for span in range(3):
+            span_buffer.put(span)
+        waiter.join(2)
+
+        self.assertLess(time.time() - start, 2)
+        self.assertEqual(results, [True])
+        self.assertFalse(scheduler.flush_event.is_set())
+
+        scheduler.update(3, True)
+        self.assertEqual(scheduler.early_reports, 1)
+        self.assertEqual(scheduler.current_interval, 5)
+
+    def test_early_reports_are_spaced(self):
+        scheduler = AdaptiveReportScheduler(1, min_interval=0.2)
+        scheduler.update(1, False)
+        scheduler.wake()
+        start = time.time()
+        self.assertTrue(scheduler.wait())
+        self.assertGreaterEqual(time.time() - start, 0.15)
+
+    def test_regular_interval(self):
+        scheduler = AdaptiveReportScheduler(0.05)
+        start = time.time()
+        self.assertFalse(scheduler.wait())
+        self.assertGreaterEqual(time.time() - start, 0.05)
+
+    def test_reports_keep_the_regular_interval_while_spans_back_off(self):
+        scheduler = AdaptiveReportScheduler(0.05, max_interval=0.2)
+        scheduler.update(0, False)
+        self.assertEqual(scheduler.current_interval, 0.1)
+
+        start = time.time()
+        due = []
+        for _ in range(2):
+            self.assertFalse(scheduler.wait())
+            due.append(scheduler.spans_due())
+
+        # Reports are due every 0.05s, the spans only with every second one
+        self.assertLess(time.time() - start, 0.15)
+        self.assertEqual(due, [False, True])
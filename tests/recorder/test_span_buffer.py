@@ -0,0 +1,71 @@
+# (c) Copyright IBM Corp. 2024
+
+import queue
+import threading
+from unittest import TestCase
+
+from instana.collector.span_buffer import SpanBuffer, drain_span_queue
+
+
+class TestSpanBuffer(TestCase):
+    def test_put_and_drain(self):
+        span_buffer = SpanBuffer()
+        self.assertTrue(span_buffer.empty())
+
+        for i in range(5):
+            self.assertTrue(span_buffer.put(i))
+
+        self.assertFalse(span_buffer.empty())
+        self.assertEqual(span_buffer.qsize(), 5)
+        self.assertEqual(span_buffer.drain(), [0, 1, 2, 3, 4])
+        self.assertTrue(span_buffer.empty())
+        self.assertEqual(span_buffer.drain(), [])
+
+    def test_bounded_capacity_counts_drops(self):
+        span_buffer = SpanBuffer(max_size=3)
+        results = [span_buffer.put(i) for i in range(5)]
+
+        self.assertEqual(results, [True, True, True, False, False])
+        self.assertEqual(span_buffer.dropped, 2)
+        self.assertEqual(span_buffer.drain(), [0, 1, 2])
+
+        # Capacity is available again after a drain
+        self.assertTrue(span_buffer.put(5))
+        self.assertEqual(span_buffer.drain(), [5])
+
+    def test_queue_compatibility(self):
+        span_buffer = SpanBuffer()
+        span_buffer.put("a")
+        span_buffer.put("b")
+
+        self.assertEqual(span_buffer.get(False), "a")
+        self.assertEqual(span_buffer.get_nowait(), "b")
+        self.assertRaises(queue.Empty, span_buffer.get, False)
+
+    def test_multiple_threads(self):
+        span_buffer = SpanBuffer()
+
+        def record(count):
+            for i in range(count):
+                span_buffer.put(i)
+
+        threads = [threading.Thread(target=record, args=(100,)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(span_buffer.qsize(), 400)
+        self.assertEqual(len(span_buffer.drain()), 400)
+
+        # The buffers of the finished threads are released on drain
+        span_buffer.drain()
+        self.assertEqual(len(span_buffer._buffers), 0)
+
+    def test_drain_span_queue_with_queue(self):
+        span_queue = queue.Queue()
+        span_queue.put(1)
+        span_queue.put(2)
+
+        self.assertEqual(drain_span_queue(span_queue), [1, 2])
+        self.assertTrue(span_queue.empty())
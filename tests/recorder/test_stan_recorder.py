@@ -1,4 +1,9 @@
+from instana.agent.test import TestAgent
+from instana.collector.span_buffer import DeferredSpan, SpanBuffer
+from instana.collector.trace_buffer import TailSamplingBuffer
 from instana.recorder import StanRecorder
+from instana.span import ENTRY, EXIT, RegisteredSpan, SDKSpan, SPAN_TYPES, register_span_type
+from instana.tracer import InstanaTracer
 
 from multiprocessing import Queue
 from unittest import TestCase
@@ -28,3 +33,119 @@ class TestStanRecorderTC(TestCase):
         # Make sure that the success so far has indeed resulted after a getitem
         # call to the 'suppression' property of the mock span context
         self.mock_suppressed_property.assert_called_once_with()
+
+
+class TestStanRecorderDeferredConversion(TestCase):
+    def setUp(self):
+        self.agent = TestAgent()
+        self.agent.collector.span_queue = SpanBuffer()
+        self.agent.collector.defer_span_conversion = True
+        self.recorder = StanRecorder(agent=self.agent)
+        self.tracer = InstanaTracer(recorder=self.recorder)
+
+    def tearDown(self):
+        self.agent.collector.shutdown(report_final=False)
+
+    def test_record_span_defers_conversion(self):
+        with self.tracer.start_active_span("redis") as scope:
+            scope.span.set_tag("command", "GET")
+        with self.tracer.start_active_span("custom-sdk-span"):
+            pass
+
+        queued = self.agent.collector.span_queue.drain()
+        self.assertEqual(len(queued), 2)
+        for item in queued:
+            self.assertIsInstance(item, DeferredSpan)
+        for item in queued:
+            self.agent.collector.span_queue.put(item)
+
+        spans = self.agent.collector.queued_spans()
+        self.assertEqual(len(spans), 2)
+        self.assertIsInstance(spans[0], RegisteredSpan)
+        self.assertEqual(spans[0].data["redis"]["command"], "GET")
+        self.assertIsInstance(spans[1], SDKSpan)
+        self.assertEqual(spans[1].data["sdk"]["name"], "custom-sdk-span")
+
+    def test_deferred_conversion_with_worker_pool(self):
+        self.agent.collector.span_conversion_workers = 2
+        for _ in range(1200):
+            with self.tracer.start_active_span("redis"):
+                pass
+
+        spans = self.agent.collector.queued_spans()
+        self.assertEqual(len(spans), 1200)
+        self.assertTrue(all(isinstance(span, RegisteredSpan) for span in spans))
+        self.assertIsNotNone(self.agent.collector.span_conversion_executor)
+
+
+class TestStanRecorderTailSampling(TestCase):
+    def setUp(self):
+        self.agent = TestAgent()
+        self.agent.collector.span_queue = SpanBuffer()
+        self.agent.collector.tail_buffer = TailSamplingBuffer(latency_threshold=10)
+        self.recorder = StanRecorder(agent=self.agent)
+        self.tracer = InstanaTracer(recorder=self.recorder)
+
+    def tearDown(self):
+        self.agent.collector.shutdown(report_final=False)
+
+    def test_only_interesting_traces_are_queued(self):
+        with self.tracer.start_active_span("wsgi"):
+            with self.tracer.start_active_span("redis"):
+                pass
+        self.assertTrue(self.agent.collector.span_queue.empty())
+
+        with self.tracer.start_active_span("wsgi"):
+            with self.tracer.start_active_span("redis") as scope:
+                scope.span.mark_as_errored()
+                # Held back until the local root finishes
+                pass
+            self.assertTrue(self.agent.collector.span_queue.empty())
+
+        spans = self.agent.collector.queued_spans()
+        self.assertEqual(["redis", "wsgi"], [span.n for span in spans])
+        self.assertTrue(all(isinstance(span, RegisteredSpan) for span in spans))
+        self.assertEqual(1, spans[0].ec)
+
+
+class TestRegisteredSpanTypes(TestCase):
+    def setUp(self):
+        self.agent = TestAgent()
+        self.recorder = StanRecorder(agent=self.agent)
+        self.tracer = InstanaTracer(recorder=self.recorder)
+        self.recorder.clear_spans()
+
+    def tearDown(self):
+        SPAN_TYPES.pop("acme-db", None)
+
+    def test_register_third_party_span_type(self):
+        register_span_type("acme-db", EXIT, (
+            ("acme.query", "acme.query"),
+            ("acme.host", ("acme", "connection", "host"), "unknown"),
+            (None, "acme.driver", "acme-python"),
+        ))
+
+        with self.tracer.start_active_span("acme-db") as scope:
+            scope.span.set_tag("acme.query", "GET x")
+            scope.span.set_tag("leftover", 1)
+            self.assertIsNotNone(scope.span.stack)
+
+        spans = self.recorder.queued_spans()
+        self.assertEqual(len(spans), 1)
+        span = spans[0]
+        self.assertIsInstance(span, RegisteredSpan)
+        self.assertEqual(span.n, "acme-db")
+        self.assertEqual(span.k, EXIT)
+        self.assertEqual(span.data["acme"]["query"], "GET x")
+        self.assertEqual(span.data["acme"]["connection"]["host"], "unknown")
+        self.assertEqual(span.data["acme"]["driver"], "acme-python")
+        self.assertEqual(span.data["custom"]["tags"], {"leftover": 1})
+
+    def test_rabbitmq_publish_is_exit(self):
+        with self.tracer.start_active_span("rabbitmq") as scope:
+            scope.span.set_tag("sort", "publish")
+        with self.tracer.start_active_span("rabbitmq") as scope:
+            scope.span.set_tag("sort", "consume")
+
+        spans = self.recorder.queued_spans()
+        self.assertEqual([span.k for span in spans], [EXIT, ENTRY])
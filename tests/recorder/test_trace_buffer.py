@@ -0,0 +1,134 @@
+# (c) Copyright IBM Corp. 2024
+
+import time
+from unittest import TestCase
+
+import opentracing as ot
+
+from instana.collector.trace_buffer import TailSamplingBuffer
+from instana.recorder import StanRecorder
+from instana.tracer import InstanaTracer
+
+
+class TestTailSamplingBuffer(TestCase):
+    def setUp(self):
+        self.tracer = InstanaTracer(recorder=StanRecorder())
+        self.finished = []
+        self.tracer.recorder = type("ListRecorder", (), {"record_span": lambda _, span: self.finished.append(span)})()
+
+    def _trace(self, operation_name="wsgi", errored=False, tags=None, children=2):
+        with self.tracer.start_active_span(operation_name, tags=tags) as root:
+            for _ in range(children):
+                with self.tracer.start_active_span("redis") as child:
+                    if errored:
+                        child.span.mark_as_errored()
+        spans, self.finished = self.finished, []
+        return root.span, spans
+
+    def _add_all(self, tail_buffer, spans):
+        released = []
+        for span in spans:
+            released.extend(tail_buffer.add(span, span.context.span_id))
+        return released
+
+    def test_uninteresting_trace_is_dropped(self):
+        tail_buffer = TailSamplingBuffer(latency_threshold=10)
+        _, spans = self._trace()
+        self.assertEqual([], self._add_all(tail_buffer, spans))
+        self.assertEqual(0, tail_buffer.buffered_traces())
+        self.assertEqual(0, tail_buffer.span_count)
+        self.assertEqual((1, 2, 0, 1), (tail_buffer.misses, tail_buffer.hits, tail_buffer.kept, tail_buffer.dropped))
+
+    def test_errored_trace_is_kept(self):
+        tail_buffer = TailSamplingBuffer(latency_threshold=10)
+        root, spans = self._trace(errored=True)
+        # The children are held back until the root finishes
+        self.assertEqual([], tail_buffer.add(spans[0], "first"))
+        self.assertEqual(1, tail_buffer.buffered_traces())
+        released = tail_buffer.add(spans[1], "second") + tail_buffer.add(spans[2], "root")
+        self.assertTrue(root.local_root)
+        self.assertEqual(["first", "second", "root"], released)
+        self.assertEqual(1, tail_buffer.kept)
+
+    def test_slow_trace_is_kept(self):
+        tail_buffer = TailSamplingBuffer(latency_threshold=0.05)
+        with self.tracer.start_active_span("wsgi"):
+            time.sleep(0.06)
+        self.assertEqual(1, len(self._add_all(tail_buffer, self.finished)))
+
+    def test_endpoint_traces_are_kept(self):
+        tail_buffer = TailSamplingBuffer(latency_threshold=10, endpoints=["/checkout", "celery-worker"])
+        _, spans = self._trace(tags={"http.path": "/checkout"})
+        self.assertEqual(3, len(self._add_all(tail_buffer, spans)))
+        _, spans = self._trace("celery-worker")
+        self.assertEqual(3, len(self._add_all(tail_buffer, spans)))
+        _, spans = self._trace(tags={"http.path": "/other"})
+        self.assertEqual(0, len(self._add_all(tail_buffer, spans)))
+
+    def test_extracted_parent_is_local_root(self):
+        ctx = self.tracer.extract(ot.Format.HTTP_HEADERS, {"X-INSTANA-T": "1234", "X-INSTANA-S": "5678"})
+        with self.tracer.start_active_span("wsgi", child_of=ctx) as root:
+            with self.tracer.start_active_span("redis") as child:
+                pass
+        self.assertTrue(root.span.local_root)
+        self.assertFalse(child.span.local_root)
+
+    def test_local_parent_context_is_not_local_root(self):
+        with self.tracer.start_active_span("wsgi") as root:
+            with self.tracer.start_active_span("redis", child_of=root.span.context) as nested:
+                pass
+            root.span.mark_as_errored()
+        self.assertTrue(root.span.local_root)
+        self.assertFalse(nested.span.local_root)
+
+        # The nested span finishes first but only the root decides on the trace
+        tail_buffer = TailSamplingBuffer(latency_threshold=10)
+        self.assertEqual(2, len(self._add_all(tail_buffer, self.finished)))
+        self.assertEqual((1, 0), (tail_buffer.kept, tail_buffer.dropped))
+
+    def test_stragglers_follow_the_decision(self):
+        tail_buffer = TailSamplingBuffer(latency_threshold=10)
+        root, spans = self._trace(errored=True, children=1)
+        self.assertEqual(2, len(self._add_all(tail_buffer, spans)))
+        # A span finishing after its root, e.g. from a background task
+        with self.tracer.start_active_span("redis", child_of=root) as late:
+            pass
+        self.assertEqual(["late"], tail_buffer.add(late.span, "late"))
+
+    def test_limits_evict_least_recently_updated_traces(self):
+        tail_buffer = TailSamplingBuffer(latency_threshold=10, max_traces=2, max_spans=3)
+        traces = [self._trace(errored=(i == 0)) for i in range(3)]
+
+        # Only the children (not the roots) are added: traces stay buffered
+        released = []
+        for _, spans in traces:
+            released.extend(self._add_all(tail_buffer, spans[:-1]))
+
+        self.assertLessEqual(tail_buffer.span_count, 3)
+        self.assertLessEqual(tail_buffer.buffered_traces(), 2)
+        self.assertEqual(2, tail_buffer.evicted)
+        # The errored trace was evicted first and reported, the other one dropped
+        self.assertEqual(2, len(released))
+
+    def test_ttl_expires_traces(self):
+        tail_buffer = TailSamplingBuffer(latency_threshold=10, ttl=0.05)
+        _, first = self._trace()
+        _, second = self._trace()
+        tail_buffer.add(first[0], "first")
+        time.sleep(0.06)
+        tail_buffer.add(second[0], "second")
+        self.assertEqual(1, tail_buffer.expired)
+        self.assertEqual(1, tail_buffer.buffered_traces())
+
+    def test_expire_without_further_spans(self):
+        tail_buffer = TailSamplingBuffer(latency_threshold=10, ttl=30)
+        _, spans = self._trace(errored=True)
+        # The root never finishes
+        self._add_all(tail_buffer, spans[:-1])
+        self.assertEqual([], tail_buffer.expire(time.time()))
+        self.assertEqual(1, tail_buffer.buffered_traces())
+
+        self.assertEqual(2, len(tail_buffer.expire(time.time() + 31)))
+        self.assertEqual(1, tail_buffer.expired)
+        self.assertEqual(0, tail_buffer.buffered_traces())
+        self.assertEqual(0, tail_buffer.span_count)
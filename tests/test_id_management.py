@@ -1,6 +1,7 @@
 # (c) Copyright IBM Corp. 2021
 # (c) Copyright Instana Inc. 2017
 
+import threading
 import unittest
 import instana
 
@@ -15,6 +16,39 @@ class TestIdManagement(unittest.TestCase):
             self.assertLessEqual(base10_id, 18446744073709551615)
             count += 1
 
+    def test_id_generation_fixed_width(self):
+        ids = set(instana.util.ids.generate_id() for _ in range(1000))
+        self.assertEqual(1000, len(ids))
+        for id in ids:
+            self.assertEqual(16, len(id))
+            int(id, 16)
+
+    def test_id_generation_per_thread(self):
+        ids = []
+
+        def generate():
+            ids.extend(instana.util.ids.generate_id() for _ in range(500))
+
+        threads = [threading.Thread(target=generate) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(2000, len(set(ids)))
+
+    def test_id_generation_after_fork(self):
+        instana.util.ids.generate_id()
+        parent_state = instana.util.ids._state
+        buffered = list(parent_state.hex_ids)
+        instana.util.ids._reset_after_fork()
+        self.assertIsNot(parent_state, instana.util.ids._state)
+        self.assertNotIn(instana.util.ids.generate_id(), buffered)
+
+    def test_int_id_generation(self):
+        int_id = instana.util.ids.generate_int_id()
+        self.assertTrue(0 <= int_id <= 18446744073709551615)
+        self.assertEqual('00000000000000ff', instana.util.ids.format_id(255))
+        self.assertEqual(int_id, int(instana.util.ids.format_id(int_id), 16))
 
     def test_various_header_to_id_conversion(self):
         # Get a hex string to test against & convert
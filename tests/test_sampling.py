@@ -0,0 +1,130 @@
+# (c) Copyright IBM Corp. 2024
+
+import os
+import unittest
+
+import opentracing as ot
+
+from instana.options import StandardOptions
+from instana.recorder import StanRecorder
+from instana.sampling import InstanaSampler, parse_sampling_overrides
+from instana.tracer import InstanaTracer
+from instana.util.ids import generate_id
+
+
+class TestInstanaSampler(unittest.TestCase):
+    def tearDown(self):
+        for name in ("INSTANA_SAMPLING_RATE", "INSTANA_SAMPLING_MAX_TRACES_PER_SECOND", "INSTANA_SAMPLING_OVERRIDES"):
+            os.environ.pop(name, None)
+
+    def test_default_samples_everything(self):
+        sampler = InstanaSampler.from_options(StandardOptions())
+        self.assertFalse(sampler.enabled)
+        self.assertTrue(sampler.should_sample(generate_id(), "wsgi"))
+
+    def test_options(self):
+        os.environ["INSTANA_SAMPLING_RATE"] = "0.25"
+        os.environ["INSTANA_SAMPLING_MAX_TRACES_PER_SECOND"] = "100"
+        os.environ["INSTANA_SAMPLING_OVERRIDES"] = "wsgi=0.5;/health=0"
+        sampler = InstanaSampler.from_options(StandardOptions())
+        self.assertTrue(sampler.enabled)
+        self.assertEqual(0.25, sampler.rate)
+        self.assertEqual(100, sampler.rate_limiter.rate)
+        self.assertEqual({"wsgi": 0.5, "/health": 0.0}, sampler.overrides)
+
+    def test_parse_sampling_overrides(self):
+        self.assertEqual({}, parse_sampling_overrides(None))
+        self.assertEqual({"wsgi": 1.0, "/ping": 0.1}, parse_sampling_overrides("wsgi=2; /ping=0.1;/bad=x"))
+
+    def test_sampling_rate(self):
+        self.assertFalse(InstanaSampler(rate=0).should_sample(generate_id()))
+
+        sampler = InstanaSampler(rate=0.5)
+        sampled = sum(sampler.should_sample(generate_id()) for _ in range(10000))
+        self.assertTrue(4500 < sampled < 5500, sampled)
+        self.assertEqual(10000 - sampled, sampler.sampled_out)
+
+        # The decision only depends on the trace id
+        trace_id = generate_id()
+        self.assertEqual(len(set(sampler.should_sample(trace_id) for _ in range(10))), 1)
+
+    def test_rate_limit(self):
+        sampler = InstanaSampler(max_traces_per_second=5)
+        sampled = sum(sampler.should_sample(generate_id()) for _ in range(100))
+        self.assertEqual(5, sampled)
+        self.assertEqual(95, sampler.rate_limited)
+
+    def test_overrides(self):
+        sampler = InstanaSampler(rate=1.0, overrides={"/health": 0.0, "rabbitmq": 0.0})
+        self.assertFalse(sampler.should_sample(generate_id(), "wsgi", {"http.path": "/health"}))
+        self.assertFalse(sampler.should_sample(generate_id(), "rabbitmq"))
+        self.assertTrue(sampler.should_sample(generate_id(), "wsgi", {"http.path": "/orders"}))
+        self.assertTrue(sampler.should_sample(generate_id(), "wsgi"))
+
+    def test_service_overrides(self):
+        os.environ["INSTANA_SAMPLING_OVERRIDES"] = "service:checkout=0;/orders=1"
+        options = StandardOptions()
+        options.service_name = "checkout"
+        sampler = InstanaSampler.from_options(options)
+        self.assertFalse(sampler.should_sample(generate_id(), "wsgi"))
+        # More specific overrides take precedence
+        self.assertTrue(sampler.should_sample(generate_id(), "wsgi", {"http.path": "/orders"}))
+
+        # The service tag of the root span selects the rate of that service
+        sampler.service_name = "frontend"
+        self.assertTrue(sampler.should_sample(generate_id(), "wsgi"))
+        self.assertFalse(sampler.should_sample(generate_id(), "sdk", {"service": "checkout"}))
+
+
+class TestTracerSampling(unittest.TestCase):
+    def setUp(self):
+        self.recorder = StanRecorder()
+        self.tracer = InstanaTracer(recorder=self.recorder)
+        self.recorder.clear_spans()
+
+    def tearDown(self):
+        self.recorder.clear_spans()
+
+    def test_unsampled_trace_is_suppressed(self):
+        self.tracer.sampler = InstanaSampler(rate=0)
+
+        with self.tracer.start_active_span("rabbitmq") as root:
+            root.span.set_tag("exchange", "orders")
+            with self.tracer.start_active_span("urllib3") as child:
+                headers = {}
+                self.tracer.inject(child.span.context, ot.Format.HTTP_HEADERS, headers)
+
+        self.assertEqual(0, root.span.context.level)
+        self.assertFalse(root.span.context.sampled)
+        self.assertEqual(0, child.span.context.level)
+        # No tag collection or stack capture for unsampled traces
+        self.assertEqual({}, root.span.tags)
+        self.assertIsNone(root.span.stack)
+
+        self.assertEqual("0", headers["X-INSTANA-L"])
+        self.assertNotIn("X-INSTANA-T", headers)
+        self.assertTrue(headers["traceparent"].endswith("-00"))
+        self.assertEqual([], self.recorder.queued_spans())
+
+    def test_sampled_trace(self):
+        self.tracer.sampler = InstanaSampler(overrides={"/health": 0.0})
+
+        with self.tracer.start_active_span("wsgi", tags={"http.path": "/orders"}) as root:
+            headers = {}
+            self.tracer.inject(root.span.context, ot.Format.HTTP_HEADERS, headers)
+
+        self.assertEqual(1, root.span.context.level)
+        self.assertTrue(root.span.context.sampled)
+        self.assertEqual("1", headers["X-INSTANA-L"])
+        self.assertTrue(headers["traceparent"].endswith("-01"))
+        self.assertEqual(1, len(self.recorder.queued_spans()))
+
+    def test_upstream_context_is_not_resampled(self):
+        self.tracer.sampler = InstanaSampler(rate=0)
+        parent_ctx = self.tracer.extract(ot.Format.HTTP_HEADERS, {"X-INSTANA-T": "1234", "X-INSTANA-S": "5678"})
+
+        with self.tracer.start_active_span("wsgi", child_of=parent_ctx) as scope:
+            pass
+
+        self.assertEqual(1, scope.span.context.level)
+        self.assertEqual(1, len(self.recorder.queued_spans()))
@@ -3,7 +3,7 @@
 
 import unittest
 
-from instana.util.secrets import strip_secrets_from_query
+from instana.util.secrets import SecretsMatcher, get_secrets_matcher, strip_secrets_from_query
 
 
 class TestSecrets(unittest.TestCase):
@@ -152,3 +152,45 @@ class TestSecrets(unittest.TestCase):
         stripped = strip_secrets_from_query(query_params, matcher, kwlist)
 
         self.assertEqual(stripped, "one=1&Two=two&THREE=&4='+'&five='okyeah'")
+
+    def test_no_match_returns_query_untouched(self):
+        query_params = "one=1&two=a%2Bb&three=a+b"
+
+        stripped = strip_secrets_from_query(query_params, 'contains-ignore-case', ['secret'])
+
+        self.assertEqual(stripped, query_params)
+
+    def test_percent_encoded_key(self):
+        query_params = "one=1&my%5Fsecret=two"
+
+        stripped = strip_secrets_from_query(query_params, 'contains-ignore-case', ['secret'])
+
+        self.assertEqual(stripped, "one=1&my_secret=<redacted>")
+
+    def test_regex_inline_flags(self):
+        query_params = "one=1&Two=two&THREE=&4='+'&five='okyeah'"
+
+        stripped = strip_secrets_from_query(query_params, 'regex', ["(?i)two", r"\d"])
+
+        self.assertEqual(stripped, "one=1&Two=<redacted>&THREE=&4=<redacted>&five='okyeah'")
+
+    def test_compiled_matcher(self):
+        secrets_matcher = get_secrets_matcher('equals-ignore-case', ['Key', 'pass'])
+        self.assertIs(secrets_matcher, get_secrets_matcher('equals-ignore-case', ['Key', 'pass']))
+        self.assertTrue(secrets_matcher.matches('KEY'))
+        self.assertFalse(secrets_matcher.matches('keys'))
+        self.assertFalse(secrets_matcher.could_match('one=1&two=2'))
+        self.assertTrue(secrets_matcher.could_match('one=1&PASS=2'))
+
+    def test_cached_query(self):
+        secrets_matcher = get_secrets_matcher('contains', ['secret'])
+        query_params = "one=1&secret=two"
+
+        self.assertEqual("one=1&secret=<redacted>", secrets_matcher.strip_secrets(query_params))
+        self.assertIn(query_params, secrets_matcher._cache)
+        self.assertEqual("one=1&secret=<redacted>", secrets_matcher.strip_secrets(query_params))
+
+        for i in range(SecretsMatcher.CACHE_SIZE):
+            secrets_matcher.strip_secrets("one=%d" % i)
+        self.assertEqual(SecretsMatcher.CACHE_SIZE, len(secrets_matcher._cache))
+        self.assertNotIn(query_params, secrets_matcher._cache)
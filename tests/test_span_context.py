@@ -0,0 +1,50 @@
+# (c) Copyright IBM Corp. 2024
+
+import unittest
+
+from instana.recorder import StanRecorder
+from instana.span_context import SpanContext
+from instana.tracer import InstanaTracer
+
+
+class TestSpanContext(unittest.TestCase):
+    def test_slots(self):
+        ctx = SpanContext(trace_id="1234d0e0e4736234", span_id="1234567890abcdef")
+        self.assertFalse(hasattr(ctx, "__dict__"))
+        with self.assertRaises(AttributeError):
+            ctx.unknown = True
+
+    def test_derive_child(self):
+        parent = SpanContext(trace_id="1234d0e0e4736234", span_id="1234567890abcdef", level=1,
+                             baggage={"key": "value"}, synthetic=True)
+        parent.long_trace_id = "4bf92f3577b34da61234d0e0e4736234"
+        parent.traceparent = "00-4bf92f3577b34da61234d0e0e4736234-1234567890abcdef-01"
+        parent.tracestate = "in=1234d0e0e4736234;1234567890abcdef"
+        parent.correlation_type = "web"
+        parent.correlation_id = "1234"
+
+        child = parent.derive_child("0000000000000001")
+        self.assertEqual("0000000000000001", child.span_id)
+        self.assertEqual(parent.trace_id, child.trace_id)
+        self.assertEqual(parent.level, child.level)
+        self.assertFalse(child.synthetic)
+        for name in ("long_trace_id", "traceparent", "tracestate", "correlation_type", "correlation_id"):
+            self.assertIs(getattr(parent, name), getattr(child, name))
+
+        # Baggage is shared until it changes
+        self.assertIs(parent.baggage, child.baggage)
+        changed = child.with_baggage_item("other", "value")
+        self.assertEqual({"key": "value", "other": "value"}, changed.baggage)
+        self.assertEqual({"key": "value"}, parent.baggage)
+
+    def test_tracer_derives_children(self):
+        tracer = InstanaTracer(recorder=StanRecorder())
+        parent = tracer.start_span("wsgi")
+        child = tracer.start_span("redis", child_of=parent)
+        self.assertEqual(parent.context.trace_id, child.context.trace_id)
+        self.assertNotEqual(parent.context.span_id, child.context.span_id)
+        self.assertEqual(parent.context.span_id, child.parent_id)
+        self.assertIs(parent.context.baggage, child.context.baggage)
+
+        parent.set_baggage_item("key", "value")
+        self.assertEqual({}, child.context.baggage)
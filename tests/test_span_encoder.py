@@ -0,0 +1,87 @@
+# (c) Copyright IBM Corp. 2024
+
+import json
+import unittest
+
+from instana.span import SDKSpan, RegisteredSpan
+from instana.util import to_json
+from instana.util.ids import format_id, generate_int_id
+from instana.util.span_encoder import SpanBatchEncoder, orjson
+from instana.tracer import InstanaTracer
+from instana.recorder import StanRecorder
+
+
+class TestSpanBatchEncoder(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        tracer = InstanaTracer(recorder=StanRecorder())
+        with tracer.start_active_span("wsgi") as scope:
+            scope.span.set_tag("http.method", "GET")
+            scope.span.set_tag("http.url", "/ping")
+            scope.span.set_tag("http.status_code", 200)
+            with tracer.start_active_span("custom-work") as child:
+                child.span.set_tag("answer", 42)
+        # The recorder has queued the converted spans
+        cls.spans = tracer.recorder.queued_spans()
+
+    def _encoders(self):
+        encoders = [SpanBatchEncoder(fast_backend=False)]
+        if orjson is not None:
+            encoders.append(SpanBatchEncoder())
+        return encoders
+
+    def test_backend_selection(self):
+        self.assertEqual("json", SpanBatchEncoder(fast_backend=False).backend)
+        expected = "json" if orjson is None else "orjson"
+        self.assertEqual(expected, SpanBatchEncoder().backend)
+
+    def test_matches_to_json(self):
+        self.assertEqual(2, len(self.spans))
+        self.assertIsInstance(self.spans[0], (SDKSpan, RegisteredSpan))
+        expected = json.loads(to_json(self.spans))
+
+        for encoder in self._encoders():
+            encoded = encoder.encode(self.spans)
+            self.assertIsInstance(encoded, bytes)
+            self.assertEqual(expected, json.loads(encoded), encoder.backend)
+            self.assertNotIn(b'null', encoded)
+            # The output buffer is reused across batches
+            self.assertEqual(encoded, encoder.encode(self.spans))
+
+    def test_empty_batch(self):
+        for encoder in self._encoders():
+            self.assertEqual(b'[]', encoder.encode([]))
+
+    def test_non_span_objects(self):
+        batch = [{"name": "profile", "value": 1}, [1, 2], "text"]
+        for encoder in self._encoders():
+            self.assertEqual(batch, json.loads(encoder.encode(batch)))
+
+    def test_wide_integers(self):
+        sdk_span = [span for span in self.spans if span.n == "sdk"][0]
+        timestamp = sdk_span.ts
+        for encoder in self._encoders():
+            sdk_span.ts = 2 ** 70
+            try:
+                encoded = json.loads(encoder.encode([sdk_span]))
+            finally:
+                sdk_span.ts = timestamp
+            self.assertEqual(2 ** 70, encoded[0]["ts"])
+
+    def test_int_ids_are_encoded_as_hex(self):
+        span = self.spans[0]
+        ids = (span.t, span.p, span.s)
+        trace_id, span_id = generate_int_id(), 255
+        for encoder in self._encoders():
+            span.t, span.p, span.s = trace_id, None, span_id
+            try:
+                encoded = json.loads(encoder.encode([span]))
+            finally:
+                span.t, span.p, span.s = ids
+            self.assertEqual(format_id(trace_id), encoded[0]["t"], encoder.backend)
+            self.assertEqual("00000000000000ff", encoded[0]["s"], encoder.backend)
+            self.assertNotIn("p", encoded[0])
+
+    def test_unencodable_batch(self):
+        for encoder in self._encoders():
+            self.assertIsNone(encoder.encode([{1j: "complex keys are not valid JSON"}]))
@@ -0,0 +1,116 @@
+# (c) Copyright IBM Corp. 2024
+
+import unittest
+
+from mock import MagicMock
+
+from instana.instrumentation.pep0249 import CursorWrapper
+from instana.singletons import tracer
+from instana.util import sql
+from instana.util.sql import SanitizedStatementCache, sql_normalizer, sql_sanitizer, statement_fingerprint
+
+
+class TestSqlSanitizer(unittest.TestCase):
+    def setUp(self):
+        sql.statement_cache = SanitizedStatementCache()
+        sql.normalized_statement_cache = SanitizedStatementCache()
+
+    def tearDown(self):
+        sql.statement_cache = SanitizedStatementCache()
+        sql.normalized_statement_cache = SanitizedStatementCache()
+
+    def test_sanitize(self):
+        self.assertEqual("SELECT * FROM users WHERE name = ? AND age > ? AND score < ? AND x IS ?",
+                         sql_sanitizer("SELECT * FROM users WHERE name = 'bob' AND age > 30 "
+                                       "AND score < 1.5 AND x IS NULL"))
+
+    def test_cached(self):
+        statement = "SELECT * FROM users WHERE id = 1"
+        self.assertEqual("SELECT * FROM users WHERE id = ?", sql_sanitizer(statement))
+        self.assertEqual("SELECT * FROM users WHERE id = ?", sql_sanitizer(statement))
+        self.assertEqual(1, sql.statement_cache.hits)
+        self.assertEqual(1, sql.statement_cache.misses)
+
+    def test_truncated(self):
+        statement = "INSERT INTO t VALUES " + ",".join(["(1, 'value')"] * 2000)
+        sanitized = sql_sanitizer(statement)
+        self.assertTrue(sanitized.endswith("..."))
+        self.assertLessEqual(len(sanitized), sql.MAX_STATEMENT_LENGTH + 3)
+        self.assertNotIn("val", sanitized)
+        # Too long to be cached
+        self.assertEqual(0, len(sql.statement_cache))
+
+    def test_count_bound(self):
+        cache = SanitizedStatementCache(max_entries=2)
+        for statement in ("a", "b", "c"):
+            cache.put(statement, statement)
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual("c", cache.get("c"))
+        self.assertEqual(1, cache.evictions)
+
+    def test_size_bound(self):
+        cache = SanitizedStatementCache(max_size=10)
+        cache.put("aa", "aa")
+        cache.put("bb", "bb")
+        cache.get("aa")
+        cache.put("ccc", "ccc")
+        self.assertIsNone(cache.get("bb"))
+        self.assertEqual("aa", cache.get("aa"))
+        self.assertEqual(10, cache.size)
+
+    def test_normalize_statement(self):
+        self.assertEqual("SELECT * FROM users WHERE id IN (?+) AND name = 'a  -- b'",
+                         sql.normalize_statement("SELECT *\n  FROM users -- all of them\n"
+                                                 " WHERE id IN ( ?, ?,? ) /* hint */ AND name = 'a  -- b'  "))
+        self.assertEqual("SELECT * FROM t WHERE a in (?+) OR b IN (?+) OR c IN (?+)",
+                         sql.normalize_statement("SELECT * FROM t WHERE a in (%s, %s) OR b IN (%(b)s) "
+                                                 "OR c IN (:c1, :c2)"))
+        self.assertEqual("SELECT * FROM t WHERE a IN (SELECT b FROM u)",
+                         sql.normalize_statement("SELECT * FROM t WHERE a IN (SELECT b FROM u)"))
+
+    def test_backslash_escaped_quotes(self):
+        # MySQL style escapes don't end the literal, so its content is kept as is
+        self.assertEqual("SELECT * FROM t WHERE a = 'it\\'s  -- not a comment' AND b = ?",
+                         sql.normalize_statement("SELECT * FROM t\nWHERE a = 'it\\'s  -- not a comment'"
+                                                 "  AND b = ? -- comment"))
+        self.assertEqual('SELECT "a\\"  b" FROM t',
+                         sql.normalize_statement('SELECT "a\\"  b"   FROM t'))
+        self.assertEqual("SELECT * FROM t WHERE a = ? AND b = ?",
+                         sql_sanitizer("SELECT * FROM t WHERE a = 'it\\'s' AND b = 'x'"))
+
+    def test_same_shape_shares_statement(self):
+        first = sql_sanitizer("SELECT * FROM users WHERE id IN (1, 2, 3)")
+        second = sql_sanitizer("SELECT  * FROM users\nWHERE id IN (4, 5)")
+        self.assertEqual("SELECT * FROM users WHERE id IN (?+)", first)
+        self.assertIs(first, second)
+
+    def test_statement_fingerprint(self):
+        first = statement_fingerprint(sql_sanitizer("SELECT * FROM users WHERE id IN (1, 2, 3)"))
+        self.assertEqual(16, len(first))
+        # Stable across processes: the hash of the normalized statement
+        self.assertEqual(first, statement_fingerprint("SELECT * FROM users WHERE id IN (?+)"))
+        self.assertEqual(first, statement_fingerprint("SELECT  *  FROM users -- all\nWHERE id IN (?, ?)"))
+        self.assertNotEqual(first, statement_fingerprint("SELECT * FROM users"))
+        self.assertIsNone(statement_fingerprint(None))
+
+    def test_fingerprint_on_db_spans(self):
+        connect_params = ([], {'dbname': 'test', 'user': 'root', 'host': 'localhost', 'port': 5432})
+        cursor = CursorWrapper(MagicMock(), 'postgres', connect_params)
+        tracer.recorder.clear_spans()
+        with tracer.start_active_span('test'):
+            cursor.execute("SELECT * FROM users WHERE id = 1")
+            cursor.execute("SELECT * FROM users WHERE id = 2")
+
+        pg_spans = [span for span in tracer.recorder.queued_spans() if span.n == 'postgres']
+        self.assertEqual(2, len(pg_spans))
+        self.assertEqual("SELECT * FROM users WHERE id = ?", pg_spans[0].data['pg']['stmt'])
+        self.assertEqual(statement_fingerprint("SELECT * FROM users WHERE id = ?"),
+                         pg_spans[0].data['pg']['fingerprint'])
+        self.assertEqual(pg_spans[0].data['pg']['fingerprint'], pg_spans[1].data['pg']['fingerprint'])
+
+    def test_normalizer_keeps_values(self):
+        self.assertEqual("select name from users where name='doesntexist' and id IN (?+)",
+                         sql_normalizer("select name from users\n where name='doesntexist' and id IN (?, ?)"))
+        self.assertIs(sql_normalizer("select 1"), sql_normalizer("select  1"))
+        self.assertIsNone(sql_normalizer(None))
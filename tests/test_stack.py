@@ -0,0 +1,113 @@
+# (c) Copyright IBM Corp. 2024
+
+import os
+import unittest
+
+from instana.options import StandardOptions
+from instana.recorder import StanRecorder
+from instana.tracer import InstanaTracer
+from instana.util import stack
+from instana.util.stack import capture_frames, capture_stack, format_stack
+
+
+def outer(limit=30):
+    return inner(limit)
+
+
+def inner(limit):
+    return capture_stack(limit)
+
+
+def outer_frames():
+    return inner_frames()
+
+
+def inner_frames():
+    return capture_frames()
+
+
+def with_instana_wrapper(limit=30):
+    return capture_stack(limit)
+
+
+class TestCaptureStack(unittest.TestCase):
+    def tearDown(self):
+        for name in ("INSTANA_STACK_TRACE", "INSTANA_STACK_TRACE_LENGTH", "INSTANA_STACK_TRACE_SAMPLE_EVERY"):
+            os.environ.pop(name, None)
+
+    def test_newest_frame_first(self):
+        trace = outer()
+        self.assertEqual("outer", trace[0]["m"])
+        self.assertEqual("test_newest_frame_first", trace[1]["m"])
+        self.assertEqual(__file__, trace[0]["c"])
+        self.assertIsInstance(trace[0]["n"], int)
+
+    def test_limit(self):
+        self.assertEqual(1, len(outer(1)))
+        self.assertEqual([], outer(0))
+        self.assertLessEqual(len(outer(100)), stack.MAX_STACK_LENGTH)
+
+    def test_instana_frames_excluded(self):
+        trace = with_instana_wrapper()
+        self.assertNotIn("with_instana_wrapper", [entry["m"] for entry in trace])
+
+    def test_entries_cached(self):
+        first = outer()
+        second = outer()
+        self.assertIs(first[0], second[0])
+
+    def test_capture_frames(self):
+        frames = outer_frames()
+        self.assertIsInstance(frames, tuple)
+        code, lineno = frames[0]
+        self.assertEqual("outer_frames", code.co_name)
+        self.assertIsInstance(lineno, int)
+
+        trace = format_stack(frames)
+        self.assertEqual({"c": code.co_filename, "n": lineno, "m": "outer_frames"}, trace[0])
+        self.assertEqual(len(frames), len(trace))
+
+    def test_options(self):
+        options = StandardOptions()
+        self.assertEqual("all", options.stack_trace)
+        self.assertEqual(30, options.stack_trace_length)
+
+        os.environ["INSTANA_STACK_TRACE"] = "Sampled"
+        os.environ["INSTANA_STACK_TRACE_LENGTH"] = "10"
+        os.environ["INSTANA_STACK_TRACE_SAMPLE_EVERY"] = "5"
+        options = StandardOptions()
+        self.assertEqual("sampled", options.stack_trace)
+        self.assertEqual(10, options.stack_trace_length)
+        self.assertEqual(5, options.stack_trace_sample_every)
+
+        os.environ["INSTANA_STACK_TRACE"] = "sometimes"
+        self.assertEqual("all", StandardOptions().stack_trace)
+
+
+class TestStackTracePolicy(unittest.TestCase):
+    def setUp(self):
+        self.tracer = InstanaTracer(recorder=StanRecorder())
+
+    def test_none(self):
+        self.tracer.stack_trace = "none"
+        span = self.tracer.start_span("redis")
+        self.assertIsNone(span.stack)
+
+    def test_error(self):
+        self.tracer.stack_trace = "error"
+        span = self.tracer.start_span("redis")
+        self.assertIsNone(span.stack)
+        span.finish()
+        self.assertIsNone(span.stack)
+
+        span = self.tracer.start_span("redis")
+        span.mark_as_errored()
+        span.finish()
+        self.assertIsInstance(span.stack, tuple)
+        self.assertTrue(len(span.stack) > 0)
+
+    def test_sampled(self):
+        self.tracer.stack_trace = "sampled"
+        self.tracer.stack_trace_sample_every = 3
+        captured = [self.tracer.start_span("redis").stack is not None for _ in range(6)]
+        self.assertEqual(2, captured.count(True))
@@ -0,0 +1,90 @@
+# (c) Copyright IBM Corp. 2024
+
+import asyncio
+import threading
+import unittest
+
+import instana.instrumentation.asyncio  # noqa: F401
+from instana.configurator import config
+from instana.singletons import agent, tracer, async_tracer
+from instana.util.active_scope import get_active, no_active_scope
+from instana.util.traceutils import get_active_tracer, get_tracer_tuple, tracing_is_off
+
+
+class TestActiveScopeRegistry(unittest.TestCase):
+    def setUp(self):
+        self.allow_exit_as_root = agent.options.allow_exit_as_root
+        agent.options.allow_exit_as_root = False
+
+    def tearDown(self):
+        agent.options.allow_exit_as_root = self.allow_exit_as_root
+
+    def test_no_active_span(self):
+        self.assertIsNone(get_active())
+        self.assertIsNone(get_active_tracer())
+        self.assertEqual((None, None, None), get_tracer_tuple())
+        self.assertTrue(tracing_is_off())
+
+        agent.options.allow_exit_as_root = True
+        self.assertEqual((tracer, None, None), get_tracer_tuple())
+        self.assertFalse(tracing_is_off())
+
+    def test_activation(self):
+        with tracer.start_active_span("wsgi") as scope:
+            self.assertEqual((tracer, scope.span), get_active())
+            self.assertEqual((tracer, scope.span, "wsgi"), get_tracer_tuple())
+            self.assertFalse(tracing_is_off())
+
+            with async_tracer.start_active_span("asyncio") as child:
+                self.assertIs(async_tracer, get_active_tracer())
+                self.assertEqual((async_tracer, child.span, "asyncio"), get_tracer_tuple())
+
+            self.assertEqual((tracer, scope.span, "wsgi"), get_tracer_tuple())
+
+        self.assertIsNone(get_active())
+        self.assertTrue(tracing_is_off())
+
+    def test_close_out_of_order(self):
+        parent = tracer.start_active_span("wsgi")
+        child = tracer.start_active_span("redis")
+        parent.close()
+        # The child is still the active scope
+        self.assertEqual((tracer, child.span), get_active())
+        child.close()
+        self.assertEqual((tracer, parent.span), get_active())
+        # Matches the thread-local scope manager, which restores the parent as well
+        self.assertIs(parent.span, tracer.active_span)
+        parent.close()
+        self.assertIsNone(get_active())
+
+    def test_threads_do_not_share_the_active_span(self):
+        seen = []
+        with tracer.start_active_span("wsgi"):
+            thread = threading.Thread(target=lambda: seen.append(get_tracer_tuple()))
+            thread.start()
+            thread.join()
+        self.assertEqual([(None, None, None)], seen)
+
+    def test_asyncio_tasks(self):
+        async def child():
+            return get_tracer_tuple()
+
+        async def parent():
+            with async_tracer.start_active_span("asyncio") as scope:
+                config["asyncio_task_context_propagation"]["enabled"] = True
+                inherited = await asyncio.ensure_future(child())
+                config["asyncio_task_context_propagation"]["enabled"] = False
+                isolated = await asyncio.ensure_future(child())
+                with no_active_scope():
+                    unregistered = get_tracer_tuple()
+            return scope.span, inherited, isolated, unregistered
+
+        loop = asyncio.new_event_loop()
+        try:
+            span, inherited, isolated, unregistered = loop.run_until_complete(parent())
+        finally:
+            loop.close()
+            config["asyncio_task_context_propagation"]["enabled"] = False
+        self.assertEqual((async_tracer, span, "asyncio"), inherited)
+        self.assertEqual((None, None, None), isolated)
+        self.assertEqual((None, None, None), unregistered)
@@ -68,4 +68,20 @@ class TestTracestate(unittest.TestCase):
         in_trace_id = "1234d0e0e4736234"
         in_span_id = "1234567890abcdef"
         expected_tracestate = []
-        self.assertEqual(expected_tracestate, self.ts.update_tracestate(tracestate, in_trace_id, in_span_id))
\ No newline at end of file
+        self.assertEqual(expected_tracestate, self.ts.update_tracestate(tracestate, in_trace_id, in_span_id))
+
+    def test_upstream_members(self):
+        self.assertIsNone(self.ts.upstream_members(None))
+        self.assertIsNone(self.ts.upstream_members(""))
+        self.assertEqual("congo=t61rcWkgMzE", self.ts.upstream_members("congo=t61rcWkgMzE"))
+        self.assertEqual("congo=t61rcWkgMzE,rojo=00f067aa0ba902b7",
+                         self.ts.upstream_members("congo=t61rcWkgMzE,in=1234d0e0e4736234;1234567890abcdef,"
+                                                  "rojo=00f067aa0ba902b7"))
+        members = ",".join("m%d=%d" % (i, i) for i in range(40))
+        self.assertEqual(31, len(self.ts.upstream_members(members).split(",")))
+
+    def test_format_tracestate(self):
+        self.assertEqual("in=1234d0e0e4736234;1234567890abcdef",
+                         self.ts.format_tracestate(None, "1234d0e0e4736234", "1234567890abcdef"))
+        self.assertEqual("in=1234d0e0e4736234;0000000000abcdef,congo=t61rcWkgMzE",
+                         self.ts.format_tracestate("congo=t61rcWkgMzE", "1234d0e0e4736234", "abcdef"))